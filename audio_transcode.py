@@ -0,0 +1,88 @@
+"""
+Audio transcoding in a separate process pool.
+
+Audio is normally kept in its source codec (see DownloadJob.build_ydl_opts).
+Only when another codec or bitrate is explicitly requested is the file
+re-encoded, and that runs here so the FFmpeg CPU time doesn't keep a
+download worker from starting the next network download.
+"""
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from download_metrics import run_measured
+
+
+# Codec name -> (FFmpeg encoder, file extension, codec families that are already this codec)
+AUDIO_CODECS = {
+    'mp3': ('libmp3lame', 'mp3', ('mp3',)),
+    'aac': ('aac', 'm4a', ('mp4a', 'aac')),
+    'opus': ('libopus', 'opus', ('opus',)),
+    'vorbis': ('libvorbis', 'ogg', ('vorbis',)),
+    'flac': ('flac', 'flac', ('flac',)),
+    'wav': ('pcm_s16le', 'wav', ()),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def needs_transcode(source_codec_family, codec=None, bitrate=None):
+    """True if the requested codec/bitrate can't be met by copying the source audio stream."""
+    if bitrate:
+        return True
+    if not codec:
+        return False
+    return source_codec_family not in AUDIO_CODECS[codec][2]
+
+
+def transcode_audio(source_path, codec, bitrate=None):
+    """
+    Re-encodes `source_path` to `codec` (a key of AUDIO_CODECS) at `bitrate`
+    kbps and removes the source. Returns (new file's path, seconds taken,
+    FFmpeg CPU seconds or None). Runs in a pool process, so it only takes
+    picklable arguments.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        raise RuntimeError("FFmpeg is required for audio conversion. Please install FFmpeg.")
+
+    encoder, ext, _ = AUDIO_CODECS[codec]
+    stem = os.path.splitext(source_path)[0]
+    output_path = stem + '.' + ext
+    # Encoded under a temp name (keeping the extension FFmpeg picks the muxer by), as the output may replace the source
+    temp_path = stem + '.transcoding.' + ext
+    cmd = [ffmpeg, '-y', '-loglevel', 'error', '-i', source_path, '-vn', '-c:a', encoder]
+    if bitrate:
+        cmd += ['-b:a', f"{int(bitrate)}k"]
+    cmd.append(temp_path)
+
+    started = time.monotonic()
+    result, cpu_seconds = run_measured(cmd)
+    if result.returncode != 0:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise RuntimeError(f"FFmpeg audio conversion failed:\n{result.stderr.strip()}")
+    os.replace(temp_path, output_path)
+    if output_path != source_path:
+        os.remove(source_path)
+    return output_path, time.monotonic() - started, cpu_seconds
+
+
+def get_pool():
+    """The shared transcoding pool, created on first use with one process per two CPU cores."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: the pool starts while other threads (Tk, yt-dlp, sqlite) may hold locks
+            _pool = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) // 2),
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def submit(source_path, codec, bitrate=None):
+    """Queues a transcode and returns its Future (result: see transcode_audio())."""
+    return get_pool().submit(transcode_audio, source_path, codec, bitrate)
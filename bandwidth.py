@@ -0,0 +1,127 @@
+"""
+Global bandwidth budget shared by all active downloads.
+
+The budget is split between the running jobs in proportion to their
+priority and applied through yt-dlp's `ratelimit` option. The limit can
+change with the time of day ("09:00-17:00=2M"), and the shares are
+recomputed whenever a download starts or stops and once per
+`rebalance_interval`, updating the `ratelimit` of the live YoutubeDL
+instances.
+"""
+import datetime
+import threading
+import time
+
+
+# Priority name -> weight of the job's share of the budget
+PRIORITIES = {'low': 1, 'normal': 2, 'high': 4, 'urgent': 8}
+
+# Anything below this is not worth throttling to; it would just stall the download
+MIN_RATE = 16 * 1024
+
+
+def parse_rate(text):
+    """Parses a rate in yt-dlp's notation ("2M" is 2 MiB/s) into bytes/s; empty or "unlimited" gives None."""
+    text = (text or '').strip()
+    if text.lower() in ('', '0', 'none', 'unlimited'):
+        return None
+    from yt_dlp.utils import parse_bytes # Imported here to keep yt_dlp out of the app's start-up
+    rate = parse_bytes(text)
+    if rate is None:
+        raise ValueError(f"Invalid rate: {text!r} (use e.g. 500K or 2M)")
+    return rate
+
+
+def parse_schedule(text):
+    """
+    "09:00-17:00=2M; 22:00-06:00=unlimited" -> [(start, end, rate), ...].
+    Windows may wrap around midnight.
+    """
+    windows = []
+    for part in filter(None, (p.strip() for p in (text or '').replace(',', ';').split(';'))):
+        try:
+            span, rate = part.split('=', 1)
+            start, end = (datetime.time.fromisoformat(t.strip()) for t in span.split('-', 1))
+        except ValueError:
+            raise ValueError(f"Invalid schedule entry: {part!r} (use e.g. 09:00-17:00=2M)")
+        windows.append((start, end, parse_rate(rate)))
+    return windows
+
+
+class BandwidthScheduler:
+    def __init__(self, limit=None, schedule=(), rebalance_interval=5.0):
+        self.limit = limit # Bytes/s outside the scheduled windows, None for unlimited
+        self.schedule = list(schedule) # [(start, end, rate)], first matching window wins
+        self.rebalance_interval = rebalance_interval
+        self._active = {} # job -> list of YoutubeDL instances downloading for it
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def current_limit(self, now=None):
+        now = (now or datetime.datetime.now()).time()
+        for start, end, rate in self.schedule:
+            if (start <= now < end) if start <= end else (now >= start or now < end):
+                return rate
+        return self.limit
+
+    def configure(self, limit=None, schedule=()):
+        """Changes the budget; running downloads are rebalanced right away."""
+        self.limit = limit
+        self.schedule = list(schedule)
+        self.rebalance()
+
+    def ratelimit_for(self, job, extra_instances=0):
+        """The `ratelimit` for one of the job's YoutubeDL instances, or None for unlimited."""
+        with self._lock:
+            return self._ratelimit_for(job, extra_instances)
+
+    def register(self, job, ydl):
+        """Called when a YoutubeDL instance starts downloading for `job`."""
+        with self._lock:
+            self._active.setdefault(job, []).append(ydl)
+            self._start_timer()
+        self.rebalance()
+
+    def unregister(self, job, ydl):
+        with self._lock:
+            instances = self._active.get(job, [])
+            if ydl in instances:
+                instances.remove(ydl)
+            if not instances:
+                self._active.pop(job, None)
+        self.rebalance()
+
+    def rebalance(self):
+        with self._lock:
+            for job, instances in self._active.items():
+                for ydl in instances:
+                    ydl.params['ratelimit'] = self._ratelimit_for(job)
+
+    def _ratelimit_for(self, job, extra_instances=0):
+        limit = self.current_limit()
+        if limit is None:
+            return None
+        jobs = set(self._active) | {job}
+        total_weight = sum(PRIORITIES.get(j.priority, PRIORITIES['normal']) for j in jobs)
+        share = limit * PRIORITIES.get(job.priority, PRIORITIES['normal']) / total_weight
+        # Split between the job's parallel streams (e.g. video+audio) and fragments,
+        # since yt-dlp applies the limit to each of them separately
+        streams = max(1, len(self._active.get(job, [])) + extra_instances)
+        if job.is_fragmented():
+            streams *= max(1, job.profile.concurrent_fragments)
+        return max(MIN_RATE, int(share / streams))
+
+    def _start_timer(self):
+        # Periodic rebalancing so time-of-day windows take effect during long downloads
+        if self._timer is None:
+            self._timer = threading.Thread(target=self._tick, daemon=True)
+            self._timer.start()
+
+    def _tick(self):
+        while True:
+            time.sleep(self.rebalance_interval)
+            with self._lock:
+                if not self._active:
+                    self._timer = None
+                    return
+            self.rebalance()
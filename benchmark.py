@@ -0,0 +1,311 @@
+"""
+Download pipeline benchmark against a local mock media server.
+
+Runs the real download path (fetch_info -> FormatPolicy -> DownloadQueue ->
+run_download with the GUI's ProgressTracker) against mock_media_server for
+progressive, DASH and HLS media, over a grid of fragment concurrency and
+worker counts. No network is needed. Every run happens in a fresh process,
+so CPU time and peak RSS belong to that run alone.
+
+Reported per run: throughput, time to first byte, CPU time, peak RSS,
+extraction time and UI event pressure (progress hook calls and how many
+jobs each 10 Hz redraw had to handle). Results are written as JSON;
+--baseline compares against an earlier file and --max-regression turns a
+slowdown into a non-zero exit code.
+
+    python benchmark.py --scenarios dash,hls --fragments 1,4,8 --workers 1,3 --rate 8M -o results.json
+    python benchmark.py --baseline results.json --max-regression 10
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource # Unix only; peak RSS is left out elsewhere
+except ImportError:
+    resource = None
+
+import downloader_core as core
+from downloader_core import DownloadJob, DownloadQueue
+from format_ranking import FormatPolicy
+from mock_media_server import MiB, serve_in_process
+from performance_profile import PerformanceProfile
+from progress_tracker import ProgressTracker
+
+SCENARIOS = {
+    # Scenario -> (URL path for clip <n>, whether it downloads in fragments)
+    'progressive': ("/progressive/clip-{n}.mp4", False),
+    'dash': ("/dash/clip-{n}.mpd", True),
+    'hls': ("/hls/clip-{n}.m3u8", True),
+}
+
+UI_REFRESH_SECONDS = 0.1 # The GUI's PROGRESS_REFRESH_MS
+
+# Metric -> True if bigger is better; used by --baseline
+COMPARED_METRICS = {'throughput_mib_s': True, 'cpu_seconds_per_mib': False, 'ttfb_ms_mean': False}
+
+
+class _HookStats:
+    """Wraps the GUI's progress hook to count calls, time them and note each job's first byte."""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.first_byte = {} # job id -> perf_counter() of its first downloaded byte
+        self._lock = threading.Lock()
+
+    def wrap(self, job, hook):
+        def timed_hook(d):
+            started = time.perf_counter()
+            hook(d)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.calls += 1
+                self.seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+                if d.get('downloaded_bytes') and job.id not in self.first_byte:
+                    self.first_byte[job.id] = started
+        return timed_hook
+
+
+def _select_format(scenario, info):
+    if scenario == 'dash':
+        # Only the video representation: the audio+video merge would need FFmpeg and measure it instead
+        return next(f for f in info['formats'] if f.get('vcodec') not in (None, 'none'))
+    return FormatPolicy.parse("best video").select(info)
+
+
+def run_case(base_url, scenario, fragments, workers, jobs, chunk_size):
+    """One benchmark run; executed in its own process. Returns a result dict."""
+    work_dir = tempfile.mkdtemp(prefix="ytd-bench-")
+    try:
+        core.configure_cache(ttl=0, path=os.path.join(work_dir, "cache.sqlite3"))
+        path, _ = SCENARIOS[scenario]
+        profile = PerformanceProfile(concurrent_fragments=fragments or 1, http_chunk_size=chunk_size)
+
+        extract_started = time.perf_counter()
+        infos = [core.fetch_info(base_url + path.format(n=n), use_cache=False) for n in range(jobs)]
+        extract_seconds = time.perf_counter() - extract_started
+
+        ranking_started = time.perf_counter()
+        download_jobs = [DownloadJob(info['webpage_url'], _select_format(scenario, info), core.VIDEO, work_dir,
+                                     title=info.get('title'), info=info, profile=profile) for info in infos]
+        ranking_seconds = time.perf_counter() - ranking_started
+
+        tracker = ProgressTracker()
+        stats = _HookStats()
+        started_at = {}
+
+        def run_job(job):
+            started_at[job.id] = time.perf_counter()
+            return core.run_download(job, stats.wrap(job, tracker.hook(job)))
+
+        queue = DownloadQueue(run_job, max_workers=workers)
+
+        # The GUI's redraw loop: every 100 ms take the jobs that changed
+        redraws, max_batch, stop = [0], [0], threading.Event()
+
+        def ui_loop():
+            while not stop.wait(UI_REFRESH_SECONDS):
+                dirty = tracker.drain()
+                if dirty:
+                    redraws[0] += 1
+                    max_batch[0] = max(max_batch[0], len(dirty))
+
+        ui_thread = threading.Thread(target=ui_loop, daemon=True)
+        ui_thread.start()
+
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        for job in download_jobs:
+            queue.submit(job)
+        queue.join()
+        seconds = time.perf_counter() - started
+        cpu_seconds = time.process_time() - cpu_started
+        stop.set()
+        ui_thread.join()
+
+        failed = [job for job in download_jobs if job.status != DownloadJob.DONE]
+        downloaded = sum(os.path.getsize(job.filename) for job in download_jobs
+                         if job.filename and os.path.exists(job.filename))
+        ttfb = [(stats.first_byte[job.id] - started_at[job.id]) * 1000
+                for job in download_jobs if job.id in stats.first_byte and job.id in started_at]
+        mib = downloaded / MiB
+        return {
+            'scenario': scenario,
+            'fragments': fragments,
+            'workers': workers,
+            'jobs': jobs,
+            'bytes': downloaded,
+            'seconds': round(seconds, 4),
+            'throughput_mib_s': round(mib / seconds, 3) if seconds else None,
+            'ttfb_ms_mean': round(sum(ttfb) / len(ttfb), 2) if ttfb else None,
+            'ttfb_ms_max': round(max(ttfb), 2) if ttfb else None,
+            'cpu_seconds': round(cpu_seconds, 4),
+            'cpu_seconds_per_mib': round(cpu_seconds / mib, 5) if mib else None,
+            'peak_rss_mib': _peak_rss_mib(),
+            'extract_seconds': round(extract_seconds, 4),
+            'format_selection_ms': round(ranking_seconds * 1000, 3),
+            'ui': {
+                'hook_calls': stats.calls,
+                'hook_calls_per_s': round(stats.calls / seconds, 1) if seconds else None,
+                'hook_ms_mean': round(stats.seconds / stats.calls * 1000, 4) if stats.calls else None,
+                'hook_ms_max': round(stats.max_seconds * 1000, 3),
+                'redraws': redraws[0],
+                'max_jobs_per_redraw': max_batch[0],
+            },
+            'errors': [f"{job.title}: {job.error}" for job in failed],
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _peak_rss_mib():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (MiB if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_isolated(context, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(run_case, *args).result()
+
+
+def compare(results, baseline, max_regression=None):
+    """Prints the change of each metric against the baseline; returns the regressions beyond max_regression %."""
+    def key(result):
+        return (result['scenario'], result['fragments'], result['workers'], result['jobs'])
+
+    previous = {key(result): result for result in baseline.get('results', [])}
+    regressions = []
+    if not any(key(result) in previous for result in results):
+        print("  No run matches the baseline (scenario, fragments, workers and jobs must be the same).")
+    for result in results:
+        old = previous.get(key(result))
+        if not old:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if not result.get(metric) or not old.get(metric):
+                continue
+            change = (result[metric] - old[metric]) / old[metric] * 100
+            changes.append(f"{metric} {change:+.1f}%")
+            worse = -change if higher_is_better else change
+            if max_regression is not None and worse > max_regression:
+                regressions.append(f"{_label(result)}: {metric} {change:+.1f}%")
+        print(f"  vs baseline {_label(result)}: {', '.join(changes)}")
+    return regressions
+
+
+def _label(result):
+    fragments = f" fragments={result['fragments']}" if result['fragments'] else ""
+    return f"{result['scenario']}{fragments} workers={result['workers']}"
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(',') if value.strip()]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the download pipeline against a local mock server.")
+    parser.add_argument("--scenarios", default="progressive,dash,hls",
+                        help="comma-separated: %s (default: %%(default)s)" % ", ".join(SCENARIOS))
+    parser.add_argument("--fragments", type=_int_list, default=[1, 4, 8],
+                        help="fragment concurrency values for DASH/HLS (default: 1,4,8)")
+    parser.add_argument("--workers", type=_int_list, default=[1, 3], help="parallel download values (default: 1,3)")
+    parser.add_argument("--jobs", type=int, default=3, help="downloads per run (default: %(default)s)")
+    parser.add_argument("--size", type=float, default=32, help="MiB per download (default: %(default)s)")
+    parser.add_argument("--segment-size", type=float, default=1, help="MiB per DASH/HLS segment (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=float, default=10, help="MiB per HTTP range request, 0 for none (default: %(default)s)")
+    parser.add_argument("--rate", default=None, help='server rate limit per connection, e.g. "8M" (default: unlimited)')
+    parser.add_argument("--latency", type=float, default=0, help="server latency per request in ms (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per setting (default: %(default)s)")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON results file (default: %(default)s)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="exit with status 1 if a metric is this many percent worse than the baseline")
+    return parser
+
+
+def main(argv=None):
+    from bandwidth import parse_rate
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(unknown)}")
+    try:
+        rate = parse_rate(args.rate)
+    except ValueError as e:
+        parser.error(str(e))
+
+    baseline = None
+    if args.baseline: # Read first: it may be the file the results are about to overwrite
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    context = multiprocessing.get_context("spawn") # Fresh processes, so RSS and CPU aren't inherited
+    ready = context.Queue()
+    server = context.Process(target=serve_in_process, args=(ready,), daemon=True, kwargs={
+        'size': int(args.size * MiB), 'segment_size': int(args.segment_size * MiB),
+        'rate': rate, 'latency': args.latency / 1000})
+    server.start()
+    base_url = ready.get(timeout=30)
+
+    results = []
+    try:
+        for scenario in scenarios:
+            fragmented = SCENARIOS[scenario][1]
+            for fragments in (args.fragments if fragmented else [None]):
+                for workers in args.workers:
+                    for _ in range(args.repeat):
+                        result = _run_isolated(context, base_url, scenario, fragments, workers, args.jobs,
+                                               int(args.chunk_size * MiB) or None)
+                        results.append(result)
+                        print(f"{_label(result)}: {result['throughput_mib_s']} MiB/s, "
+                              f"ttfb {result['ttfb_ms_mean']} ms, cpu {result['cpu_seconds']} s, "
+                              f"rss {result['peak_rss_mib']} MiB, {result['ui']['hook_calls_per_s']} hooks/s"
+                              + (f", {len(result['errors'])} failed" if result['errors'] else ""))
+    finally:
+        server.terminate()
+
+    import yt_dlp.version
+    report = {
+        'meta': {
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'yt_dlp': yt_dlp.version.__version__,
+            'settings': {key: value for key, value in vars(args).items()
+                         if key not in ('output', 'baseline', 'max_regression')},
+        },
+        'results': results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            return 1
+    return 1 if any(result['errors'] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
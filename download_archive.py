@@ -0,0 +1,68 @@
+"""
+Archive of completed downloads.
+
+Each finished job is recorded by video ("<extractor>:<video id>", the same
+key as the metadata cache), media type and format, together with the file
+it produced. Checking the archive before queueing makes re-running a
+playlist or URL list cost one indexed lookup per item instead of a
+re-download. The output path (without extension) is indexed too, so two
+different videos whose titles map to the same file name can be told apart.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+
+class DownloadArchive:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS archive (
+                    video_key TEXT NOT NULL,
+                    media_type TEXT NOT NULL,
+                    format_id TEXT NOT NULL,
+                    title TEXT,
+                    path TEXT,
+                    stem TEXT,
+                    downloaded_at REAL NOT NULL,
+                    PRIMARY KEY (video_key, media_type, format_id)
+                )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS archive_stem ON archive (stem)")
+
+    def find(self, video_key, media_type=None):
+        """Rows (as dicts) of earlier downloads of a video, optionally only of one media type."""
+        query = "SELECT * FROM archive WHERE video_key = ?"
+        params = [video_key]
+        if media_type:
+            query += " AND media_type = ?"
+            params.append(media_type)
+        with self._lock:
+            cursor = self._db.execute(query + " ORDER BY downloaded_at DESC", params)
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def add(self, video_key, media_type, format_id, title, path):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (video_key, media_type, format_id, title, path,
+                              os.path.splitext(path)[0] if path else None, time.time()))
+
+    def owners_of(self, stem):
+        """Video keys of archived downloads written to `stem` (any extension)."""
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT video_key FROM archive WHERE stem = ?", (stem,))}
+
+    def remove(self, video_key, media_type=None):
+        """Forgets a video so it can be downloaded again."""
+        with self._lock, self._db:
+            if media_type:
+                self._db.execute("DELETE FROM archive WHERE video_key = ? AND media_type = ?", (video_key, media_type))
+            else:
+                self._db.execute("DELETE FROM archive WHERE video_key = ?", (video_key,))
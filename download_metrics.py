@@ -0,0 +1,417 @@
+"""
+Structured metrics for downloads and extraction.
+
+Each download job gets a JobMetrics fed by its yt-dlp progress hooks,
+postprocessor hooks and log messages. The job's wall-clock time is split
+into phases:
+  queued       waiting for a free worker
+  setup        extraction, format selection and connecting, up to the first byte
+  transfer     first byte until the last file is downloaded
+  postprocess  merging, audio extraction and conversion
+DownloadMetrics appends a JSON line per finished job (and per extraction)
+to a log file, and serve() exposes running totals in the Prometheus text
+format on a local port.
+"""
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import resource # Unix only; CPU time of yt-dlp's own FFmpeg runs is left out elsewhere
+except ImportError:
+    resource = None
+
+PHASES = ('queued', 'setup', 'transfer', 'postprocess')
+
+# yt-dlp log lines, e.g. "[download] Got error: HTTP Error 503. Retrying fragment 12 (2/10)..."
+_RETRY_RE = re.compile(r'Retrying( fragment)?\b.*\(\d+/\w+\)')
+_SKIP_FRAGMENT_RE = re.compile(r'Skipping fragment \d+')
+
+
+def run_measured(cmd):
+    """
+    Runs `cmd` like subprocess.run(cmd, capture_output=True, text=True), but
+    with stdout discarded, and returns (result, cpu_seconds): the user + system
+    CPU time of that process alone. cpu_seconds is None where the OS can't tell.
+    """
+    if not hasattr(os, 'wait4'):
+        return subprocess.run(cmd, capture_output=True, text=True), None
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    with process.stderr:
+        stderr = process.stderr.read()
+    # wait4() instead of wait(): it also returns the resource usage of this one child
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return subprocess.CompletedProcess(cmd, process.returncode, None, stderr), usage.ru_utime + usage.ru_stime
+
+
+def _children_cpu_seconds():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class _YdlLogger:
+    """yt-dlp `logger` that counts a job's retries and skipped fragments and drops every message."""
+
+    def __init__(self, job_metrics):
+        self.job_metrics = job_metrics
+
+    def debug(self, msg):
+        self.job_metrics.on_message(msg)
+
+    info = warning = error = debug
+
+
+class JobMetrics:
+    """Metrics of one download job, from queueing until it is done or failed."""
+
+    def __init__(self, job, registry, sample_interval=1.0, max_samples=300):
+        self.registry = registry
+        self.job = job
+        self.sample_interval = sample_interval # Seconds per throughput sample; doubles when max_samples is reached
+        self.max_samples = max_samples
+        self.logger = _YdlLogger(self)
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.first_byte_at = None
+        self.downloaded_at = None # Last file downloaded
+        self.finished_at = None
+        self.extract_seconds = None
+        self.extract_cached = None
+        self.bytes = 0 # Over all files of the job
+        self.samples = [] # [seconds since start, bytes/s] per sample interval
+        self.retries = 0 # Retried requests, other than fragments
+        self.fragment_retries = 0
+        self.fragments_skipped = 0 # Given up on; the file has a gap
+        self.postprocess = {} # Postprocessor -> seconds
+        self.ffmpeg_cpu_seconds = None
+        self._file_bytes = 0 # Downloaded bytes of the current file
+        self._sample_at = None
+        self._sample_bytes = 0
+        self._running_pp = {} # Postprocessor -> (start time, children CPU seconds at start)
+        self._postprocessing = False # Set by the first post-processing step; downloads are over by then
+        self._lock = threading.Lock()
+
+    def progress_hook(self, d):
+        """yt-dlp progress hook."""
+        now = time.monotonic()
+        delta = 0
+        with self._lock:
+            if d['status'] == 'downloading':
+                downloaded = d.get('downloaded_bytes')
+                if downloaded is None:
+                    return
+                if downloaded < self._file_bytes:
+                    self._file_bytes = 0 # A new file started, e.g. the audio of a merge
+                delta = downloaded - self._file_bytes
+                self._file_bytes = downloaded
+                if self.first_byte_at is None and downloaded:
+                    self.first_byte_at = now
+            elif d['status'] == 'finished':
+                size = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+                if self._file_bytes and size > self._file_bytes:
+                    delta = size - self._file_bytes # Bytes since the last "downloading" call
+                self._file_bytes = 0
+                if not self._postprocessing:
+                    self.downloaded_at = now
+            self.bytes += delta
+            self._sample(now, final=d['status'] == 'finished')
+        if delta:
+            self.registry.add('bytes', delta)
+
+    def postprocessor_hook(self, d):
+        """yt-dlp postprocessor hook: times each postprocessor."""
+        name = d.get('postprocessor')
+        if self.downloaded_at is None:
+            return # A 'before_dl' postprocessor such as ExternalDownloadMonitor; part of the setup
+        if d['status'] == 'started':
+            self._postprocessing = True
+            self._running_pp[name] = (time.monotonic(), _children_cpu_seconds())
+        elif d['status'] == 'finished' and name in self._running_pp:
+            started, cpu_before = self._running_pp.pop(name)
+            cpu = None
+            if name.startswith('FFmpeg') and cpu_before is not None:
+                # Processes reaped meanwhile; another job's FFmpeg ending at the same time is counted too
+                cpu = _children_cpu_seconds() - cpu_before
+            self.record_postprocess(name, time.monotonic() - started, cpu)
+
+    def on_message(self, msg):
+        """Counts retries and skipped fragments from yt-dlp's log messages."""
+        if _RETRY_RE.search(msg):
+            fragment = 'Retrying fragment' in msg
+            with self._lock:
+                if fragment:
+                    self.fragment_retries += 1
+                else:
+                    self.retries += 1
+            self.registry.add('fragment_retries' if fragment else 'retries', 1)
+        elif _SKIP_FRAGMENT_RE.search(msg):
+            with self._lock:
+                self.fragments_skipped += 1
+            self.registry.add('fragments_skipped', 1)
+
+    def record_extraction(self, seconds, cached=False):
+        self.extract_seconds = round(seconds, 4)
+        self.extract_cached = cached
+
+    def record_postprocess(self, name, seconds, ffmpeg_cpu_seconds=None):
+        """Adds a post-processing step, e.g. our own FFmpeg merge or an audio conversion."""
+        with self._lock:
+            if self.downloaded_at is None:
+                self.downloaded_at = time.monotonic() - seconds # Run before the job reports 'finished' (merges)
+            self._postprocessing = True
+            self.postprocess[name] = self.postprocess.get(name, 0) + seconds
+            if ffmpeg_cpu_seconds is not None:
+                self.ffmpeg_cpu_seconds = (self.ffmpeg_cpu_seconds or 0) + ffmpeg_cpu_seconds
+        self.registry.add_postprocess(name, seconds, ffmpeg_cpu_seconds)
+
+    def current_speed(self):
+        """Bytes/s of the last sample, while the file is downloading."""
+        with self._lock:
+            if self.downloaded_at or not self.samples:
+                return 0
+            return self.samples[-1][1]
+
+    def phases(self):
+        """Seconds spent in each of PHASES so far; phases that didn't happen are left out."""
+        end = self.finished_at or time.monotonic()
+        spans = {'queued': (self.started_at or end) - self.queued_at}
+        if self.started_at is not None:
+            spans['setup'] = (self.first_byte_at or self.downloaded_at or end) - self.started_at
+        if self.first_byte_at is not None:
+            spans['transfer'] = (self.downloaded_at or end) - self.first_byte_at
+        if self.downloaded_at is not None:
+            spans['postprocess'] = end - self.downloaded_at
+        return {phase: round(max(0, seconds), 4) for phase, seconds in spans.items()}
+
+    def summary(self, error=None):
+        job = self.job
+        phases = self.phases()
+        with self._lock:
+            record = {
+                'event': 'job',
+                'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'job': job.id,
+                'url': job.url,
+                'title': job.title,
+                'format_id': job.format_id,
+                'media_type': job.media_type,
+                'concurrent_fragments': job.profile.concurrent_fragments,
+                'external_downloader': job.profile.external_downloader if job.profile.uses_external_downloader() else None,
+                'status': job.status,
+                'attempts': job.attempts,
+                'skipped': job.skipped,
+                'filename': job.filename,
+                'phases': phases,
+                'extract_seconds': self.extract_seconds,
+                'extract_cached': self.extract_cached,
+                'bytes': self.bytes,
+                'mean_bytes_per_second': round(self.bytes / phases['transfer']) if phases.get('transfer') else None,
+                'bytes_per_second': list(self.samples),
+                'sample_seconds': self.sample_interval,
+                'retries': self.retries,
+                'fragment_retries': self.fragment_retries,
+                'fragments_skipped': self.fragments_skipped,
+                'postprocess': {name: round(seconds, 4) for name, seconds in self.postprocess.items()},
+                'ffmpeg_cpu_seconds': round(self.ffmpeg_cpu_seconds, 4) if self.ffmpeg_cpu_seconds is not None else None,
+            }
+        if error is not None:
+            # yt-dlp wraps the real error in a DownloadError; its type says more (HTTPError, ...)
+            cause = (getattr(error, 'exc_info', None) or (None, None))[1]
+            record['error_type'] = type(cause or error).__name__
+            record['error'] = str(error)
+        return record
+
+    def _sample(self, now, final=False):
+        if self._sample_at is None:
+            self._sample_at, self._sample_bytes = now, self.bytes
+            return
+        elapsed = now - self._sample_at
+        # A file's last, shorter interval is kept too, so short downloads get a sample
+        if elapsed < self.sample_interval and not (final and elapsed > 0 and self.bytes > self._sample_bytes):
+            return
+        self.samples.append([round(now - (self.started_at or self.queued_at), 1),
+                             round((self.bytes - self._sample_bytes) / elapsed)])
+        self._sample_at, self._sample_bytes = now, self.bytes
+        if len(self.samples) > self.max_samples:
+            # Halve the resolution instead of dropping the start of a long download
+            self.samples = [[second[0], (first[1] + second[1]) // 2]
+                            for first, second in zip(self.samples[::2], self.samples[1::2])]
+            self.sample_interval *= 2
+
+
+class DownloadMetrics:
+    """
+    Collects the JobMetrics of a DownloadQueue's jobs and the latency of
+    stream extractions, writes them to a JSON-lines log at `log_path` (if
+    given) and keeps running totals for the Prometheus endpoint.
+    """
+
+    def __init__(self, log_path=None, max_log_bytes=5 * 1024 * 1024):
+        self.log_path = log_path
+        self.max_log_bytes = max_log_bytes # The log is moved to <log_path>.1 when it grows past this
+        self.totals = {'bytes': 0, 'retries': 0, 'fragment_retries': 0, 'fragments_skipped': 0,
+                       'ffmpeg_cpu_seconds': 0.0}
+        self.downloads = {} # Final status -> count
+        self.phase_seconds = dict.fromkeys(PHASES, 0.0)
+        self.extractions = {True: [0, 0.0], False: [0, 0.0]} # Cached -> [count, seconds]
+        self.postprocessors = {} # Name -> [count, seconds]
+        self._active = {} # Job id -> JobMetrics of queued and running jobs
+        self._recent_extractions = OrderedDict() # Video key (or URL) -> (seconds, cached) of the last extractions
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._server = None
+
+    def observe_extraction(self, url, seconds, cached=False, key=None):
+        """
+        Records how long getting the stream information for `url` took (see
+        downloader_core.fetch_info). `key` (downloader_core.cache_key_for_info)
+        names the video, so jobs queued with another URL for it find the time.
+        """
+        key = key or url
+        with self._lock:
+            count_and_sum = self.extractions[bool(cached)]
+            count_and_sum[0] += 1
+            count_and_sum[1] += seconds
+            self._recent_extractions[key] = (seconds, bool(cached))
+            self._recent_extractions.move_to_end(key)
+            while len(self._recent_extractions) > 256:
+                self._recent_extractions.popitem(last=False)
+        if not cached:
+            self.write({'event': 'extraction', 'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        'url': url, 'seconds': round(seconds, 4)})
+
+    def job_queued(self, job):
+        job.metrics = JobMetrics(job, self)
+        with self._lock:
+            self._active[job.id] = job.metrics
+
+    def job_started(self, job):
+        if job.metrics and job.metrics.started_at is None: # A retry's backoff counts as setup
+            job.metrics.started_at = time.monotonic()
+
+    def job_finished(self, job, error=None, extraction_key=None):
+        metrics = job.metrics
+        if metrics is None:
+            return
+        metrics.finished_at = time.monotonic()
+        if metrics.extract_seconds is None:
+            # Fetched before it was queued (GUI) or by its worker (CLI)
+            with self._lock:
+                extraction = self._recent_extractions.get(extraction_key or job.url)
+            if extraction:
+                metrics.record_extraction(*extraction)
+        record = metrics.summary(error)
+        with self._lock:
+            self._active.pop(job.id, None)
+            self.downloads[job.status] = self.downloads.get(job.status, 0) + 1
+            for phase, seconds in record['phases'].items():
+                self.phase_seconds[phase] += seconds
+        self.write(record)
+
+    def add(self, name, value):
+        with self._lock:
+            self.totals[name] += value
+
+    def add_postprocess(self, name, seconds, ffmpeg_cpu_seconds=None):
+        with self._lock:
+            count_and_sum = self.postprocessors.setdefault(name, [0, 0.0])
+            count_and_sum[0] += 1
+            count_and_sum[1] += seconds
+            if ffmpeg_cpu_seconds is not None:
+                self.totals['ffmpeg_cpu_seconds'] += ffmpeg_cpu_seconds
+
+    def write(self, record):
+        """Appends one JSON line to the log (best effort; metrics never fail a download)."""
+        if not self.log_path:
+            return
+        line = json.dumps(record) + "\n"
+        with self._log_lock:
+            try:
+                if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > self.max_log_bytes:
+                    os.replace(self.log_path, self.log_path + ".1")
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError:
+                pass
+
+    def render_prometheus(self):
+        """The current totals in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        with self._lock:
+            active = list(self._active.values())
+            metric("ytdl_downloads_total", "counter", "Finished download jobs by final status.",
+                   [({'status': status}, count) for status, count in sorted(self.downloads.items())])
+            metric("ytdl_downloaded_bytes_total", "counter", "Bytes downloaded by all jobs.",
+                   [({}, self.totals['bytes'])])
+            metric("ytdl_retries_total", "counter", "Retried requests reported by yt-dlp.",
+                   [({'kind': 'request'}, self.totals['retries']),
+                    ({'kind': 'fragment'}, self.totals['fragment_retries'])])
+            metric("ytdl_fragments_skipped_total", "counter", "DASH/HLS fragments given up on.",
+                   [({}, self.totals['fragments_skipped'])])
+            metric("ytdl_phase_seconds_total", "counter", "Wall-clock seconds finished jobs spent in each phase.",
+                   [({'phase': phase}, round(seconds, 4)) for phase, seconds in self.phase_seconds.items()])
+            metric("ytdl_extraction_seconds", "summary", "Time to get the stream information of a URL.",
+                   [])
+            for cached, (count, seconds) in self.extractions.items():
+                cache = 'hit' if cached else 'miss'
+                lines.append(f'ytdl_extraction_seconds_sum{{cache="{cache}"}} {round(seconds, 4)}')
+                lines.append(f'ytdl_extraction_seconds_count{{cache="{cache}"}} {count}')
+            metric("ytdl_postprocess_seconds", "summary", "Wall-clock time of post-processing steps.", [])
+            for name, (count, seconds) in sorted(self.postprocessors.items()):
+                lines.append(f'ytdl_postprocess_seconds_sum{{postprocessor="{name}"}} {round(seconds, 4)}')
+                lines.append(f'ytdl_postprocess_seconds_count{{postprocessor="{name}"}} {count}')
+            metric("ytdl_ffmpeg_cpu_seconds_total", "counter", "CPU time used by FFmpeg.",
+                   [({}, round(self.totals['ffmpeg_cpu_seconds'], 4))])
+        running = [metrics for metrics in active if metrics.started_at is not None]
+        metric("ytdl_jobs", "gauge", "Jobs waiting for a worker or running.",
+               [({'state': 'queued'}, len(active) - len(running)), ({'state': 'running'}, len(running))])
+        metric("ytdl_download_bytes_per_second", "gauge", "Current download speed of all running jobs.",
+               [({}, sum(metrics.current_speed() for metrics in running))])
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves render_prometheus() at http://host:port/metrics from a background thread; returns the URL."""
+        # Imported here: http.server is slow to import and most runs don't serve metrics
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass # Scrapes would flood the console
+
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != "/metrics":
+                    return self.send_error(404)
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
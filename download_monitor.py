@@ -0,0 +1,59 @@
+"""
+Progress for downloads run by an external downloader.
+
+Kept apart from performance_profile so that choosing a profile doesn't
+import yt_dlp; this module is only imported once a download starts.
+"""
+import os
+import re
+import threading
+
+from yt_dlp.postprocessor import PostProcessor
+
+
+class ExternalDownloadMonitor(PostProcessor):
+    """
+    External downloaders don't call yt-dlp's progress hooks until they
+    finish. Registered as a 'before_dl' postprocessor, this watches the
+    growing .part files of the video instead and reports their size to the
+    hooks as regular "downloading" progress.
+    """
+
+    # Partial files, fragments and the per-format files of a merge; not aria2c's control files
+    _PARTIAL_RE = re.compile(r'(\.part(-Frag\d+)?|\.f[\w-]+\.\w+)$')
+
+    def __init__(self, progress_hooks, interval=0.5):
+        super().__init__()
+        self.progress_hooks = progress_hooks
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self, info):
+        self.stop()
+        formats = info.get('requested_formats') or [info]
+        total = sum(f.get('filesize') or f.get('filesize_approx') or 0 for f in formats) or None
+        self._stop_event = threading.Event()
+        threading.Thread(target=self._poll, args=(info['_filename'], total, self._stop_event),
+                         daemon=True).start()
+        return [], info
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _poll(self, filename, total, stop_event):
+        directory = os.path.dirname(filename) or "."
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        while not stop_event.wait(self.interval):
+            try:
+                names = [name for name in os.listdir(directory)
+                         if name.startswith(stem) and self._PARTIAL_RE.search(name[len(stem):])]
+                downloaded = sum(os.path.getsize(os.path.join(directory, name)) for name in names)
+            except OSError:
+                continue # Files are renamed under our feet when a part finishes
+            if not downloaded or stop_event.is_set():
+                continue
+            status = {'status': 'downloading', 'downloaded_bytes': downloaded, 'filename': filename}
+            if total:
+                status['total_bytes'] = max(total, downloaded)
+            for hook in self.progress_hooks:
+                hook(status)
@@ -0,0 +1,289 @@
+"""
+Headless batch downloader built on downloader_core (no Tkinter needed).
+
+Examples:
+    python downloader_cli.py urls.txt --format "best mp4 <=1080p" --output ~/Videos
+    cat urls.txt | python downloader_cli.py - --format "best audio" --workers 4
+    python downloader_cli.py --subscriptions channels.txt --interval 60 --output ~/Mirror
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import downloader_core as core
+from downloader_core import DownloadJob, DownloadQueue
+from format_ranking import DEFAULT_POLICY, load_policy, parse_size
+from job_journal import JobJournal
+from download_archive import DownloadArchive
+from performance_profile import PerformanceProfile, MiB
+from audio_transcode import AUDIO_CODECS
+from bandwidth import BandwidthScheduler, PRIORITIES, parse_rate, parse_schedule
+from subscription_sync import SubscriptionStore, SubscriptionSync
+
+
+def read_urls(source):
+    """Reads one URL per line from a file (or stdin for "-"), skipping blanks and # comments."""
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+
+def expand_urls(urls, max_workers):
+    """Expands playlist and channel URLs into their video URLs (in parallel, keeping the order)."""
+    def expand(url):
+        try:
+            _, entries = core.expand_url(url)
+        except Exception:
+            return [url] # Let the download job report the error
+        if entries is None:
+            return [url]
+        return [entry.get('url') or entry.get('webpage_url') for entry in entries]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [video_url for expanded in executor.map(expand, urls) for video_url in expanded]
+
+
+def resolve_and_download(job, policy, archive=None, queue=None):
+    """Worker body: fetches the stream info, picks the format from the policy and downloads it."""
+    if job.format is not None: # Resumed from the journal with its format already chosen
+        return core.run_download(job)
+
+    info = core.fetch_info(job.url)
+    job.title = info.get('title') or job.url
+    job.info = info # Download from the fetched info instead of extracting again
+    if archive and archive.find(core.job_video_key(job), policy.media_type):
+        job.skipped = True # Only known to be archived now that we have the real video id
+        return None
+
+    job.format = policy.select(info)
+    if job.format is None:
+        raise RuntimeError(f"No format matches \"{policy}\"")
+    job.url = info.get('webpage_url') or job.url
+    core.avoid_output_collision(job, archive, queue.active_jobs() if queue else ())
+    return core.run_download(job) # A Future while an audio conversion is still running
+
+
+def sync_subscriptions(args, queue_url):
+    """
+    Runs the subscription sync of --subscriptions: once with --once,
+    otherwise until interrupted. New videos go to `queue_url(url, title)`.
+    Returns how many new videos were already in the archive.
+    """
+    skipped = [0]
+    lock = threading.Lock()
+
+    def on_new_entries(source, entries):
+        for entry in entries:
+            if not queue_url(entry.get('url') or entry.get('webpage_url'), entry.get('title')):
+                with lock:
+                    skipped[0] += 1
+
+    def print_check(url, result):
+        if isinstance(result, Exception):
+            print(f"[sync failed] {url}: {result}", file=sys.stderr, flush=True)
+        elif result:
+            print(f"[sync] {url}: {result} new", flush=True)
+
+    sync = SubscriptionSync(SubscriptionStore(args.subscription_state), on_new_entries,
+                            interval=args.interval * 60, jitter=args.jitter,
+                            check_workers=args.check_workers, initial=args.initial)
+    if args.once:
+        for url, result in sync.run_once(read_urls(args.subscriptions)).items():
+            print_check(url, result)
+        return skipped[0]
+
+    print(f"Syncing the subscriptions in {args.subscriptions} every {args.interval:g} minutes; "
+          "press Ctrl+C to stop", flush=True)
+    sync.run(lambda: read_urls(args.subscriptions), threading.Event(), on_checked=print_check)
+    return skipped[0]
+
+
+def make_job_update_printer(archive=None):
+    def print_job_update(job):
+        if job.status == DownloadJob.FAILED:
+            print(f"[failed] {job.title}: {job.error}", file=sys.stderr, flush=True)
+        elif job.status == DownloadJob.QUEUED and job.retry_at is not None:
+            delay = max(0, job.retry_at - time.monotonic())
+            print(f"[retry] {job.title} in {delay:.0f}s (attempt {job.attempts + 1}): {job.error}",
+                  file=sys.stderr, flush=True)
+        elif job.status == DownloadJob.DONE and job.skipped:
+            print(f"[skip] {job.title} (already downloaded)", flush=True)
+        elif job.status == DownloadJob.DONE:
+            if archive:
+                core.record_in_archive(archive, job)
+            print(f"[done] {job.title} (format {job.format_id})", flush=True)
+    return print_job_update
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Download a list of YouTube URLs without the GUI.")
+    parser.add_argument("urls", nargs="?", help='file with one URL per line, or "-" to read from stdin')
+    parser.add_argument("-f", "--format", default=DEFAULT_POLICY,
+                        help='format policy, e.g. "best mp4 <=1080p", "smallest av1 vp9 h264 >=720p" or '
+                             '"best audio", or a JSON policy file (default: %(default)s)')
+    parser.add_argument("-o", "--output", default=os.path.join(os.path.expanduser("~"), "Downloads"),
+                        help="download folder (default: %(default)s)")
+    parser.add_argument("-j", "--workers", type=int, default=3,
+                        help="number of parallel downloads (default: %(default)s)")
+    parser.add_argument("--retries", type=int, default=4, metavar="ATTEMPTS",
+                        help="attempts per fetch and download when the server is busy or the network fails "
+                             "(default: %(default)s)")
+    parser.add_argument("--audio-codec", choices=sorted(AUDIO_CODECS), default=None,
+                        help="convert audio to this codec (default: keep the source codec without re-encoding)")
+    parser.add_argument("--audio-bitrate", type=int, metavar="KBPS", default=None,
+                        help="convert audio to this bitrate (default: keep the source stream)")
+    parser.add_argument("--fragments", type=int, default=4,
+                        help="DASH/HLS fragments to download at the same time (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=float, default=10,
+                        help="HTTP chunk size in MiB, 0 for a single request (default: %(default)s)")
+    parser.add_argument("--buffer-size", type=int, default=None,
+                        help="download buffer size in KiB (default: yt-dlp's)")
+    parser.add_argument("--external-downloader", metavar="NAME", default=None,
+                        help='external downloader to use when it is on PATH, e.g. "aria2c"')
+    parser.add_argument("--connections", type=int, default=16,
+                        help="connections per file for the external downloader (default: %(default)s)")
+    parser.add_argument("--limit-rate", metavar="RATE", default=None,
+                        help='total bandwidth for all downloads, e.g. "2M" (default: unlimited)')
+    parser.add_argument("--schedule", default=None,
+                        help='time-of-day limits overriding --limit-rate, e.g. "09:00-17:00=1M;22:00-06:00=unlimited"')
+    parser.add_argument("--priority", choices=list(PRIORITIES), default="normal",
+                        help="priority of the queued downloads (default: %(default)s)")
+    parser.add_argument("--temp-dir", default=None,
+                        help="download and post-process in this folder (e.g. on an SSD), then move finished files "
+                             "into --output (default: straight into --output)")
+    parser.add_argument("--min-free", default="512MB", metavar="SIZE",
+                        help="disk space to leave free; downloads that don't fit wait or fail before they start "
+                             "(default: %(default)s)")
+    parser.add_argument("--cache-ttl", type=int, default=3600,
+                        help="seconds to reuse cached stream information, 0 disables the cache (default: %(default)s)")
+    parser.add_argument("--clear-cache", action="store_true", help="empty the stream information cache first")
+    parser.add_argument("--archive", default=os.path.join(core.app_data_dir(), "archive.sqlite3"),
+                        help="archive of finished downloads, shared with the GUI (default: %(default)s)")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="don't skip or record archived downloads")
+    parser.add_argument("--journal", default=os.path.join(core.app_data_dir(), "batch_jobs.sqlite3"),
+                        help="job journal used for --resume (default: %(default)s)")
+    parser.add_argument("--resume", action="store_true",
+                        help="first resume the jobs that were unfinished when the last run stopped")
+    parser.add_argument("--metrics-log", default=os.path.join(core.app_data_dir(), "metrics.jsonl"),
+                        help="JSON-lines log of per-download timings, throughput and retries (default: %(default)s)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics while running")
+
+    sync = parser.add_argument_group("subscription sync")
+    sync.add_argument("--subscriptions", metavar="FILE", default=None,
+                      help="keep the channels and playlists listed in FILE (one URL per line) synced: "
+                           "check them for new videos and download those")
+    sync.add_argument("--once", action="store_true",
+                      help="check every subscription once, download what is new and exit")
+    sync.add_argument("--interval", type=float, default=60, metavar="MINUTES",
+                      help="time between checks of a subscription (default: %(default)s)")
+    sync.add_argument("--jitter", type=float, default=0.1,
+                      help="random variation of the interval, as a fraction (default: %(default)s)")
+    sync.add_argument("--check-workers", type=int, default=8,
+                      help="subscriptions checked at the same time (default: %(default)s)")
+    sync.add_argument("--initial", type=int, default=None, metavar="N",
+                      help="on the first check of a subscription only download its N newest videos "
+                           "(default: all of them)")
+    sync.add_argument("--subscription-state", default=os.path.join(core.app_data_dir(), "subscriptions.sqlite3"),
+                      help="what each subscription has seen so far (default: %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        policy = load_policy(args.format)
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        bandwidth = BandwidthScheduler(limit=parse_rate(args.limit_rate), schedule=parse_schedule(args.schedule))
+    except ValueError as e:
+        parser.error(str(e))
+
+    core.configure_cache(ttl=args.cache_ttl)
+    core.configure_retries(attempts=args.retries)
+    try:
+        core.configure_staging(args.temp_dir, parse_size(args.min_free))
+    except (OSError, ValueError) as e:
+        parser.error(f"--temp-dir/--min-free: {e}")
+    if args.clear_cache:
+        core.invalidate_cache()
+    try:
+        metrics = core.configure_metrics(args.metrics_log, args.metrics_port)
+    except OSError as e:
+        parser.error(f"can't serve metrics on port {args.metrics_port}: {e}")
+
+    profile = PerformanceProfile(concurrent_fragments=args.fragments,
+                                 http_chunk_size=int(args.chunk_size * MiB) or None,
+                                 buffer_size=args.buffer_size * 1024 if args.buffer_size else None,
+                                 external_downloader=args.external_downloader,
+                                 connections=args.connections)
+    if args.external_downloader and not profile.uses_external_downloader():
+        print(f"{args.external_downloader} not found on PATH, using the built-in downloader", file=sys.stderr)
+
+    journal = JobJournal(args.journal)
+    resumed = [DownloadJob.from_journal_row(row) for row in journal.unfinished()] if args.resume else []
+    for job in resumed:
+        job.profile = profile
+    urls = read_urls(args.urls) if args.urls else []
+    if not urls and not resumed and not args.subscriptions:
+        parser.error("no URLs given" + ("" if args.resume else " (use --resume to continue the last run)"))
+    if args.subscriptions and not os.path.exists(args.subscriptions):
+        parser.error(f"subscription list {args.subscriptions} not found")
+    urls = expand_urls(urls, max_workers=max(1, args.workers))
+    os.makedirs(args.output, exist_ok=True)
+
+    archive = None if args.no_archive else DownloadArchive(args.archive)
+    queue = DownloadQueue(lambda job: resolve_and_download(job, policy, archive, queue),
+                          max_workers=args.workers, on_update=make_job_update_printer(archive),
+                          journal=journal, bandwidth=bandwidth, metrics=metrics,
+                          retry_policy=core.get_retry_policy())
+    for job in resumed:
+        queue.submit(job)
+    skipped = 0
+
+    def queue_url(url, title=None):
+        """Queues a download of `url`; False if the archive already has it."""
+        # Skip archived videos with one index lookup, before any network request
+        video_key = core.cache_key_for_url(url) if archive else None
+        if video_key and archive.find(video_key, policy.media_type):
+            return False
+        job = DownloadJob(url, None, policy.media_type, args.output, title=title, profile=profile)
+        job.audio_codec, job.audio_bitrate = args.audio_codec, args.audio_bitrate
+        job.priority = args.priority
+        queue.submit(job)
+        return True
+
+    for url in urls:
+        if not queue_url(url):
+            skipped += 1
+    if args.subscriptions:
+        try:
+            skipped += sync_subscriptions(args, queue_url)
+        except KeyboardInterrupt:
+            # Unfinished downloads stay in the job journal
+            print("Stopped. Use --resume to continue the unfinished downloads.", file=sys.stderr, flush=True)
+            return 130
+    queue.join()
+
+    failed = sum(1 for job in queue.jobs if job.status == DownloadJob.FAILED)
+    skipped += sum(1 for job in queue.jobs if job.skipped)
+    downloaded = sum(1 for job in queue.jobs if job.status == DownloadJob.DONE and not job.skipped)
+    print(f"{downloaded} downloaded, {skipped} already downloaded, {failed} failed", flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
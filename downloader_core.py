@@ -0,0 +1,923 @@
+"""
+GUI-free core of the YouTube Downloader.
+
+Everything needed to fetch stream information, pick a format and run
+downloads lives here, so it can be used from the Tkinter GUI, from the
+batch CLI (downloader_cli.py) or from other scripts without a display.
+"""
+import os
+import copy
+import shutil
+import platform
+import threading
+import subprocess
+import itertools # For unique job ids
+from collections import deque # Pending jobs of the download queue
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# yt_dlp is imported inside the functions that use it: importing it (and with it
+# every extractor) is the largest part of the app's start-up time, see preload_yt_dlp()
+from metadata_cache import MetadataCache
+# Format helpers live in format_ranking; re-exported here for the GUI and scripts
+from format_ranking import VIDEO, AUDIO, FormatPolicy, codec_family, format_filesize, is_adaptive_pair
+from performance_profile import PerformanceProfile
+import audio_transcode
+from bandwidth import PRIORITIES
+from download_metrics import DownloadMetrics, run_measured
+from ydl_session import RetryPolicy, YdlPool, http_status, ydl_retry_sleep
+from output_staging import OutputStaging
+
+
+# Stream URLs expire after a few hours; their servers then answer 403 Forbidden or 410 Gone
+EXPIRED_URL_STATUSES = (403, 410)
+
+OUTPUT_TEMPLATE = '%(title)s.%(ext)s'
+UNIQUE_OUTPUT_TEMPLATE = '%(title)s [%(id)s].%(ext)s' # Used when two videos would get the same file name
+
+BASE_YDL_OPTS = {
+    'quiet': True, # Keep quiet for yt-dlp's default output
+    'noprogress': True, # Progress is reported through progress hooks instead
+    'no_warnings': True,
+    # Back off exponentially (with jitter) between yt-dlp's own retries instead of retrying at once
+    'retry_sleep_functions': {'http': ydl_retry_sleep, 'fragment': ydl_retry_sleep, 'extractor': ydl_retry_sleep},
+    # 'cookiefile': 'path/to/your/cookies.txt',
+}
+
+
+def preload_yt_dlp(on_ready=None):
+    """
+    Imports yt_dlp and its extractor registry in a background thread, so the
+    first fetch doesn't pay for it. Code that needs yt_dlp earlier simply
+    waits for the import to finish. `on_ready(seconds)` is called from the
+    thread when done.
+    """
+    def preload():
+        started = time.perf_counter()
+        from yt_dlp.extractor import gen_extractor_classes # Imports yt_dlp itself as well
+        list(gen_extractor_classes()) # Loads the extractor classes used by cache_key_for_url()
+        if on_ready:
+            on_ready(time.perf_counter() - started)
+
+    thread = threading.Thread(target=preload, daemon=True)
+    thread.start()
+    return thread
+
+
+def app_data_dir():
+    """Per-user folder for the app's cache and state files."""
+    if platform.system() == "Windows":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "youtubedownloader")
+
+
+_metadata_cache = None
+_metadata_cache_lock = threading.Lock()
+
+
+def configure_cache(ttl=None, max_bytes=None, path=None):
+    """Sets up the metadata cache used by fetch_info(). A TTL of 0 disables caching."""
+    global _metadata_cache
+    with _metadata_cache_lock:
+        if path is not None or _metadata_cache is None:
+            _metadata_cache = MetadataCache(path or os.path.join(app_data_dir(), "metadata_cache.sqlite3"))
+        if ttl is not None:
+            _metadata_cache.ttl = ttl
+        if max_bytes is not None:
+            _metadata_cache.max_bytes = max_bytes
+    return _metadata_cache
+
+
+def get_cache():
+    return _metadata_cache or configure_cache()
+
+
+# Extraction YoutubeDL instances, reused between fetches (see ydl_session.py)
+_ydl_pool = YdlPool()
+
+# Retries of fetches and whole downloads after transient failures (HTTP 429/5xx, timeouts)
+_retry_policy = RetryPolicy()
+
+
+def get_ydl_pool():
+    return _ydl_pool
+
+
+def configure_retries(attempts=None, base_delay=None, max_delay=None):
+    """Changes how often and how patiently transient failures are retried. Returns the RetryPolicy."""
+    if attempts is not None:
+        _retry_policy.attempts = max(1, int(attempts))
+    if base_delay is not None:
+        _retry_policy.base_delay = base_delay
+    if max_delay is not None:
+        _retry_policy.max_delay = max_delay
+    return _retry_policy
+
+
+def get_retry_policy():
+    return _retry_policy
+
+
+# Disk space reservations, and the temp directory downloads are staged in (see output_staging.py)
+_staging = OutputStaging()
+
+
+def configure_staging(temp_dir=None, min_free=None):
+    """
+    Downloads and post-processes in `temp_dir` (None: straight into the
+    save path), keeping at least `min_free` bytes free on every disk.
+    Returns the OutputStaging.
+    """
+    if temp_dir:
+        os.makedirs(temp_dir, exist_ok=True)
+    _staging.temp_dir = temp_dir
+    if min_free is not None:
+        _staging.min_free = min_free
+    return _staging
+
+
+def get_staging():
+    return _staging
+
+
+def _extract_info(url, ydl_opts):
+    """ydl.extract_info(url, download=False) on a pooled YoutubeDL, retrying transient failures."""
+    def extract():
+        with _ydl_pool.extractor(ydl_opts) as ydl:
+            return ydl.extract_info(url, download=False)
+    return _retry_policy.call(extract)
+
+
+_metrics = None
+
+
+def configure_metrics(log_path=None, port=None):
+    """
+    Starts recording download and extraction metrics: JSON lines in `log_path`
+    (default: metrics.jsonl in the app data folder) and, with a `port`, a
+    Prometheus endpoint on localhost. Returns the DownloadMetrics to pass to
+    DownloadQueue.
+    """
+    global _metrics
+    if _metrics is not None:
+        _metrics.close()
+    path = log_path or os.path.join(app_data_dir(), "metrics.jsonl")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _metrics = DownloadMetrics(path)
+    if port is not None:
+        _metrics.serve(port)
+    return _metrics
+
+
+def get_metrics():
+    """The DownloadMetrics set up by configure_metrics(), or None."""
+    return _metrics
+
+
+def cache_key_for_url(url):
+    """
+    Works out "<extractor>:<video id>" from the URL alone (no network), or
+    returns None when the URL doesn't identify a single video.
+    """
+    from yt_dlp.extractor import get_info_extractor, gen_extractor_classes
+
+    youtube_ie = get_info_extractor('Youtube') # Fast path for the common case
+    candidates = itertools.chain([youtube_ie], gen_extractor_classes())
+    for ie in candidates:
+        if ie.ie_key() != 'Generic' and ie.suitable(url):
+            video_id = ie.get_temp_id(url)
+            return f"{ie.ie_key()}:{video_id}" if video_id else None
+    return None
+
+
+def cache_key_for_info(info):
+    if info.get('extractor_key') and info.get('id'):
+        return f"{info['extractor_key']}:{info['id']}"
+    return None
+
+
+def fetch_info(url, use_cache=True):
+    """
+    Extracts the stream information for a URL without downloading anything.
+    Results are served from and stored in the metadata cache.
+    """
+    started = time.monotonic()
+    cache = get_cache() if use_cache else None
+    if cache and cache.ttl > 0:
+        key = cache_key_for_url(url)
+        cached = cache.get(key) if key else None
+        if cached is not None:
+            _observe_extraction(url, started, cached, cached=True)
+            return cached
+
+    import yt_dlp
+    info = yt_dlp.YoutubeDL.sanitize_info(_extract_info(url, BASE_YDL_OPTS))
+    _observe_extraction(url, started, info)
+
+    if cache and cache.ttl > 0 and cache_key_for_info(info):
+        cache.put(cache_key_for_info(info), info)
+    return info
+
+
+def _observe_extraction(url, started, info, cached=False):
+    if _metrics is not None:
+        _metrics.observe_extraction(url, time.monotonic() - started, cached, key=cache_key_for_info(info))
+
+
+def invalidate_cache(url=None):
+    """Forgets the cached info for one URL, or everything when `url` is None."""
+    if url is None:
+        get_cache().invalidate()
+    else:
+        key = cache_key_for_url(url)
+        if key:
+            get_cache().invalidate(key)
+
+
+def expand_url(url, _depth=0):
+    """
+    Resolves a URL with flat extraction, which only lists playlist entries
+    instead of extracting each of them.
+
+    Returns (info, entries). For a single video `info` is its full stream
+    information and `entries` is None. For playlists and channels `entries`
+    is the flat list of video entries (each has at least 'url', usually also
+    'id' and 'title'); channel tabs are expanded into their videos.
+    """
+    started = time.monotonic()
+    cache = get_cache()
+    key = cache_key_for_url(url) if cache.ttl > 0 else None
+    cached = cache.get(key) if key else None
+    if cached is not None and cached.get('formats'):
+        _observe_extraction(url, started, cached, cached=True)
+        return cached, None
+
+    import yt_dlp
+    info = _extract_info(url, dict(BASE_YDL_OPTS, extract_flat='in_playlist'))
+
+    if info.get('_type') not in ('playlist', 'multi_video'):
+        _observe_extraction(url, started, info)
+        info = yt_dlp.YoutubeDL.sanitize_info(info)
+        if cache.ttl > 0 and cache_key_for_info(info):
+            cache.put(cache_key_for_info(info), info)
+        return info, None
+
+    entries = []
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        entry_url = entry.get('url') or entry.get('webpage_url')
+        # A channel lists its tabs (Videos, Shorts, Live) as nested playlists
+        if entry.get('_type') == 'playlist' or (
+                entry.get('_type') == 'url' and (entry.get('ie_key') or '').endswith('Tab') and _depth < 2):
+            entries.extend(expand_url(entry_url, _depth + 1)[1] or [])
+        elif entry_url:
+            entries.append(entry)
+    return info, entries
+
+
+class PlaylistFetcher:
+    """
+    Fetches the full stream information of flat playlist entries through a
+    bounded thread pool. `on_result(index, info, error)` is called from a
+    pool thread as soon as each entry finishes, in completion order.
+    """
+
+    def __init__(self, entries, on_result, max_workers=8):
+        self.entries = entries
+        self.on_result = on_result
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="playlist-fetch")
+        self._cancelled = False
+
+    def start(self):
+        for index, entry in enumerate(self.entries):
+            self._executor.submit(self._fetch, index, entry)
+        self._executor.shutdown(wait=False)
+        return self
+
+    def cancel(self):
+        """Drops the entries that have not started yet and silences the rest."""
+        self._cancelled = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _fetch(self, index, entry):
+        if self._cancelled:
+            return
+        try:
+            info, error = fetch_info(entry.get('url') or entry.get('webpage_url')), None
+        except Exception as e:
+            info, error = None, e
+        if not self._cancelled:
+            self.on_result(index, info, error)
+
+
+def filter_formats(info, media_type, container=None):
+    """
+    Returns the formats of `info` that match the media type, best first
+    (ranked by the default FormatPolicy, see format_ranking).
+    """
+    return FormatPolicy(media_type, container=container).rank(info)
+
+
+def job_video_key(job):
+    """The job's "<extractor>:<video id>" key (as used by the cache and archive), or None."""
+    return (cache_key_for_info(job.info) if job.info else None) or cache_key_for_url(job.url)
+
+
+def output_stem(job):
+    """The job's output path without extension (the extension may change in post-processing)."""
+    import yt_dlp
+    with yt_dlp.YoutubeDL({'outtmpl': os.path.join(job.save_path, job.outtmpl)}) as ydl:
+        return os.path.splitext(ydl.prepare_filename(job.info))[0]
+
+
+def avoid_output_collision(job, archive=None, other_jobs=()):
+    """
+    Switches the job to UNIQUE_OUTPUT_TEMPLATE when its file name is already
+    taken by a different video: a file on disk that the archive doesn't
+    attribute to this video, or another queued/running job. Needs `job.info`.
+    Returns True if the template was changed.
+    """
+    if job.info is None or job.outtmpl == UNIQUE_OUTPUT_TEMPLATE:
+        return False
+    with _collision_lock: # So two workers can't both claim the same name
+        return _avoid_output_collision(job, archive, other_jobs)
+
+
+_collision_lock = threading.Lock()
+
+
+def _avoid_output_collision(job, archive, other_jobs):
+    stem = output_stem(job)
+    video_key = job_video_key(job)
+
+    taken = any(other is not job and getattr(other, 'output_stem', None) == stem and job_video_key(other) != video_key
+                for other in other_jobs)
+    if not taken:
+        owners = archive.owners_of(stem) if archive else set()
+        if owners:
+            taken = video_key not in owners
+        else:
+            # Not in the archive; any file with this name (ignoring the extension) is someone else's
+            directory, name = os.path.split(stem)
+            taken = os.path.isdir(directory) and any(
+                os.path.splitext(existing)[0] == name for existing in os.listdir(directory))
+
+    if taken:
+        job.outtmpl = UNIQUE_OUTPUT_TEMPLATE
+        stem = output_stem(job)
+    job.output_stem = stem
+    return taken
+
+
+def record_in_archive(archive, job):
+    """Adds a finished job to the download archive."""
+    video_key = job_video_key(job)
+    if video_key:
+        archive.add(video_key, job.media_type, job.format_id, job.title, job.filename)
+
+
+def run_download(job, progress_hook=None):
+    """
+    Downloads a single job in the calling thread. Raises on failure.
+    When the job carries its info dict, it is reused instead of extracting again.
+
+    Returns None when the job is complete, or a Future when an audio
+    transcode was handed to the process pool and is still running.
+
+    The job's disk space is reserved first (this waits while other
+    downloads hold the space it needs). With a staging temp directory the
+    file is downloaded and post-processed there, then moved into the save
+    path once it is complete.
+    """
+    reservation = _staging.reserve(job)
+    try:
+        ydl_opts = job.build_ydl_opts(progress_hook)
+        ydl_opts['outtmpl'] = os.path.join(reservation.work_dir, job.outtmpl)
+        ydl_opts['progress_hooks'] += [job.filename_hook, reservation.progress_hook]
+        ydl_opts['post_hooks'] = [job.output_hook]
+        if job.journal:
+            ydl_opts['progress_hooks'].append(job.journal.progress_hook(job))
+
+        if is_adaptive_pair(job.format_id):
+            _download_adaptive_pair(job, ydl_opts)
+        else:
+            _run_ydl(job, ydl_opts)
+
+        if not job.transcode_codec():
+            job.filename = _finalize(job, reservation, job.filename)
+            reservation.release()
+            return None
+        if not job.filename:
+            raise RuntimeError("Could not find the downloaded file to convert.")
+        transcode = audio_transcode.submit(job.filename, job.transcode_codec(), job.audio_bitrate)
+    except BaseException:
+        reservation.release()
+        raise
+    return _finalize_after(job, reservation, transcode) # Keeps the space reserved until the conversion is done
+
+
+def _finalize(job, reservation, path):
+    """Moves the finished file from the staging directory into the save path; returns its final path."""
+    started = time.monotonic()
+    final_path = reservation.finalize(path)
+    if job.metrics and final_path != path:
+        job.metrics.record_postprocess('Move', time.monotonic() - started)
+    return final_path
+
+
+def _finalize_after(job, reservation, transcode):
+    """A Future like `transcode`'s, done once the converted file is in the save path."""
+    finalized = Future()
+
+    def done(future):
+        try:
+            output_path, seconds, ffmpeg_cpu_seconds = future.result()
+            finalized.set_result((_finalize(job, reservation, output_path), seconds, ffmpeg_cpu_seconds))
+        except Exception as e:
+            finalized.set_exception(e)
+        finally:
+            reservation.release()
+
+    transcode.add_done_callback(done)
+    return finalized
+
+
+# Keys yt-dlp adds to an info dict when it picks formats; left in, they override the next pick
+# (e.g. a DASH download would fetch the previously picked video and audio instead of the job's format)
+_SELECTION_KEYS = ('requested_formats', 'requested_downloads', 'fragments', 'fragment_base_url')
+
+
+def _without_selection(info):
+    """A copy of `info` that yt-dlp can run a new format selection on."""
+    info = copy.deepcopy(info)
+    for key in _SELECTION_KEYS:
+        info.pop(key, None)
+    return info
+
+
+def _run_ydl(job, ydl_opts):
+    import yt_dlp
+    from download_monitor import ExternalDownloadMonitor
+
+    if job.bandwidth:
+        ydl_opts = dict(ydl_opts, ratelimit=job.bandwidth.ratelimit_for(job, extra_instances=1))
+
+    monitor = None
+    if job.profile.uses_external_downloader():
+        # External downloaders don't report progress while they run; follow their files instead
+        monitor = ExternalDownloadMonitor(ydl_opts['progress_hooks'])
+
+    # A YoutubeDL of its own (the options are the job's), but with the cookies of the extraction
+    with _ydl_pool.downloader(ydl_opts) as ydl:
+        if monitor:
+            ydl.add_post_processor(monitor, when='before_dl')
+        if job.bandwidth:
+            job.bandwidth.register(job, ydl)
+        try:
+            info = job.info # This thread's own; the other stream of a pair may drop job.info meanwhile
+            if info is None:
+                _extract_and_download(ydl, job)
+                return
+            try:
+                ydl.process_ie_result(_without_selection(info), download=True)
+            except yt_dlp.utils.DownloadError as e:
+                if http_status(e) not in EXPIRED_URL_STATUSES:
+                    raise # Not fixed by extracting again; transient errors are retried by the queue, with backoff
+                # The stream URLs in the info have expired; drop it and extract again
+                _forget_info(job, info)
+                _extract_and_download(ydl, job)
+        finally:
+            if monitor:
+                monitor.stop()
+            if job.bandwidth:
+                job.bandwidth.unregister(job, ydl)
+
+
+_info_lock = threading.Lock()
+
+
+def _forget_info(job, info):
+    """Drops expired `info` from the cache and the job, once even when both streams of a pair find it expired."""
+    with _info_lock:
+        if job.info is not info:
+            return # Already dropped by the other stream
+        key = cache_key_for_info(info)
+        if key:
+            get_cache().invalidate(key)
+        job.info = None
+
+
+def _extract_and_download(ydl, job):
+    """ydl.download([job.url]) in its two steps, so the extraction can be timed."""
+    started = time.monotonic()
+    ie_result = ydl.extract_info(job.url, download=False, process=False)
+    if job.metrics:
+        job.metrics.record_extraction(time.monotonic() - started)
+    ydl.process_ie_result(ie_result, download=True)
+
+
+class _PairProgress:
+    """Combines the progress of the video and audio downloads of a pair into one stream of updates."""
+
+    def __init__(self, progress_hooks):
+        self.progress_hooks = progress_hooks
+        self.filenames = [None, None]
+        self._bytes = [[0, None], [0, None]] # [downloaded, total] per stream
+        self._lock = threading.Lock()
+
+    def hook(self, index):
+        def progress_hook(d):
+            with self._lock:
+                if d['status'] == 'finished':
+                    self.filenames[index] = d.get('filename')
+                    size = d.get('total_bytes') or d.get('downloaded_bytes') or self._bytes[index][0]
+                    self._bytes[index] = [size, size]
+                elif d['status'] == 'downloading':
+                    self._bytes[index] = [d.get('downloaded_bytes') or 0,
+                                          d.get('total_bytes') or d.get('total_bytes_estimate')]
+                else:
+                    return
+                downloaded = sum(done for done, _ in self._bytes)
+                totals = [total for _, total in self._bytes]
+                combined = {'status': 'downloading', 'downloaded_bytes': downloaded}
+                if all(totals):
+                    combined['total_bytes'] = sum(totals)
+                # The pair only "finishes" after the merge, see _download_adaptive_pair()
+                for progress_hook in self.progress_hooks:
+                    progress_hook(combined)
+        return progress_hook
+
+
+def _download_adaptive_pair(job, ydl_opts):
+    """
+    Downloads the video and audio streams of a "<video>+<audio>" format at the
+    same time, then merges them with FFmpeg stream copy (no re-encoding).
+    """
+    import yt_dlp
+    if job.info is None:
+        job.info = fetch_info(job.url)
+    info = job.info
+    outtmpl = ydl_opts['outtmpl']
+    stem = os.path.splitext(outtmpl)[0]
+    progress = _PairProgress(ydl_opts['progress_hooks'])
+
+    def download_stream(index, format_id):
+        stream_opts = dict(ydl_opts,
+                           format=format_id,
+                           outtmpl=stem + '.f%(format_id)s.%(ext)s',
+                           progress_hooks=[progress.hook(index)])
+        stream_opts.pop('postprocessors', None)
+        stream_opts.pop('post_hooks', None) # The merged file is the output
+        _run_ydl(job, stream_opts)
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"job{job.id}-stream") as executor:
+        futures = [executor.submit(download_stream, index, format_id)
+                   for index, format_id in enumerate(job.format_id.split('+', 1))]
+        for future in futures:
+            future.result() # Re-raise the first failure
+
+    video_path, audio_path = progress.filenames
+    if not video_path or not audio_path:
+        raise RuntimeError("Could not find the downloaded video and audio streams to merge.")
+
+    container = job.merge_format or (job.format or {}).get('ext') or 'mkv'
+    with yt_dlp.YoutubeDL({'outtmpl': outtmpl}) as ydl:
+        output_path = ydl.prepare_filename(dict(info, ext=container))
+    merge_started = time.monotonic()
+    ffmpeg_cpu_seconds = merge_streams(video_path, audio_path, output_path)
+    if job.metrics:
+        job.metrics.record_postprocess('Merge', time.monotonic() - merge_started, ffmpeg_cpu_seconds)
+
+    size = os.path.getsize(output_path)
+    for progress_hook in ydl_opts['progress_hooks']:
+        progress_hook({'status': 'finished', 'filename': output_path,
+                       'downloaded_bytes': size, 'total_bytes': size})
+
+
+def merge_streams(video_path, audio_path, output_path):
+    """
+    Muxes a video-only and an audio-only file into `output_path` with FFmpeg
+    stream copy. Returns FFmpeg's CPU time in seconds (None if unknown).
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        raise RuntimeError("FFmpeg is required to merge the video and audio streams. Please install FFmpeg.")
+
+    base, ext = os.path.splitext(output_path)
+    temp_path = f"{base}.merging{ext}" # Keep the extension so FFmpeg picks the right container
+    cmd = [ffmpeg, '-y', '-loglevel', 'error', '-i', video_path, '-i', audio_path,
+           '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', temp_path]
+    result, cpu_seconds = run_measured(cmd)
+    if result.returncode != 0:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise RuntimeError(f"FFmpeg merge failed:\n{result.stderr.strip()}")
+
+    os.replace(temp_path, output_path)
+    for path in (video_path, audio_path):
+        os.remove(path)
+    return cpu_seconds
+
+
+class DownloadJob:
+    """
+    A single download request. Each job owns its URL, format, options and
+    progress state so several downloads can run at the same time without
+    sharing any of the GUI's mutable state.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    PROCESSING = "processing" # Downloaded, audio conversion still running
+    DONE = "done"
+    FAILED = "failed"
+    ACTIVE = (QUEUED, RUNNING, PROCESSING)
+
+    _ids = itertools.count(1)
+
+    def __init__(self, url, selected_format, media_type, save_path, title=None, info=None, profile=None):
+        self.id = next(DownloadJob._ids)
+        self.url = url
+        self.info = info # Stream information from fetch_info(), reused by the download
+        self.profile = profile or PerformanceProfile() # Fragment/chunk/downloader settings
+        self.merge_format = None # "mp4"/"mkv" for adaptive pairs, None to use the pair's own ext
+        self.priority = 'normal' # Key of bandwidth.PRIORITIES; higher priorities start first and get more bandwidth
+        self.bandwidth = None # BandwidthScheduler sharing the global rate limit, if any
+        self.audio_codec = None # Key of audio_transcode.AUDIO_CODECS, None to keep the source codec
+        self.audio_bitrate = None # kbps; setting it forces a transcode
+        self.format = selected_format
+        self.media_type = media_type # VIDEO or AUDIO
+        self.save_path = save_path
+        self.title = title or url
+        self.outtmpl = OUTPUT_TEMPLATE # File name template inside save_path
+        self.output_stem = None # Output path without extension, once known (see avoid_output_collision)
+        self.status = DownloadJob.QUEUED
+        self.percentage = 0.0
+        self.speed = None # Bytes per second
+        self.eta = None # Seconds
+        self.error = None
+        self.attempts = 0 # Times the download was started; more than one after transient failures
+        self.retry_at = None # time.monotonic() when a failed attempt is retried, while waiting for that
+        self.skipped = False # Finished without downloading, e.g. already in the download archive
+        self.downloaded_bytes = 0
+        self.total_bytes = None
+        self.filename = None # Set by yt-dlp once the output file name is known
+        self.journal = None # JobJournal that tracks this job, if any
+        self.journal_id = None
+        self.metrics = None # download_metrics.JobMetrics, while a DownloadQueue with metrics runs the job
+
+    @classmethod
+    def from_journal_row(cls, row):
+        """Rebuilds an unfinished job from its JobJournal row so it can be resumed."""
+        selected_format = {'format_id': row['format_id']} if row['format_id'] else None
+        job = cls(row['url'], selected_format, row['media_type'], row['save_path'], title=row['title'])
+        job.journal_id = row['id']
+        job.downloaded_bytes = row['downloaded_bytes'] or 0
+        job.total_bytes = row['total_bytes']
+        job.filename = row['filename']
+        job.audio_codec = row.get('audio_codec')
+        job.audio_bitrate = row.get('audio_bitrate')
+        job.outtmpl = row.get('outtmpl') or OUTPUT_TEMPLATE
+        job.priority = row.get('priority') or 'normal'
+        job.merge_format = row.get('merge_format')
+        return job
+
+    @property
+    def format_id(self):
+        # The format may be picked later by a worker (see downloader_cli.py)
+        return str(self.format['format_id']) if self.format else ""
+
+    def build_ydl_opts(self, progress_hook):
+        """Builds the yt-dlp options for this job."""
+        ydl_opts = {
+            'format': self.format_id,
+            'outtmpl': os.path.join(self.save_path, self.outtmpl),
+            'progress_hooks': [progress_hook] if progress_hook else [],
+            'continuedl': True, # Resume from a leftover .part file
+            **BASE_YDL_OPTS,
+            **self.profile.to_ydl_opts(),
+        }
+        if self.metrics:
+            ydl_opts['progress_hooks'].append(self.metrics.progress_hook)
+            ydl_opts['postprocessor_hooks'] = [self.metrics.postprocessor_hook]
+            ydl_opts['logger'] = self.metrics.logger # Counts retries from yt-dlp's messages
+
+        if self.media_type == AUDIO and not self.transcode_codec() and shutil.which('ffmpeg'):
+            # Move the audio stream out of its container as-is (e.g. webm -> opus) without re-encoding.
+            # Transcodes are done afterwards by audio_transcode, see run_download()
+            ydl_opts['postprocessors'] = [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'best',
+            }]
+
+        return ydl_opts
+
+    def is_fragmented(self):
+        """True if the format is downloaded in fragments (DASH/HLS)."""
+        formats = (self.format or {}).get('requested_formats') or [self.format or {}]
+        return any(protocol in (f.get('protocol') or '')
+                   for f in formats for protocol in ('m3u8', 'dash', 'ism', 'f4m'))
+
+    def transcode_codec(self):
+        """The codec to re-encode this audio job to, or None if the source stream is kept."""
+        if self.media_type != AUDIO:
+            return None
+        source_family = codec_family((self.format or {}).get('acodec'))
+        if not audio_transcode.needs_transcode(source_family, self.audio_codec, self.audio_bitrate):
+            return None
+        if self.audio_codec:
+            return self.audio_codec
+        # Only a bitrate was asked for: stay with the source codec if we can encode it
+        for codec, (_, _, families) in audio_transcode.AUDIO_CODECS.items():
+            if source_family in families:
+                return codec
+        return 'mp3'
+
+    def filename_hook(self, d):
+        """Progress hook that remembers the downloaded file's name."""
+        if d['status'] == 'finished' and d.get('filename'):
+            self.filename = d['filename']
+
+    def output_hook(self, path):
+        """yt-dlp post hook: the final file, renamed by post-processing (e.g. audio extraction) or not."""
+        self.filename = path
+
+
+class DownloadQueue:
+    """
+    Job queue served by a bounded pool of worker threads. Jobs start in
+    priority order, first come first served within the same priority.
+
+    `run_job(job)` does the actual download and raises on failure.
+    `on_update(job)` is called (from a worker thread) whenever a job changes status.
+    With a `journal` (job_journal.JobJournal), every job and its progress is
+    recorded so unfinished downloads can be resumed after a restart.
+    With `bandwidth` (bandwidth.BandwidthScheduler), the running jobs share
+    a global rate limit. With `metrics` (download_metrics.DownloadMetrics),
+    every job's timing, throughput and retries are recorded. With
+    `retry_policy` (ydl_session.RetryPolicy), a job that failed transiently
+    (rate limited, server error, timeout) goes back to the queue and is
+    started again after a backoff delay; meanwhile it stays QUEUED with
+    `retry_at` set.
+    """
+
+    def __init__(self, run_job, max_workers=3, on_update=None, journal=None, bandwidth=None, metrics=None,
+                 retry_policy=None):
+        self.run_job = run_job
+        self.on_update = on_update
+        self.journal = journal
+        self.bandwidth = bandwidth
+        self.metrics = metrics
+        self.retry_policy = retry_policy
+        self.max_workers = max(1, int(max_workers))
+        self.jobs = [] # Every job ever submitted, in submission order
+        self._pending = deque()
+        self._workers = []
+        self._cond = threading.Condition()
+
+    def submit(self, job):
+        if self.bandwidth:
+            job.bandwidth = self.bandwidth
+        if self.metrics:
+            self.metrics.job_queued(job)
+        if self.journal:
+            job.journal = self.journal
+            if job.journal_id is None: # Resumed jobs already have their row
+                self.journal.record(job)
+        with self._cond:
+            self.jobs.append(job)
+            self._pending.append(job)
+            # Only spawn a new worker if all existing ones are busy
+            if len(self._workers) < self.max_workers and len(self._pending) > self._idle_workers():
+                self._spawn_worker()
+            self._cond.notify()
+        self._notify(job)
+        return job
+
+    def set_max_workers(self, count):
+        """Grows or shrinks the worker pool. Shrinking lets running jobs finish first."""
+        with self._cond:
+            self.max_workers = max(1, int(count))
+            while len(self._workers) < min(self.max_workers, len(self._pending) + self._busy):
+                self._spawn_worker()
+            self._cond.notify_all()
+
+    def join(self):
+        """Blocks until every submitted job has finished."""
+        with self._cond:
+            while any(job.status in DownloadJob.ACTIVE for job in self.jobs):
+                self._cond.wait()
+
+    def active_jobs(self):
+        with self._cond:
+            return [job for job in self.jobs if job.status in DownloadJob.ACTIVE]
+
+    def _idle_workers(self):
+        return len(self._workers) - self._busy
+
+    @property
+    def _busy(self):
+        return sum(1 for job in self.jobs if job.status == DownloadJob.RUNNING)
+
+    def _spawn_worker(self):
+        worker = threading.Thread(target=self._worker, daemon=True)
+        self._workers.append(worker)
+        worker.start()
+
+    def _worker(self):
+        me = threading.current_thread()
+        while True:
+            with self._cond:
+                while len(self._workers) <= self.max_workers:
+                    wait = self._pending_wait()
+                    if wait == 0:
+                        break
+                    self._cond.wait(wait) # None: until something is submitted
+                if len(self._workers) > self.max_workers:
+                    self._workers.remove(me)
+                    return
+                job = self._next_pending()
+                job.status = DownloadJob.RUNNING
+                job.retry_at = None
+                job.attempts += 1
+            if self.metrics:
+                self.metrics.job_started(job)
+            self._notify(job)
+
+            try:
+                pending = self.run_job(job)
+            except Exception as e:
+                if not self._retry(job, e):
+                    self._finish(job, error=e)
+                continue
+
+            if pending is None:
+                self._finish(job)
+            else:
+                # Post-processing continues elsewhere (a Future); free this worker for the next download
+                job.status = DownloadJob.PROCESSING
+                self._notify(job)
+                pending.add_done_callback(lambda future, job=job: self._finish_processing(job, future))
+
+    def _pending_wait(self):
+        """0 if a pending job can start, else seconds until the next retry is due (None: nothing pending)."""
+        if not self._pending:
+            return None
+        now = time.monotonic()
+        return max(0, min(job.retry_at or now for job in self._pending) - now)
+
+    def _next_pending(self):
+        # Highest priority first, first come first served within a priority; retries once their delay is over
+        now = time.monotonic()
+        ready = [job for job in self._pending if (job.retry_at or now) <= now]
+        job = max(ready, key=lambda j: PRIORITIES.get(j.priority, PRIORITIES['normal']))
+        self._pending.remove(job)
+        return job
+
+    def _retry(self, job, error):
+        """Queues the job again if `error` is transient and attempts are left. Returns whether it did."""
+        delay = self.retry_policy.delay_for(error, job.attempts) if self.retry_policy else None
+        if delay is None:
+            return False
+        job.error = str(error) # Shown while waiting, see DownloadJob.retry_at
+        job.speed = job.eta = None
+        with self._cond:
+            job.retry_at = time.monotonic() + delay
+            job.status = DownloadJob.QUEUED
+            self._pending.append(job)
+            self._cond.notify()
+        self._notify(job)
+        return True
+
+    def _finish_processing(self, job, future):
+        try:
+            job.filename, seconds, ffmpeg_cpu_seconds = future.result()
+        except Exception as e:
+            self._finish(job, error=e)
+        else:
+            if job.metrics:
+                job.metrics.record_postprocess('AudioTranscode', seconds, ffmpeg_cpu_seconds)
+            self._finish(job)
+
+    def _finish(self, job, error=None):
+        if error is None:
+            job.percentage = 100.0
+            job.status = DownloadJob.DONE
+            job.error = None # From a failed attempt before
+        else:
+            job.error = str(error)
+            job.status = DownloadJob.FAILED
+        if self.metrics:
+            # Keyed by video, as the job's URL may not be the one its info was fetched with
+            self.metrics.job_finished(job, error, extraction_key=cache_key_for_info(job.info or {}))
+        self._notify(job)
+        with self._cond:
+            self._cond.notify_all() # Wake up join()
+
+    def _notify(self, job):
+        if self.journal:
+            self.journal.update(job)
+        if self.on_update:
+            self.on_update(job)
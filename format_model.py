@@ -0,0 +1,91 @@
+"""
+Compact, precomputed model of a video's formats for the stream table.
+
+The formats of one video are classified and reduced to small rows once;
+switching between video and audio, filtering and sorting then work on
+these rows instead of going back to the full stream information.
+"""
+import downloader_core as core
+from format_ranking import estimated_size
+
+
+class FormatRow:
+    """One selectable format, with the fields the stream table shows, filters and sorts on."""
+    __slots__ = ('format', 'format_id', 'kind', 'height', 'fps', 'codec', 'codec_label',
+                 'ext', 'bitrate', 'filesize', 'size_is_estimate')
+
+    def __init__(self, fmt, media_type, duration=None):
+        self.format = fmt # The yt-dlp format dict (or synthetic video+audio pair) to download
+        self.format_id = fmt.get('format_id')
+        self.height = fmt.get('height')
+        self.fps = fmt.get('fps')
+        self.ext = fmt.get('ext')
+        self.filesize = estimated_size(fmt, duration) # Estimated from the bitrate if yt-dlp has no size
+        self.size_is_estimate = not fmt.get('filesize')
+        vcodec, acodec = core.codec_family(fmt.get('vcodec')), core.codec_family(fmt.get('acodec'))
+        if media_type == core.VIDEO:
+            self.kind = "video+audio" if core.is_adaptive_pair(self.format_id) else "progressive"
+            self.codec = vcodec # Filtered on; the audio codec only shows in the label
+            self.codec_label = f"{vcodec}+{acodec}" if vcodec and acodec else vcodec or acodec
+            self.bitrate = fmt.get('tbr')
+        else:
+            self.kind = "audio"
+            self.codec = self.codec_label = acodec
+            self.bitrate = fmt.get('abr') or fmt.get('tbr')
+
+    def container(self, merge_format=None):
+        """The file extension the download ends up with; merged pairs may be forced to `merge_format`."""
+        if self.kind == "video+audio" and merge_format:
+            return merge_format
+        return self.ext
+
+
+class FormatModel:
+    # Column -> sort key on a FormatRow; rows without a value always sort last
+    SORT_KEYS = {
+        'resolution': lambda row: row.height,
+        'fps': lambda row: row.fps,
+        'codec': lambda row: row.codec_label or None,
+        'container': lambda row: row.ext,
+        'bitrate': lambda row: row.bitrate,
+        'size': lambda row: row.filesize,
+        'kind': lambda row: row.kind,
+    }
+
+    def __init__(self, info):
+        self.info = info
+        self._rows = {} # Media type -> rows, best first (built on first use)
+
+    def rows(self, media_type):
+        if media_type not in self._rows:
+            self._rows[media_type] = [FormatRow(fmt, media_type, (self.info or {}).get('duration'))
+                                      for fmt in core.filter_formats(self.info, media_type)]
+        return self._rows[media_type]
+
+    def codecs(self, media_type):
+        return sorted({row.codec for row in self.rows(media_type) if row.codec})
+
+    def containers(self, media_type, merge_format=None):
+        return sorted({row.container(merge_format) for row in self.rows(media_type) if row.container(merge_format)})
+
+    def heights(self, media_type):
+        return sorted({row.height for row in self.rows(media_type) if row.height}, reverse=True)
+
+    def filter(self, media_type, codec=None, height=None, container=None, max_size=None, merge_format=None):
+        """
+        Rows of `media_type` matching every given filter. `max_size` is in
+        bytes; formats of unknown size are kept, since they may well fit.
+        """
+        return [row for row in self.rows(media_type)
+                if (not codec or row.codec == codec)
+                and (not height or row.height == height)
+                and (not container or row.container(merge_format) == container)
+                and (not max_size or not row.filesize or row.filesize <= max_size)]
+
+    @classmethod
+    def sort(cls, rows, column, descending=False):
+        """Sorts rows by a column of SORT_KEYS; a stable sort, so ties keep the best-first order."""
+        key = cls.SORT_KEYS[column]
+        known = [row for row in rows if key(row) is not None]
+        unknown = [row for row in rows if key(row) is None]
+        return sorted(known, key=key, reverse=descending) + unknown
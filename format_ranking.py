@@ -0,0 +1,332 @@
+"""
+Format ranking engine.
+
+A FormatPolicy states what a good download looks like: media type,
+preferred codecs (e.g. av1 > vp9 > h264), resolution bounds, a size cap, a
+bitrate floor, a container, and whether to go for the best quality or the
+smallest file that still meets the bar. It scores every candidate format
+of a video in one pass and ranks them. The GUI's stream list, its default
+pick and the batch CLI all use the same policies.
+
+Policies can be written as a few words ("best mp4 <=1080p", "smallest
+av1 vp9 h264 >=720p <=500MB") or as a dict / JSON object with the same
+fields.
+"""
+import json
+import os
+import re
+
+
+VIDEO = "Video"
+AUDIO = "Audio"
+
+DEFAULT_POLICY = "best mp4 video" # Used by the CLI's --format and the GUI's auto-pick unless changed
+
+# Codecs that can be stream-copied into an mp4 container; anything else is merged into mkv
+MP4_VIDEO_CODECS = ('avc1', 'avc3', 'h264', 'hev1', 'hvc1', 'av01')
+MP4_AUDIO_CODECS = ('mp4a', 'aac')
+
+
+def codec_family(codec):
+    """Returns the codec name without its profile ("avc1.640028" -> "avc1"), or "" if there is none."""
+    codec = (codec or '').split('.')[0].lower()
+    return '' if codec == 'none' else codec
+
+
+def merge_container(video_format, audio_format):
+    """The container a video-only and an audio-only format can be stream-copied into."""
+    if (codec_family(video_format.get('vcodec')) in MP4_VIDEO_CODECS
+            and codec_family(audio_format.get('acodec')) in MP4_AUDIO_CODECS):
+        return 'mp4'
+    return 'mkv'
+
+
+def adaptive_pairs(all_formats, container=None):
+    """
+    Pairs every video-only format with the best audio-only format, as a
+    synthetic format whose format_id is "<video>+<audio>". Audio that fits
+    the video in an mp4 is preferred, so most pairs merge into mp4.
+    With `container` only pairs that can go into it are kept, so none for
+    containers other than "mp4" and "mkv".
+    """
+    videos = [f for f in all_formats if f.get('vcodec') not in (None, 'none') and f.get('acodec') == 'none']
+    audios = sorted((f for f in all_formats if f.get('acodec') not in (None, 'none') and f.get('vcodec') == 'none'),
+                    key=lambda x: x.get('abr') or x.get('tbr') or 0, reverse=True)
+    if not audios:
+        return []
+    mp4_audios = [f for f in audios if codec_family(f.get('acodec')) in MP4_AUDIO_CODECS]
+
+    pairs = []
+    for video in videos:
+        wants_mp4 = codec_family(video.get('vcodec')) in MP4_VIDEO_CODECS and container != 'mkv'
+        audio = mp4_audios[0] if wants_mp4 and mp4_audios else audios[0]
+        ext = merge_container(video, audio) if container != 'mkv' else 'mkv'
+        if container and ext != container:
+            continue
+        sizes = [format_filesize(video), format_filesize(audio)]
+        pairs.append({
+            'format_id': f"{video['format_id']}+{audio['format_id']}",
+            'ext': ext,
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'fps': video.get('fps'),
+            'vcodec': video.get('vcodec'),
+            'acodec': audio.get('acodec'),
+            'abr': audio.get('abr'),
+            'tbr': (video.get('tbr') or 0) + (audio.get('tbr') or 0) or None,
+            # Exact only if both sizes are known
+            'filesize': sum(sizes) if all(f.get('filesize') for f in (video, audio)) else None,
+            'filesize_approx': sum(sizes) if all(sizes) else None, # A partial sum would pass size caps it breaks
+            'requested_formats': [video, audio],
+        })
+    return pairs
+
+
+def candidate_formats(info, media_type, container=None):
+    """
+    The formats of `info` that can be downloaded as `media_type`, unranked.
+    Video offers progressive formats (video and audio in one file, mp4 unless
+    another container is given) together with adaptive video+audio pairs,
+    which reach resolutions progressive formats don't. Audio keeps
+    audio-only formats.
+    """
+    all_formats = (info or {}).get('formats') or []
+    if media_type == VIDEO:
+        formats = [f for f in all_formats
+                   if f.get('vcodec') != 'none' and f.get('acodec') != 'none'
+                   and f.get('ext') == (container or 'mp4')]
+        return formats + adaptive_pairs(all_formats, container)
+    return [f for f in all_formats
+            if f.get('acodec') != 'none' and f.get('vcodec') == 'none'
+            and (container is None or f.get('ext') == container)]
+
+
+def format_filesize(fmt):
+    """Returns the (possibly approximate) size of a format in bytes, or None."""
+    return fmt.get('filesize') or fmt.get('filesize_approx')
+
+
+def is_adaptive_pair(format_id):
+    return '+' in (format_id or '')
+
+
+# Names accepted in policies -> codec family as found in yt-dlp's vcodec/acodec
+CODEC_ALIASES = {
+    'av1': 'av01', 'av01': 'av01',
+    'vp9': 'vp9', 'vp09': 'vp9', 'vp8': 'vp8',
+    'h264': 'avc1', 'avc': 'avc1', 'avc1': 'avc1', 'avc3': 'avc1',
+    'h265': 'hevc', 'hevc': 'hevc', 'hvc1': 'hevc', 'hev1': 'hevc',
+    'aac': 'mp4a', 'mp4a': 'mp4a', 'opus': 'opus', 'vorbis': 'vorbis', 'mp3': 'mp3', 'flac': 'flac',
+}
+
+# Container (file extension) names accepted in policies; mp3, opus and flac are codecs there
+CONTAINERS = ('mp4', 'webm', 'mkv', 'm4a', 'mov', 'flv', '3gp', 'ogg', 'wav', 'ts')
+
+_SIZE_UNITS = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def normalize_codec(codec):
+    """Maps a codec string or policy name ("vp09.00.40.08", "h264") to its family ("vp9", "avc1")."""
+    family = codec_family(codec)
+    return CODEC_ALIASES.get(family, family)
+
+
+def estimated_size(fmt, duration=None):
+    """The format's size in bytes: exact, approximate, or from its bitrate and the duration; else None."""
+    size = format_filesize(fmt)
+    if not size and fmt.get('tbr') and duration:
+        size = int(fmt['tbr'] * 1000 / 8 * duration) # tbr is in kbit/s
+    return size
+
+
+def parse_size(text):
+    """ "500MB", "1.5GiB" or a plain number of bytes -> bytes."""
+    match = re.match(r'^(\d+(?:\.\d+)?)\s*([kmg])?i?b?$', str(text).strip().lower())
+    if not match:
+        raise ValueError(f"Invalid size: {text!r} (use e.g. 500MB or 2GB)")
+    return int(float(match.group(1)) * _SIZE_UNITS.get(match.group(2), 1))
+
+
+class FormatPolicy:
+    """
+    A format selection rule such as "best mp4 <=1080p", "best audio" or
+    "smallest av1 vp9 h264 >=720p <=500MB".
+
+    Words (in any order):
+      best / worst / smallest   highest quality, lowest quality, or the smallest
+                                file that passes the other rules (default: best)
+      video / audio             media type (default: video)
+      av1, vp9, h264, aac, ...  preferred codecs, most preferred first
+                                (also "av1,vp9,h264"); other codecs rank after them
+      mp4, webm, m4a...         required container (see CONTAINERS)
+      <=1080p / >=720p          maximum / minimum video height (a bare 1080p is a maximum)
+      <=500MB                   maximum file size (KB, MB, GB)
+      >=128k                    minimum bitrate in kbit/s ("k", "kbps" or "mbps")
+    """
+
+    PREFERENCES = ('best', 'worst', 'smallest')
+
+    _HEIGHT_RE = re.compile(r'^(<=|>=)?(\d+)p$')
+    _SIZE_RE = re.compile(r'^<=(\d+(?:\.\d+)?[kmg]i?b)$')
+    _BITRATE_RE = re.compile(r'^>=(\d+(?:\.\d+)?)(k|m)(?:bps)?$')
+
+    def __init__(self, media_type=VIDEO, container=None, max_height=None, min_height=None,
+                 codecs=(), max_filesize=None, min_bitrate=None, prefer='best'):
+        if prefer not in self.PREFERENCES:
+            raise ValueError(f"Unknown preference {prefer!r}, use one of: {', '.join(self.PREFERENCES)}")
+        self.media_type = media_type
+        self.container = container
+        self.max_height = max_height
+        self.min_height = min_height
+        self.codecs = [normalize_codec(codec) for codec in codecs] # Most preferred first
+        self.max_filesize = max_filesize # Bytes; formats of unknown size pass
+        self.min_bitrate = min_bitrate # kbit/s; formats of unknown bitrate pass
+        self.prefer = prefer
+
+    @classmethod
+    def parse(cls, text):
+        policy = cls()
+        # Allow "<= 1080p" as well as "<=1080p"
+        text = text.strip().lower().replace('≤', '<=').replace('≥', '>=')
+        words = re.sub(r'(<=|>=)\s+', r'\1', text).replace(',', ' ').split()
+        if not words:
+            raise ValueError("Empty format policy")
+        for word in words:
+            height_match = cls._HEIGHT_RE.match(word)
+            size_match = cls._SIZE_RE.match(word)
+            bitrate_match = cls._BITRATE_RE.match(word)
+            if word in cls.PREFERENCES:
+                policy.prefer = word
+            elif word == "video":
+                policy.media_type = VIDEO
+            elif word == "audio":
+                policy.media_type = AUDIO
+            elif height_match:
+                if height_match.group(1) == '>=':
+                    policy.min_height = int(height_match.group(2))
+                else:
+                    policy.max_height = int(height_match.group(2))
+            elif size_match:
+                policy.max_filesize = parse_size(size_match.group(1))
+            elif bitrate_match:
+                policy.min_bitrate = float(bitrate_match.group(1)) * (1000 if bitrate_match.group(2) == 'm' else 1)
+            elif word in CODEC_ALIASES:
+                policy.codecs.append(CODEC_ALIASES[word])
+            elif word in CONTAINERS:
+                policy.container = word
+            elif word.isdigit():
+                raise ValueError(f"Unknown word in format policy: {word!r} (for a height use e.g. <={word}p)")
+            else:
+                raise ValueError(f"Unknown word in format policy: {word!r}")
+        return policy
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds a policy from a dict such as one loaded from JSON:
+        {"media_type": "video", "codecs": ["av1", "vp9"], "max_height": 1080,
+         "max_filesize": "500MB", "min_bitrate": 128, "container": "mp4", "prefer": "smallest"}
+        """
+        unknown = set(data) - {'media_type', 'container', 'max_height', 'min_height', 'codecs',
+                               'max_filesize', 'min_bitrate', 'prefer'}
+        if unknown:
+            raise ValueError(f"Unknown format policy field(s): {', '.join(sorted(unknown))}")
+        media_type = str(data.get('media_type', 'video')).lower()
+        if media_type not in ('video', 'audio'):
+            raise ValueError(f"Invalid media_type: {data['media_type']!r}")
+        codecs = data.get('codecs') or ()
+        if isinstance(codecs, str):
+            codecs = codecs.replace(',', ' ').split()
+        max_filesize = data.get('max_filesize')
+        return cls(media_type=VIDEO if media_type == 'video' else AUDIO,
+                   container=data.get('container'),
+                   max_height=data.get('max_height'),
+                   min_height=data.get('min_height'),
+                   codecs=codecs,
+                   max_filesize=parse_size(max_filesize) if max_filesize is not None else None,
+                   min_bitrate=data.get('min_bitrate'),
+                   prefer=data.get('prefer', 'best'))
+
+    def to_dict(self):
+        return {
+            'media_type': self.media_type.lower(),
+            'container': self.container,
+            'max_height': self.max_height,
+            'min_height': self.min_height,
+            'codecs': list(self.codecs),
+            'max_filesize': self.max_filesize,
+            'min_bitrate': self.min_bitrate,
+            'prefer': self.prefer,
+        }
+
+    def score(self, fmt, duration=None):
+        """
+        The format's sort key (higher is better), or None if it breaks one of
+        the rules. `duration` (seconds) lets sizes be estimated from bitrates.
+        """
+        height = fmt.get('height') or 0
+        if (self.max_height and height > self.max_height) or (self.min_height and height < self.min_height):
+            return None
+        is_video = self.media_type == VIDEO
+        bitrate = (fmt.get('tbr') if is_video else fmt.get('abr') or fmt.get('tbr')) or 0
+        if self.min_bitrate and bitrate and bitrate < self.min_bitrate:
+            return None
+        size = estimated_size(fmt, duration)
+        if self.max_filesize and size and size > self.max_filesize:
+            return None
+
+        codec = normalize_codec(fmt.get('vcodec') if is_video else fmt.get('acodec'))
+        codec_rank = len(self.codecs) - self.codecs.index(codec) if codec in self.codecs else 0
+        if self.prefer == 'smallest':
+            # Known sizes first, smallest first; the codec preference breaks ties
+            return (size is not None, -(size or 0), codec_rank)
+        if is_video:
+            quality = (height, fmt.get('fps') or 0, codec_rank, bitrate)
+        else:
+            quality = (codec_rank, bitrate)
+        if self.prefer == 'worst':
+            return tuple(-value for value in quality)
+        return quality
+
+    def rank(self, info):
+        """The formats of `info` that pass the policy, best match first."""
+        duration = (info or {}).get('duration')
+        scored = []
+        for fmt in candidate_formats(info, self.media_type, self.container):
+            score = self.score(fmt, duration)
+            if score is not None:
+                scored.append((score, fmt))
+        scored.sort(key=lambda item: item[0], reverse=True) # Stable: ties keep yt-dlp's order
+        return [fmt for _, fmt in scored]
+
+    def select(self, info):
+        """Returns the format of `info` that matches the policy best, or None."""
+        ranked = self.rank(info)
+        return ranked[0] if ranked else None
+
+    def __str__(self):
+        parts = [self.prefer]
+        parts += self.codecs
+        if self.container:
+            parts.append(self.container)
+        parts.append(self.media_type.lower())
+        if self.min_height:
+            parts.append(f">={self.min_height}p")
+        if self.max_height:
+            parts.append(f"<={self.max_height}p")
+        if self.max_filesize:
+            parts.append(f"<={self.max_filesize / 1024 ** 2:g}MB")
+        if self.min_bitrate:
+            parts.append(f">={self.min_bitrate:g}k")
+        return " ".join(parts)
+
+
+def load_policy(spec):
+    """A FormatPolicy from policy words, or from a JSON file (see FormatPolicy.from_dict) if `spec` names one."""
+    if spec.strip().lower().endswith('.json') and os.path.isfile(spec.strip()):
+        with open(spec.strip(), encoding="utf-8") as f:
+            try:
+                return FormatPolicy.from_dict(json.load(f))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid format policy file {spec}: {e}")
+    return FormatPolicy.parse(spec)
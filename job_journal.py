@@ -0,0 +1,126 @@
+"""
+Crash-safe journal of download jobs.
+
+Every submitted job gets a row holding what is needed to restart it (URL,
+format, media type, download folder) plus how far it got. Rows of jobs that
+never reached "done" or "failed" are offered for resuming on the next start;
+yt-dlp then continues from the leftover .part file instead of from zero.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from format_ranking import is_adaptive_pair
+
+
+class JobJournal:
+    QUEUED = "queued"
+    RUNNING = "running"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+    # Column name -> SQL type. New columns are added to existing journals on open.
+    COLUMNS = {
+        'url': "TEXT NOT NULL",
+        'title': "TEXT",
+        'format_id': "TEXT",
+        'media_type': "TEXT",
+        'save_path': "TEXT",
+        'filename': "TEXT",
+        'downloaded_bytes': "INTEGER DEFAULT 0",
+        'total_bytes': "INTEGER",
+        'status': "TEXT NOT NULL",
+        'error': "TEXT",
+        'audio_codec': "TEXT",
+        'audio_bitrate': "INTEGER",
+        'outtmpl': "TEXT",
+        'priority': "TEXT",
+        'merge_format': "TEXT",
+        'updated_at': "REAL",
+    }
+
+    def __init__(self, path, min_write_interval=1.0):
+        self.path = path
+        self.min_write_interval = min_write_interval # Throttle for progress writes, in seconds
+        self._lock = threading.Lock()
+        self._last_write = {} # row id -> time of the last progress write
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT)")
+            existing = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            for column, sql_type in self.COLUMNS.items():
+                if column not in existing:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {sql_type}")
+
+    def record(self, job):
+        """Adds a new job and stores its row id in `job.journal_id`."""
+        values = self._values(job)
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                f"INSERT INTO jobs ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                list(values.values()))
+        job.journal_id = cursor.lastrowid
+        return job.journal_id
+
+    def update(self, job, force=True):
+        """Writes the job's current state. With force=False, writes at most once per min_write_interval."""
+        if job.journal_id is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_write.get(job.journal_id, 0) < self.min_write_interval:
+            return
+        self._last_write[job.journal_id] = now
+        values = self._values(job)
+        with self._lock, self._db:
+            self._db.execute(f"UPDATE jobs SET {', '.join(f'{c} = ?' for c in values)} WHERE id = ?",
+                             list(values.values()) + [job.journal_id])
+
+    def progress_hook(self, job):
+        """Returns a yt-dlp progress hook that keeps the job's byte offset in the journal."""
+        def hook(d):
+            job.downloaded_bytes = d.get('downloaded_bytes') or job.downloaded_bytes
+            job.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate') or job.total_bytes
+            if d.get('filename'):
+                job.filename = d['filename']
+            self.update(job, force=d['status'] != 'downloading')
+        return hook
+
+    def unfinished(self):
+        """Rows (as dicts) of jobs that were queued, running or converting when the app last stopped."""
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM jobs WHERE status IN (?, ?, ?) ORDER BY id",
+                                      (self.QUEUED, self.RUNNING, self.PROCESSING))
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def discard(self, journal_ids):
+        """Marks rows as abandoned so they aren't offered for resuming again."""
+        with self._lock, self._db:
+            self._db.executemany("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                                 [(self.FAILED, time.time(), journal_id) for journal_id in journal_ids])
+
+    def _values(self, job):
+        return {
+            'url': job.url,
+            'title': job.title,
+            'format_id': job.format_id,
+            'media_type': job.media_type,
+            'save_path': job.save_path,
+            'filename': job.filename,
+            'downloaded_bytes': job.downloaded_bytes,
+            'total_bytes': job.total_bytes,
+            'status': job.status,
+            'error': job.error,
+            'audio_codec': job.audio_codec,
+            'audio_bitrate': job.audio_bitrate,
+            'outtmpl': job.outtmpl,
+            'priority': job.priority,
+            # The container a pair is merged into, which the format id alone doesn't tell
+            'merge_format': (job.merge_format or (job.format or {}).get('ext')) if is_adaptive_pair(job.format_id) else None,
+            'updated_at': time.time(),
+        }
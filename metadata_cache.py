@@ -0,0 +1,77 @@
+"""
+On-disk cache for yt-dlp `extract_info` results.
+
+Entries are keyed by "<extractor>:<video id>" and stored as JSON in a single
+SQLite file. Entries older than the TTL are treated as missing, and when the
+cache grows past `max_bytes` the least recently used entries are evicted.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class MetadataCache:
+    def __init__(self, path, ttl=3600, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl # Seconds; stream URLs expire after a few hours, so keep this short
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS info_cache (
+                    key TEXT PRIMARY KEY,
+                    info TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS info_cache_lru ON info_cache (accessed_at)")
+
+    def get(self, key):
+        """Returns the cached info dict for `key`, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT info, fetched_at FROM info_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                with self._db:
+                    self._db.execute("DELETE FROM info_cache WHERE key = ?", (key,))
+                return None
+            with self._db:
+                self._db.execute("UPDATE info_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key, info):
+        """Stores a JSON-serializable info dict and evicts old entries if needed."""
+        data = json.dumps(info)
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO info_cache VALUES (?, ?, ?, ?, ?)",
+                             (key, data, len(data), now, now))
+            self._evict()
+
+    def invalidate(self, key=None):
+        """Removes one entry, or every entry when `key` is None."""
+        with self._lock, self._db:
+            if key is None:
+                self._db.execute("DELETE FROM info_cache")
+            else:
+                self._db.execute("DELETE FROM info_cache WHERE key = ?", (key,))
+
+    def _evict(self):
+        # Drop expired entries first, then the least recently used ones until we fit
+        self._db.execute("DELETE FROM info_cache WHERE fetched_at < ?", (time.time() - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM info_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM info_cache ORDER BY accessed_at").fetchall():
+            self._db.execute("DELETE FROM info_cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
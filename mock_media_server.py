@@ -0,0 +1,242 @@
+"""
+Local HTTP server with synthetic media for benchmarks.
+
+Serves, for any clip name:
+  /progressive/<name>.mp4     one file, with HTTP range support
+  /dash/<name>.mpd            DASH manifest, one video and one audio representation
+  /hls/<name>.m3u8            HLS master playlist with one variant
+
+The payloads are filler bytes, not playable media; yt-dlp's generic
+extractor and native downloaders only need the manifests to be valid.
+An optional per-connection rate limit and request latency make it behave
+more like a real CDN, so fragment concurrency has something to win.
+
+    python mock_media_server.py --port 8000 --size 64 --rate 8M
+"""
+import argparse
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MiB = 1024 * 1024
+
+_BLOCK = bytes(range(256)) * 256 # 64 KiB of filler, sliced for every response
+
+_PROGRESSIVE_RE = re.compile(r'^/progressive/([\w-]+)\.mp4$')
+_DASH_MANIFEST_RE = re.compile(r'^/dash/([\w-]+)\.mpd$')
+_DASH_SEGMENT_RE = re.compile(r'^/dash/([\w-]+)/(v1|a1)/(init|seg-(\d+))\.(mp4|m4s)$')
+_HLS_MASTER_RE = re.compile(r'^/hls/([\w-]+)\.m3u8$')
+_HLS_MEDIA_RE = re.compile(r'^/hls/([\w-]+)/media\.m3u8$')
+_HLS_SEGMENT_RE = re.compile(r'^/hls/([\w-]+)/seg-(\d+)\.ts$')
+
+
+class MockMediaServer:
+    def __init__(self, host="127.0.0.1", port=0, size=32 * MiB, segment_size=1 * MiB,
+                 rate=None, latency=0.0):
+        self.size = size # Bytes per progressive file, and per DASH/HLS video stream
+        self.segment_size = segment_size # Bytes per DASH/HLS segment
+        self.rate = rate # Bytes/s per connection, None for as fast as possible
+        self.latency = latency # Seconds before every response
+        self.segments = max(1, -(-size // segment_size))
+        self.requests = 0 # Served requests, for a quick sanity check
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(_MediaHandler):
+            media = server
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serves in a background thread; returns the base URL."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def dash_manifest(self, name):
+        seconds = self.segments # One second per segment
+        # Audio is an eighth of the video, as in typical 1080p/128k pairs
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" profiles="urn:mpeg:dash:profile:isoff-live:2011"
+     mediaPresentationDuration="PT{seconds}S" minBufferTime="PT2S">
+  <Period>
+    <AdaptationSet mimeType="video/mp4" contentType="video">
+      <Representation id="v1" codecs="avc1.640028" width="1920" height="1080" frameRate="30"
+                      bandwidth="{self.segment_size * 8}">
+        <SegmentTemplate timescale="1" duration="1" startNumber="1"
+                         initialization="{name}/v1/init.mp4" media="{name}/v1/seg-$Number$.m4s"/>
+      </Representation>
+    </AdaptationSet>
+    <AdaptationSet mimeType="audio/mp4" contentType="audio" lang="en">
+      <Representation id="a1" codecs="mp4a.40.2" audioSamplingRate="44100" bandwidth="{self.segment_size}">
+        <SegmentTemplate timescale="1" duration="1" startNumber="1"
+                         initialization="{name}/a1/init.mp4" media="{name}/a1/seg-$Number$.m4s"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+    def hls_master(self, name):
+        return (f"#EXTM3U\n"
+                f"#EXT-X-STREAM-INF:BANDWIDTH={self.segment_size * 8},RESOLUTION=1920x1080,"
+                f"CODECS=\"avc1.640028,mp4a.40.2\"\n"
+                f"{name}/media.m3u8\n")
+
+    def hls_media(self):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:1", "#EXT-X-MEDIA-SEQUENCE:0"]
+        for index in range(self.segments):
+            lines += ["#EXTINF:1.0,", f"seg-{index}.ts"]
+        lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def segment_length(self, index):
+        return max(0, min(self.segment_size, self.size - index * self.segment_size))
+
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    media = None # Set by MockMediaServer
+    protocol_version = "HTTP/1.1" # Keep-alive, like a real CDN
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark output clean
+
+    def do_HEAD(self):
+        self._route(send_body=False)
+
+    def do_GET(self):
+        self._route(send_body=True)
+
+    def _route(self, send_body):
+        media = self.media
+        with media._lock:
+            media.requests += 1
+        if media.latency:
+            time.sleep(media.latency)
+
+        path = self.path.split('?', 1)[0]
+        if _PROGRESSIVE_RE.match(path):
+            return self._send_payload(media.size, "video/mp4", send_body, ranges=True)
+        match = _DASH_MANIFEST_RE.match(path)
+        if match:
+            return self._send_text(media.dash_manifest(match.group(1)), "application/dash+xml", send_body)
+        match = _DASH_SEGMENT_RE.match(path)
+        if match:
+            if match.group(3) == "init":
+                length = 1024
+            else:
+                length = media.segment_length(int(match.group(4)) - 1)
+                if match.group(2) == "a1":
+                    length //= 8
+            if not length:
+                return self.send_error(404)
+            return self._send_payload(length, "video/mp4", send_body)
+        match = _HLS_MASTER_RE.match(path)
+        if match:
+            return self._send_text(media.hls_master(match.group(1)), "application/vnd.apple.mpegurl", send_body)
+        if _HLS_MEDIA_RE.match(path):
+            return self._send_text(media.hls_media(), "application/vnd.apple.mpegurl", send_body)
+        match = _HLS_SEGMENT_RE.match(path)
+        if match and media.segment_length(int(match.group(2))):
+            return self._send_payload(media.segment_length(int(match.group(2))), "video/mp2t", send_body)
+        self.send_error(404)
+
+    def _send_text(self, text, content_type, send_body):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_payload(self, length, content_type, send_body, ranges=False):
+        start, end = 0, length - 1
+        range_match = ranges and re.match(r'^bytes=(\d*)-(\d*)$', self.headers.get("Range", ""))
+        if range_match and (range_match.group(1) or range_match.group(2)):
+            if range_match.group(1):
+                start = int(range_match.group(1))
+                end = min(int(range_match.group(2) or end), length - 1)
+            else: # Suffix range: the last N bytes
+                start = max(0, length - int(range_match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{length}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{length}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        if ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if send_body:
+            self._write_filler(end - start + 1)
+
+    def _write_filler(self, remaining):
+        rate = self.media.rate
+        started = time.monotonic()
+        sent = 0
+        try:
+            while remaining > 0:
+                chunk = _BLOCK[:min(remaining, len(_BLOCK))]
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                remaining -= len(chunk)
+                if rate:
+                    # Sleep off whatever this connection is ahead of its rate
+                    ahead = sent / rate - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass # Client went away, e.g. a cancelled download
+
+
+def serve_in_process(ready_queue, **options):
+    """multiprocessing target: serves until killed and puts the base URL on `ready_queue`."""
+    server = MockMediaServer(**options)
+    ready_queue.put(server.base_url)
+    server.httpd.serve_forever()
+
+
+def main(argv=None):
+    from bandwidth import parse_rate
+
+    parser = argparse.ArgumentParser(description="Serve synthetic progressive, DASH and HLS media.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--size", type=float, default=32, help="MiB per file (default: %(default)s)")
+    parser.add_argument("--segment-size", type=float, default=1, help="MiB per DASH/HLS segment (default: %(default)s)")
+    parser.add_argument("--rate", default=None, help='per-connection rate limit, e.g. "8M" (default: unlimited)')
+    parser.add_argument("--latency", type=float, default=0, help="milliseconds before every response")
+    args = parser.parse_args(argv)
+
+    server = MockMediaServer(args.host, args.port, size=int(args.size * MiB),
+                             segment_size=int(args.segment_size * MiB),
+                             rate=parse_rate(args.rate), latency=args.latency / 1000)
+    print(f"Serving on {server.base_url}: /progressive/<name>.mp4, /dash/<name>.mpd, /hls/<name>.m3u8")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
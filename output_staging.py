@@ -0,0 +1,192 @@
+"""
+Disk space reservations and a staging directory for downloads.
+
+Before a download starts, the space it needs (from the format's known or
+estimated size) is reserved on every disk it will write to, and checked
+against the free space minus what the other running downloads still have
+to write. A bulk run therefore can't fill the disk halfway through:
+downloads wait for space while others hold it, and fail up front when it
+can't be had.
+
+With a temp directory (e.g. on an SSD or tmpfs), downloads, merges and
+audio conversions all happen there and only the finished file is moved
+into the library, atomically: readers of the library never see partial
+files, and post-processing scratch files never land on the library disk.
+"""
+import errno
+import hashlib
+import os
+import shutil
+import threading
+
+from format_ranking import AUDIO, estimated_size, is_adaptive_pair
+
+MiB = 1024 * 1024
+
+DEFAULT_MIN_FREE = 512 * MiB # Left free on every disk, for everything else on it
+SIZE_MARGIN = 1.05 # Approximate sizes are often a few percent short
+
+
+def expected_size(job):
+    """The job's download size in bytes (with a safety margin), or None if unknown."""
+    fmt = job.format or {}
+    duration = (job.info or {}).get('duration')
+    sizes = [estimated_size(f, duration) for f in fmt.get('requested_formats') or [fmt]]
+    if not sizes or not all(sizes):
+        return None
+    return int(sum(sizes) * SIZE_MARGIN)
+
+
+def peak_size(job, size):
+    """Most space the job takes in its work directory: merges and audio extraction briefly keep two copies."""
+    if is_adaptive_pair(job.format_id) or job.media_type == AUDIO:
+        return 2 * size
+    return size
+
+
+def move_atomically(source, target):
+    """
+    Moves a file so that `target` only ever appears complete: a rename on the
+    same disk, else a copy to a hidden temp file next to `target` that is
+    renamed once it is on disk.
+    """
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        os.replace(source, target)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV: # Anything but "on another disk"
+            raise
+
+    temp_path = os.path.join(directory, f".{os.path.basename(target)}.{os.getpid()}.partial")
+    try:
+        shutil.copyfile(source, temp_path) # sendfile() on Linux
+        shutil.copystat(source, temp_path)
+        with open(temp_path, 'r+b') as f:
+            os.fsync(f.fileno())
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.remove(source)
+
+
+class OutputStaging:
+    """
+    Hands out disk space reservations for jobs and, with `temp_dir`, the
+    staging directories they download into. Without `temp_dir` jobs write
+    straight into their save path, but still reserve space there.
+    """
+
+    def __init__(self, temp_dir=None, min_free=DEFAULT_MIN_FREE, recheck_interval=30.0):
+        self.temp_dir = temp_dir
+        self.min_free = min_free # Bytes never handed out on any disk
+        self.recheck_interval = recheck_interval # Seconds between checks while waiting; other programs free space too
+        self._reservations = []
+        self._cond = threading.Condition()
+
+    def work_dir(self, save_path):
+        """Where a job saving to `save_path` downloads and post-processes."""
+        if not self.temp_dir:
+            return save_path
+        # One folder per library folder, so a resumed job finds its .part file again
+        digest = hashlib.sha1(os.path.abspath(save_path).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.temp_dir, digest)
+
+    def reserve(self, job):
+        """
+        Reserves the job's space, waiting while other downloads hold the space
+        it needs. Raises OSError(ENOSPC) if there isn't enough even then.
+        Returns a Reservation, which must be released.
+        """
+        work_dir = self.work_dir(job.save_path)
+        os.makedirs(work_dir, exist_ok=True)
+        os.makedirs(job.save_path, exist_ok=True)
+
+        size = expected_size(job) or 0 # Unknown: only keep min_free
+        reservation = Reservation(self, job.save_path, work_dir, resumed_bytes=job.downloaded_bytes or 0)
+        reservation.add(work_dir, peak_size(job, size), shrinks=True)
+        if os.stat(job.save_path).st_dev != os.stat(work_dir).st_dev:
+            reservation.add(job.save_path, size)
+
+        with self._cond:
+            while True:
+                short = self._shortfalls(reservation)
+                if not short:
+                    break
+                device, directory, needed, available = short[0]
+                if not any(other.outstanding(device) for other in self._reservations):
+                    if needed:
+                        message = (f"{needed / MiB:.0f} MiB needed, {max(0, available) / MiB:.0f} MiB available "
+                                   f"(keeping {self.min_free / MiB:.0f} MiB free)")
+                    else: # Size unknown, and the disk is already down to min_free
+                        message = f"less than the {self.min_free / MiB:.0f} MiB to keep free is left"
+                    raise OSError(errno.ENOSPC, f"Not enough disk space for \"{job.title}\": {message}", directory)
+                self._cond.wait(self.recheck_interval) # Until another download finishes or fails
+            self._reservations.append(reservation)
+        return reservation
+
+    def _shortfalls(self, reservation):
+        short = []
+        for device, (directory, _, _) in reservation.needs.items():
+            needed = reservation.outstanding(device)
+            available = (shutil.disk_usage(directory).free - self.min_free
+                         - sum(other.outstanding(device) for other in self._reservations))
+            if needed > available:
+                short.append((device, directory, needed, available))
+        return short
+
+    def _release(self, reservation):
+        with self._cond:
+            if reservation in self._reservations:
+                self._reservations.remove(reservation)
+            self._cond.notify_all()
+
+
+class Reservation:
+    """One job's reserved space. Its `progress_hook` counts what was written, which no longer needs reserving."""
+
+    def __init__(self, staging, save_path, work_dir, resumed_bytes=0):
+        self.staging = staging
+        self.save_path = save_path
+        self.work_dir = work_dir
+        self.needs = {} # Device -> (directory, bytes, whether it shrinks as the download writes)
+        self.resumed_bytes = resumed_bytes # Already on disk in a .part file, until the download reports
+        self._written = {} # File name -> bytes written to it
+        self._lock = threading.Lock()
+
+    def add(self, directory, size, shrinks=False):
+        self.needs[os.stat(directory).st_dev] = (directory, size, shrinks)
+
+    def outstanding(self, device):
+        """Reserved bytes on `device` that aren't on disk yet."""
+        directory, size, shrinks = self.needs.get(device, (None, 0, False))
+        if shrinks:
+            with self._lock:
+                size -= sum(self._written.values()) if self._written else self.resumed_bytes
+        return max(0, size)
+
+    def progress_hook(self, d):
+        """yt-dlp progress hook."""
+        if d['status'] in ('downloading', 'finished'):
+            written = d.get('downloaded_bytes') or d.get('total_bytes')
+            if written:
+                with self._lock:
+                    key = d.get('filename')
+                    self._written[key] = max(written, self._written.get(key, 0))
+
+    def finalize(self, path):
+        """Moves a finished file from the work directory into the save path. Returns its final path."""
+        if not path or self.work_dir == self.save_path:
+            return path
+        relative = os.path.relpath(path, self.work_dir)
+        if relative.startswith(os.pardir):
+            return path # Not one of ours
+        target = os.path.join(self.save_path, relative)
+        move_atomically(path, target)
+        return target
+
+    def release(self):
+        self.staging._release(self)
@@ -0,0 +1,54 @@
+"""
+Download performance settings.
+
+A PerformanceProfile turns a few knobs (parallel fragments for DASH/HLS,
+HTTP chunk size, buffer size, an optional external downloader such as
+aria2c) into yt-dlp options.
+"""
+import shutil
+
+
+MiB = 1024 * 1024
+
+# External downloaders we know how to drive, with their multi-connection arguments.
+# "{connections}" is replaced with the profile's connection count.
+EXTERNAL_DOWNLOADERS = {
+    'aria2c': ['-x', '{connections}', '-s', '{connections}', '-k', '1M',
+               '--file-allocation=none'], # No preallocation, so ExternalDownloadMonitor can follow the file size
+}
+
+
+class PerformanceProfile:
+    def __init__(self, concurrent_fragments=4, http_chunk_size=10 * MiB, buffer_size=None,
+                 external_downloader=None, connections=16):
+        self.concurrent_fragments = concurrent_fragments # DASH/HLS fragments fetched at the same time
+        self.http_chunk_size = http_chunk_size # Bytes per HTTP range request, None for a single request
+        self.buffer_size = buffer_size # Initial download buffer in bytes, None for yt-dlp's default
+        self.external_downloader = external_downloader # e.g. "aria2c"; ignored when not on PATH
+        self.connections = connections # Connections per file for the external downloader
+
+    def uses_external_downloader(self):
+        return bool(self.external_downloader) and shutil.which(self.external_downloader) is not None
+
+    def to_ydl_opts(self):
+        opts = {'concurrent_fragment_downloads': max(1, int(self.concurrent_fragments))}
+        if self.http_chunk_size:
+            opts['http_chunk_size'] = int(self.http_chunk_size)
+        if self.buffer_size:
+            opts['buffersize'] = int(self.buffer_size)
+            opts['noresizebuffer'] = True
+
+        if self.uses_external_downloader():
+            name = self.external_downloader
+            # HLS stays on the native downloader (with concurrent fragments): it handles
+            # encrypted and live playlists that external downloaders can't
+            opts['external_downloader'] = {'default': name, 'm3u8': 'native'}
+            args = [arg.format(connections=self.connections) for arg in EXTERNAL_DOWNLOADERS.get(name, [])]
+            if args:
+                opts['external_downloader_args'] = {name: args}
+        return opts
+
+    def __repr__(self):
+        return (f"PerformanceProfile(concurrent_fragments={self.concurrent_fragments}, "
+                f"http_chunk_size={self.http_chunk_size}, buffer_size={self.buffer_size}, "
+                f"external_downloader={self.external_downloader!r}, connections={self.connections})")
@@ -0,0 +1,75 @@
+"""
+Progress aggregation for concurrent downloads.
+
+yt-dlp calls progress hooks many times per second per fragment. Instead of
+pushing every call to the UI, the hooks made here only write into the job's
+own fields and mark it dirty; the UI polls `drain()` at a fixed rate and
+redraws the changed jobs in one pass.
+
+Speed is measured from the byte counter and smoothed with an exponential
+moving average, so the shown speed and ETA don't jump around with every
+chunk the way yt-dlp's instantaneous `speed` does.
+"""
+import math
+import threading
+import time
+
+
+class ProgressTracker:
+    def __init__(self, time_constant=3.0):
+        self.time_constant = time_constant # Seconds; larger means smoother but slower to react
+        self._dirty = set()
+        self._lock = threading.Lock() # Only guards the dirty set
+
+    def hook(self, job):
+        """Returns a yt-dlp progress hook that updates `job` (runs in the job's worker thread)."""
+        last = {'bytes': None, 'time': None}
+
+        def progress_hook(d):
+            now = time.monotonic()
+            if d['status'] == 'downloading':
+                downloaded = d.get('downloaded_bytes')
+                total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                if downloaded is None or not math.isfinite(downloaded):
+                    return
+
+                if last['bytes'] is None or downloaded < last['bytes']:
+                    # First call, or a new file started (e.g. the audio part of a merge)
+                    last['bytes'], last['time'] = downloaded, now
+                elif now > last['time']:
+                    self._update_speed(job, (downloaded - last['bytes']) / (now - last['time']), now - last['time'])
+                    last['bytes'], last['time'] = downloaded, now
+
+                if total and math.isfinite(total) and total > 0:
+                    job.percentage = min(downloaded / total * 100, 100.0)
+                    job.eta = (total - downloaded) / job.speed if job.speed else None
+
+            elif d['status'] == 'finished':
+                # The file is downloaded; post-processing (if any) may still be running
+                job.percentage = 100.0
+                job.speed = None
+                job.eta = None
+                last['bytes'] = None
+
+            self.mark_dirty(job)
+
+        return progress_hook
+
+    def mark_dirty(self, job):
+        """Asks the UI to redraw a job, e.g. after a status change."""
+        with self._lock:
+            self._dirty.add(job)
+
+    def drain(self):
+        """Returns the jobs that changed since the last call (UI thread)."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def _update_speed(self, job, instant_speed, elapsed):
+        if job.speed is None:
+            job.speed = instant_speed
+            return
+        # Time-weighted EMA, so uneven callback intervals are handled correctly
+        alpha = 1 - math.exp(-elapsed / self.time_constant)
+        job.speed += alpha * (instant_speed - job.speed)
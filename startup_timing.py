@@ -0,0 +1,61 @@
+"""
+Start-up timing of the GUI.
+
+The app marks a few points of its start (imports done, widgets built,
+window interactive, yt_dlp loaded) and appends them as one JSON line to
+startup_timing.jsonl in the app data folder, so time-to-interactive can be
+compared between releases and between the script and the PyInstaller build.
+"""
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+
+class StartupTimer:
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.marks = {} # Name -> seconds since `started`, in the order they happened
+        self._lock = threading.Lock() # Marks also come from the preload thread
+
+    def mark(self, name, seconds=None):
+        """Records `name` at the current time, or with the given `seconds` (e.g. a duration)."""
+        if seconds is None:
+            seconds = time.perf_counter() - self.started
+        with self._lock:
+            self.marks[name] = round(seconds, 4)
+
+    def report(self, path, keep=200, echo=False):
+        """Appends the marks to the JSON-lines file at `path`, keeping the last `keep` runs."""
+        with self._lock:
+            record = {
+                'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'frozen': bool(getattr(sys, 'frozen', False)), # PyInstaller build
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'yt_dlp': _yt_dlp_version(),
+                'seconds': dict(self.marks),
+            }
+        if echo:
+            print("Start-up timing: " + ", ".join(f"{name} {seconds:.3f}s"
+                                                 for name, seconds in record['seconds'].items()),
+                  file=sys.stderr)
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            lines = []
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    lines = f.readlines()[-(keep - 1):] if keep > 1 else []
+            lines.append(json.dumps(record) + "\n")
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+        except OSError:
+            pass # Timing is best effort; never get in the way of the app
+        return record
+
+
+def _yt_dlp_version():
+    version = sys.modules.get('yt_dlp.version')
+    return getattr(version, '__version__', None)
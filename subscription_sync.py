@@ -0,0 +1,279 @@
+"""
+Subscription sync: keeps a list of channels and playlists mirrored.
+
+Each source is listed with flat extraction, newest entries first, and the
+listing stops as soon as it reaches the entries seen on the previous
+check (or entries older than the newest upload date seen), so a check
+usually costs one playlist page instead of re-listing the whole channel.
+A channel is listed tab by tab (Videos, Shorts, Live), each with what was
+seen in it. New entries are handed to a callback, which queues their
+downloads.
+
+Sources are checked by a bounded pool of threads, each on its own
+schedule with random jitter so hundreds of them don't all fire at once.
+What was seen per source is kept in a small SQLite database.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import downloader_core as core
+
+RECENT_IDS = 10 # Newest entry ids remembered per source
+STOP_AFTER_KNOWN = 3 # Known entries in a row that end a listing (pinned or re-ordered videos come first)
+
+
+class SubscriptionStore:
+    """
+    Per-source sync state: when to check next, and per listing of the source
+    (itself, or each tab of a channel) the newest ids and upload date seen.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS sources (
+                    url TEXT PRIMARY KEY,
+                    recent_ids TEXT,
+                    last_date TEXT,
+                    last_checked REAL,
+                    next_check REAL,
+                    last_new INTEGER,
+                    error TEXT
+                )""")
+            existing = {row[1] for row in self._db.execute("PRAGMA table_info(sources)")}
+            if 'listings' not in existing:
+                self._db.execute("ALTER TABLE sources ADD COLUMN listings TEXT")
+
+    def get(self, url):
+        """
+        The source's row as a dict, or None if it was never checked. Its
+        'listings' are {listing URL: {'recent_ids': [...], 'last_date': "YYYYMMDD" or None}}.
+        """
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM sources WHERE url = ?", (url,))
+            row = cursor.fetchone()
+            columns = [d[0] for d in cursor.description]
+        if row is None:
+            return None
+        state = dict(zip(columns, row))
+        if state['listings']:
+            state['listings'] = json.loads(state['listings'])
+        else: # Saved before listings were kept apart: everything was the source's own
+            state['listings'] = {url: {'recent_ids': json.loads(state['recent_ids'] or "[]"),
+                                       'last_date': state['last_date']}}
+        return state
+
+    def save(self, url, listings, next_check, last_new, error=None):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO sources (url, listings, last_checked, next_check, last_new, error) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             (url, json.dumps(listings), time.time(), next_check, last_new, error))
+
+    def check_times(self):
+        """Source URL -> (time of its last check, time of its next check)."""
+        with self._lock:
+            return {url: (last, next_) for url, last, next_ in
+                    self._db.execute("SELECT url, last_checked, next_check FROM sources")}
+
+
+def list_new_entries(url, listings=None, first_limit=None):
+    """
+    Lists the entries of a channel or playlist that are newer than what
+    `listings` (see SubscriptionStore.get) says was seen, newest first,
+    fetching only as many playlist pages as that takes. A listing (the
+    source itself, or one tab of a channel) never seen before yields at
+    most `first_limit` entries (None for all of them).
+
+    Returns {listing URL: [flat entries]} for every listing visited; the
+    entries have at least 'url' and usually 'id' and 'title'. A single
+    video URL yields itself if unknown.
+    """
+    ydl_opts = dict(core.BASE_YDL_OPTS, extract_flat='in_playlist', lazy_playlist=True)
+
+    def list_entries():
+        found = {}
+        with core.get_ydl_pool().extractor(ydl_opts) as ydl:
+            _list_new_entries(ydl, url, listings or {}, first_limit, found)
+        return found
+    return core.get_retry_policy().call(list_entries)
+
+
+def _list_new_entries(ydl, url, listings, first_limit, found, _depth=0):
+    from yt_dlp.utils import PlaylistEntries
+
+    seen = listings.get(url) or {}
+    known_ids = set(seen.get('recent_ids') or ())
+    since_date = seen.get('last_date')
+    limit = None if known_ids else first_limit
+    entries = found.setdefault(url, [])
+
+    # process=False: the entries stay a lazy, paged list that is only fetched as far as we iterate it
+    result = ydl.extract_info(url, download=False, process=False)
+    for _ in range(3): # e.g. a channel URL that points at its videos page
+        if result.get('_type') not in ('url', 'url_transparent'):
+            break
+        result = ydl.extract_info(result['url'], ie_key=result.get('ie_key'), download=False, process=False)
+
+    if result.get('_type') not in ('playlist', 'multi_video'):
+        entry = {'id': result.get('id'), 'url': result.get('webpage_url') or url, 'title': result.get('title'),
+                 'upload_date': result.get('upload_date')}
+        if _entry_key(entry) not in known_ids:
+            entries.append(entry)
+        return
+
+    known_in_a_row = 0
+    stop_after_known = min(STOP_AFTER_KNOWN, len(known_ids))
+    for _, entry in PlaylistEntries(ydl, result).get_requested_items():
+        if not entry:
+            continue
+        entry_url = entry.get('url') or entry.get('webpage_url')
+        # A channel lists its tabs (Videos, Shorts, Live) as nested playlists, see core.expand_url().
+        # Each is a listing of its own, with its own known ids: the Videos tab's say nothing about Shorts
+        if entry.get('_type') == 'playlist' or (
+                entry.get('_type') == 'url' and (entry.get('ie_key') or '').endswith('Tab') and _depth < 2):
+            if entry_url:
+                _list_new_entries(ydl, entry_url, listings, first_limit, found, _depth + 1)
+            continue
+        if _entry_key(entry) in known_ids:
+            known_in_a_row += 1
+            if known_in_a_row >= stop_after_known:
+                break
+            continue
+        if entry_url:
+            known_in_a_row = 0
+            if since_date and _entry_date(entry) and _entry_date(entry) < since_date:
+                break # Older than anything seen before
+            entries.append(entry)
+        if limit and len(entries) >= limit:
+            break
+
+
+def _entry_key(entry):
+    # Feeds read by the generic extractor have no ids; their links are just as unique
+    return entry.get('id') or entry.get('url') or entry.get('webpage_url')
+
+
+def _entry_date(entry):
+    if entry.get('upload_date'):
+        return entry['upload_date']
+    if entry.get('timestamp'):
+        return time.strftime("%Y%m%d", time.gmtime(entry['timestamp']))
+    return None
+
+
+class SubscriptionSync:
+    """
+    Checks sources for new entries and passes them to `on_new_entries(source_url, entries)`
+    (from a checker thread), oldest first.
+
+    `interval` is the time between checks of a source in seconds, varied by
+    +/- `jitter` (a fraction). A source's first check only hands over its
+    `initial` newest entries (None for all of them); the rest are marked as seen.
+    """
+
+    def __init__(self, store, on_new_entries, interval=3600, jitter=0.1, check_workers=8, initial=None):
+        self.store = store
+        self.on_new_entries = on_new_entries
+        self.interval = interval
+        self.jitter = jitter
+        self.check_workers = max(1, int(check_workers))
+        self.initial = initial
+
+    def check(self, url):
+        """Checks one source now. Returns the number of new entries; raises if listing failed."""
+        state = self.store.get(url)
+        listings = (state or {}).get('listings') or {}
+        # A listing's first check lists enough to remember where it stands
+        first_limit = None if self.initial is None else max(self.initial, RECENT_IDS)
+        try:
+            found = list_new_entries(url, listings, first_limit)
+        except Exception as e:
+            self.store.save(url, listings, self._next_check(), 0, error=str(e))
+            raise
+
+        new = []
+        handed_over = set()
+        for listing_url, entries in found.items():
+            seen = listings.get(listing_url) or {}
+            recent_ids = seen.get('recent_ids') or []
+            fresh = entries if recent_ids or self.initial is None else entries[:self.initial]
+            # Oldest first; a video listed in two tabs is only handed over once
+            for entry in reversed(fresh):
+                if _entry_key(entry) not in handed_over:
+                    handed_over.add(_entry_key(entry))
+                    new.append(entry)
+            new_ids = [_entry_key(entry) for entry in entries if _entry_key(entry)]
+            dates = [_entry_date(entry) for entry in entries if _entry_date(entry)]
+            listings[listing_url] = {
+                'recent_ids': (new_ids + [key for key in recent_ids if key not in new_ids])[:RECENT_IDS],
+                'last_date': max(dates + ([seen['last_date']] if seen.get('last_date') else []), default=None),
+            }
+        if new:
+            self.on_new_entries(url, new)
+        # Saved after the hand-over, so a crash in between lists the entries again next time
+        self.store.save(url, listings, self._next_check(), len(new))
+        return len(new)
+
+    def run_once(self, urls):
+        """Checks every source once, `check_workers` at a time. Returns {url: new entry count or exception}."""
+        with ThreadPoolExecutor(max_workers=self.check_workers, thread_name_prefix="sync") as executor:
+            futures = {url: executor.submit(self.check, url) for url in urls}
+        return {url: future.exception() or future.result() for url, future in futures.items()}
+
+    def run(self, load_urls, stop_event, on_checked=None):
+        """
+        Keeps checking the sources returned by `load_urls()` (called every
+        round, so the list can be edited while running) whenever they are
+        due, until `stop_event` is set. `on_checked(url, result)` gets the
+        new entry count or the exception of each check.
+        """
+        running = set()
+        lock = threading.Lock()
+
+        def check(url):
+            try:
+                result = self.check(url)
+            except Exception as e:
+                result = e
+            with lock:
+                running.discard(url)
+            if on_checked:
+                on_checked(url, result)
+
+        with ThreadPoolExecutor(max_workers=self.check_workers, thread_name_prefix="sync") as executor:
+            try:
+                while not stop_event.is_set():
+                    now = time.time()
+                    next_checks = self._next_checks()
+                    urls = load_urls()
+                    with lock:
+                        due = [url for url in urls if url not in running and (next_checks.get(url) or 0) <= now]
+                        running.update(due)
+                    for url in due:
+                        executor.submit(check, url)
+                    upcoming = [next_checks[url] - now for url in urls if next_checks.get(url) and url not in due]
+                    # Wake up for the next due source (the ones just started are due an interval from now
+                    # at the earliest), but look at the source list at least once a minute
+                    stop_event.wait(max(1.0, min([60.0, self.interval * (1 - self.jitter)] + upcoming)))
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True) # Only the checks already running finish
+
+    def _next_checks(self):
+        """Source URL -> when it is due; a shorter interval than at its last check applies right away."""
+        longest = self.interval * (1 + self.jitter)
+        return {url: min(next_check or 0, (last_checked or 0) + longest)
+                for url, (last_checked, next_check) in self.store.check_times().items()}
+
+    def _next_check(self):
+        return time.time() + self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, next to this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import downloader_core as core
+
+
+@pytest.fixture(autouse=True)
+def app_data(tmp_path, monkeypatch):
+    """Keeps the cache and other state files of each test in its own folder."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path / "cache"))
+    monkeypatch.setattr(core, '_metadata_cache', None)
+    return tmp_path / "cache"
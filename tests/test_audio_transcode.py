@@ -0,0 +1,29 @@
+import os
+import stat
+
+import pytest
+
+from audio_transcode import transcode_audio
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """An "ffmpeg" on PATH that copies its input to its output."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    ffmpeg = bin_dir / "ffmpeg"
+    ffmpeg.write_text('#!/bin/sh\nfor a in "$@"; do last="$a"; done\n'
+                      'while [ "$1" != "-i" ]; do shift; done\ncp "$2" "$last"\n')
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+@pytest.mark.parametrize("source, codec, output", [
+    ("Title.m4a", 'aac', "Title.m4a"), # Same extension, e.g. --audio-bitrate 96
+    ("Title.webm", 'mp3', "Title.mp3"),
+])
+def test_transcode_replaces_the_source(fake_ffmpeg, tmp_path, source, codec, output):
+    (tmp_path / source).write_bytes(b"audio")
+    path, _, _ = transcode_audio(str(tmp_path / source), codec, bitrate=96)
+    assert path == str(tmp_path / output)
+    assert sorted(os.listdir(tmp_path)) == sorted(["bin", output])
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import downloader_core as core
+from downloader_core import DownloadJob, DownloadQueue
+from ydl_session import RetryPolicy
+
+RATE_LIMITED = "ERROR: unable to download video data: HTTP Error 429: Too Many Requests"
+
+
+def run_queue(run_job, titles, attempts=4, max_workers=1):
+    updates = []
+    lock = threading.Lock()
+
+    def on_update(job):
+        with lock:
+            updates.append((job.title, job.status, job.retry_at is not None))
+
+    queue = DownloadQueue(run_job, max_workers=max_workers, on_update=on_update,
+                          retry_policy=RetryPolicy(attempts=attempts, base_delay=0.05, max_delay=0.2))
+    for title in titles:
+        queue.submit(DownloadJob("https://example.com/" + title, None, core.VIDEO, "/tmp", title=title))
+    queue.join()
+    return {job.title: job for job in queue.jobs}, updates
+
+
+def test_transient_failures_are_retried():
+    calls = {}
+
+    def run_job(job):
+        calls[job.title] = calls.get(job.title, 0) + 1
+        if job.title == "flaky" and calls["flaky"] < 3:
+            raise RuntimeError(RATE_LIMITED)
+
+    jobs, updates = run_queue(run_job, ["flaky", "ok"])
+    assert jobs["flaky"].status == DownloadJob.DONE
+    assert jobs["flaky"].attempts == 3
+    assert jobs["flaky"].error is None
+    assert ("flaky", DownloadJob.QUEUED, True) in updates # Waiting for its retry
+    # The other job ran while the failed one waited
+    assert updates.index(("ok", DownloadJob.DONE, False)) < updates.index(("flaky", DownloadJob.DONE, False))
+
+
+def test_permanent_failures_are_not_retried():
+    def run_job(job):
+        raise RuntimeError("ERROR: [youtube] abc: Private video")
+
+    jobs, _ = run_queue(run_job, ["private"])
+    assert jobs["private"].status == DownloadJob.FAILED
+    assert jobs["private"].attempts == 1
+
+
+def test_retries_give_up_after_the_last_attempt():
+    def run_job(job):
+        raise RuntimeError(RATE_LIMITED)
+
+    jobs, _ = run_queue(run_job, ["busy"], attempts=3)
+    assert jobs["busy"].status == DownloadJob.FAILED
+    assert jobs["busy"].attempts == 3
+    assert "429" in jobs["busy"].error
+
+
+def test_retry_waits_for_its_delay():
+    started = []
+
+    def run_job(job):
+        started.append(time.monotonic())
+        if len(started) == 1:
+            raise RuntimeError(RATE_LIMITED)
+
+    run_queue(run_job, ["flaky"])
+    assert started[1] - started[0] >= 0.025 # At least half of base_delay
@@ -0,0 +1,86 @@
+import contextlib
+import sqlite3
+
+import pytest
+import yt_dlp
+
+import downloader_core as core
+from download_metrics import DownloadMetrics
+from downloader_core import DownloadJob
+from job_journal import JobJournal
+
+
+class FailingYdl:
+    """Fails every download of the job's info with `message`."""
+
+    def __init__(self, message):
+        self.message = message
+
+    def process_ie_result(self, info, download=True):
+        raise yt_dlp.utils.DownloadError(self.message)
+
+
+@pytest.fixture
+def download(monkeypatch):
+    extractions = []
+    monkeypatch.setattr(core, '_extract_and_download', lambda ydl, job: extractions.append(job.url))
+
+    def run(message):
+        monkeypatch.setattr(core._ydl_pool, 'downloader', lambda ydl_opts: contextlib.nullcontext(FailingYdl(message)))
+        job = DownloadJob("https://example.com/v", {'format_id': "18"}, core.VIDEO, "/tmp",
+                          info={'id': "v", 'extractor_key': "Generic", 'webpage_url': "https://example.com/v"})
+        core._run_ydl(job, {'progress_hooks': []})
+        return job
+    run.extractions = extractions
+    return run
+
+
+def test_expired_stream_urls_are_extracted_again(download):
+    job = download("ERROR: unable to download video data: HTTP Error 403: Forbidden")
+    assert download.extractions == ["https://example.com/v"]
+    assert job.info is None
+
+
+@pytest.mark.parametrize("message", [
+    "ERROR: unable to download video data: HTTP Error 429: Too Many Requests",
+    "ERROR: unable to download video data: HTTP Error 503: Service Unavailable",
+    "ERROR: [Errno 28] No space left on device",
+])
+def test_other_failures_are_not_downloaded_again_at_once(download, message):
+    with pytest.raises(yt_dlp.utils.DownloadError):
+        download(message)
+    assert download.extractions == [] # Left to the queue's RetryPolicy, or failed
+
+
+def test_resumed_pair_keeps_its_merge_container(tmp_path):
+    journal = JobJournal(str(tmp_path / "jobs.db"))
+    pair = DownloadJob("https://example.com/v", {'format_id': "137+140", 'ext': "mp4"}, core.VIDEO, str(tmp_path))
+    single = DownloadJob("https://example.com/w", {'format_id': "18", 'ext': "mp4"}, core.VIDEO, str(tmp_path))
+    for job in (pair, single):
+        journal.record(job)
+
+    resumed = [DownloadJob.from_journal_row(row) for row in journal.unfinished()]
+    assert [(job.format_id, job.merge_format) for job in resumed] == [("137+140", "mp4"), ("18", None)]
+
+
+def test_journals_without_merge_format_are_migrated(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, status TEXT NOT NULL)")
+        db.execute("INSERT INTO jobs (url, status) VALUES ('https://example.com/v', 'queued')")
+    rows = JobJournal(path).unfinished()
+    assert rows[0]['merge_format'] is None
+
+
+def test_extraction_time_is_found_for_jobs_queued_with_another_url(monkeypatch, tmp_path):
+    info = {'id': "v", 'extractor_key': "Youtube", 'webpage_url': "https://www.youtube.com/watch?v=v", 'formats': []}
+    monkeypatch.setattr(core, '_extract_info', lambda url, ydl_opts: dict(info))
+    metrics = DownloadMetrics()
+    monkeypatch.setattr(core, '_metrics', metrics)
+    fetched = core.fetch_info("https://youtu.be/v", use_cache=False)
+
+    job = DownloadJob(fetched['webpage_url'], {'format_id': "18"}, core.VIDEO, str(tmp_path), info=fetched)
+    queue = core.DownloadQueue(lambda job: None, metrics=metrics)
+    queue.submit(job)
+    queue.join()
+    assert job.metrics.extract_seconds is not None
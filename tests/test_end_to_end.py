@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import downloader_core as core
+from downloader_cli import resolve_and_download
+from downloader_core import DownloadJob, DownloadQueue
+from format_ranking import FormatPolicy
+from mock_media_server import MiB, MockMediaServer
+from output_staging import OutputStaging
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = MockMediaServer(size=2 * MiB, segment_size=512 * 1024)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def staging(monkeypatch):
+    staging = OutputStaging(min_free=0)
+    monkeypatch.setattr(core, '_staging', staging)
+    return staging
+
+
+def download(url, policy_text, save_path):
+    policy = FormatPolicy.parse(policy_text)
+    queue = DownloadQueue(lambda job: resolve_and_download(job, policy), max_workers=1,
+                          retry_policy=core.get_retry_policy())
+    job = queue.submit(DownloadJob(url, None, policy.media_type, str(save_path)))
+    queue.join()
+    assert job.status == DownloadJob.DONE, job.error
+    return job
+
+
+def test_progressive_download(server, staging, tmp_path):
+    job = download(f"{server.base_url}/progressive/clip.mp4", "best", tmp_path / "library")
+    assert job.filename == str(tmp_path / "library" / "clip.mp4")
+    assert os.path.getsize(job.filename) == 2 * MiB
+
+
+def test_staged_download_is_moved_into_the_library(server, staging, tmp_path):
+    staging.temp_dir = str(tmp_path / "stage")
+    job = download(f"{server.base_url}/progressive/staged.mp4", "best", tmp_path / "library")
+    assert job.filename == str(tmp_path / "library" / "staged.mp4")
+    assert os.path.getsize(job.filename) == 2 * MiB
+    assert os.listdir(staging.work_dir(str(tmp_path / "library"))) == []
+
+
+def test_dash_audio_download(server, staging, tmp_path, monkeypatch):
+    monkeypatch.setattr(core.shutil, 'which', lambda name: None) # The filler bytes aren't real audio for FFmpeg
+    job = download(f"{server.base_url}/dash/talk.mpd", "best audio", tmp_path / "library")
+    assert job.format_id == "a1"
+    assert os.path.getsize(job.filename) == 1024 + 2 * MiB // 8 # Init segment, then an eighth of the video
+
+
+def test_not_enough_space_fails_before_downloading(server, staging, tmp_path):
+    staging.min_free = 1024 ** 5 # A petabyte
+    policy = FormatPolicy.parse("best")
+    queue = DownloadQueue(lambda job: resolve_and_download(job, policy), max_workers=1)
+    job = queue.submit(DownloadJob(f"{server.base_url}/progressive/full.mp4", None, policy.media_type,
+                                   str(tmp_path / "library")))
+    queue.join()
+    assert job.status == DownloadJob.FAILED
+    assert "Not enough disk space" in job.error
+    assert os.listdir(tmp_path / "library") == []
@@ -0,0 +1,77 @@
+import pytest
+
+from format_ranking import AUDIO, VIDEO, FormatPolicy, parse_size
+
+INFO = {
+    'duration': 100,
+    'formats': [
+        {'format_id': "18", 'ext': "mp4", 'vcodec': "avc1.42001E", 'acodec': "mp4a.40.2", 'height': 360, 'tbr': 500},
+        {'format_id': "43", 'ext': "webm", 'vcodec': "vp8", 'acodec': "vorbis", 'height': 360, 'tbr': 600},
+        {'format_id': "137", 'ext': "mp4", 'vcodec': "avc1.640028", 'acodec': "none", 'height': 1080, 'tbr': 4000},
+        {'format_id': "313", 'ext': "webm", 'vcodec': "vp9", 'acodec': "none", 'height': 2160, 'tbr': 15000},
+        {'format_id': "140", 'ext': "m4a", 'vcodec': "none", 'acodec': "mp4a.40.2", 'abr': 128, 'tbr': 128},
+        {'format_id': "251", 'ext': "webm", 'vcodec': "none", 'acodec': "opus", 'abr': 160, 'tbr': 160},
+    ],
+}
+
+
+def test_parse_words():
+    policy = FormatPolicy.parse("smallest av1, vp9 h264 mp4 >= 720p <=500MB >=2mbps")
+    assert policy.prefer == "smallest"
+    assert policy.codecs == ["av01", "vp9", "avc1"]
+    assert policy.container == "mp4"
+    assert policy.media_type == VIDEO
+    assert policy.min_height == 720
+    assert policy.max_filesize == 500 * 1024 ** 2
+    assert policy.min_bitrate == 2000
+
+
+def test_parse_audio():
+    policy = FormatPolicy.parse("best audio m4a >=128k")
+    assert (policy.media_type, policy.container, policy.min_bitrate) == (AUDIO, "m4a", 128)
+
+
+def test_bare_height_is_a_maximum():
+    policy = FormatPolicy.parse("best 1080p")
+    assert (policy.container, policy.max_height, policy.min_height) == (None, 1080, None)
+
+
+@pytest.mark.parametrize("text", ["", "smallest 720", "best foo", "best <=1080"])
+def test_parse_rejects_unknown_words(text):
+    with pytest.raises(ValueError):
+        FormatPolicy.parse(text)
+
+
+def test_parse_round_trips_through_str():
+    policy = FormatPolicy.parse("smallest av1 vp9 mp4 >=720p <=1080p")
+    assert FormatPolicy.parse(str(policy)).to_dict() == policy.to_dict()
+
+
+@pytest.mark.parametrize("text, format_id", [
+    ("best", "313+251"),
+    ("best 1080p", "137+140"),
+    ("best mp4 <=720p", "18"),
+    ("best webm", "43"),
+    ("best mkv", "313+251"),
+    ("smallest", "18"),
+    ("best audio", "251"),
+    ("best audio m4a", "140"),
+])
+def test_select(text, format_id):
+    assert FormatPolicy.parse(text).select(INFO)['format_id'] == format_id
+
+
+def test_container_drops_pairs_merged_into_another():
+    policy = FormatPolicy.parse("best webm")
+    assert [f['format_id'] for f in policy.rank(INFO)] == ["43"]
+
+
+def test_select_without_a_match():
+    assert FormatPolicy.parse("best >=4320p").select(INFO) is None
+
+
+def test_parse_size():
+    assert parse_size("1.5GiB") == int(1.5 * 1024 ** 3)
+    assert parse_size("2048") == 2048
+    with pytest.raises(ValueError):
+        parse_size("lots")
@@ -0,0 +1,125 @@
+import collections
+import errno
+import os
+import threading
+import time
+
+import pytest
+
+import output_staging
+from downloader_core import DownloadJob, AUDIO, VIDEO
+from output_staging import MiB, OutputStaging, expected_size, move_atomically
+
+Usage = collections.namedtuple('Usage', 'total used free')
+
+
+@pytest.fixture
+def free_space(monkeypatch):
+    """Pretends every disk has `free_space.bytes` free."""
+    class FreeSpace:
+        bytes = 100 * MiB
+    monkeypatch.setattr(output_staging.shutil, 'disk_usage', lambda path: Usage(0, 0, FreeSpace.bytes))
+    return FreeSpace
+
+
+def job(save_path, size_mib=None, format_id="18", media_type=VIDEO):
+    fmt = {'format_id': format_id, 'filesize': size_mib * MiB if size_mib else None}
+    return DownloadJob("https://example.com/v", fmt, media_type, str(save_path), title=f"{size_mib} MiB")
+
+
+def test_expected_size(tmp_path):
+    pair = job(tmp_path, format_id="137+140")
+    pair.format['requested_formats'] = [{'filesize': 10 * MiB}, {'filesize_approx': 2 * MiB}]
+    assert expected_size(pair) == int(12 * MiB * output_staging.SIZE_MARGIN)
+
+    by_bitrate = job(tmp_path)
+    by_bitrate.format = {'format_id': "18", 'tbr': 800}
+    by_bitrate.info = {'duration': 60}
+    assert expected_size(by_bitrate) == int(800 * 1000 / 8 * 60 * output_staging.SIZE_MARGIN)
+
+    assert expected_size(job(tmp_path)) is None
+
+
+def test_reserve_fails_at_once_when_it_can_never_fit(tmp_path, free_space):
+    staging = OutputStaging(min_free=10 * MiB)
+    with pytest.raises(OSError) as excinfo:
+        staging.reserve(job(tmp_path, 90))
+    assert excinfo.value.errno == errno.ENOSPC
+    staging.reserve(job(tmp_path, 80)).release()
+
+
+def test_merges_and_audio_reserve_two_copies(tmp_path, free_space):
+    staging = OutputStaging(min_free=0)
+    with pytest.raises(OSError):
+        staging.reserve(job(tmp_path, 60, format_id="137+140"))
+    with pytest.raises(OSError):
+        staging.reserve(job(tmp_path, 60, media_type=AUDIO))
+
+
+def test_reservations_wait_for_each_other(tmp_path, free_space):
+    staging = OutputStaging(min_free=0, recheck_interval=5)
+    first = staging.reserve(job(tmp_path, 60))
+    reserved = threading.Event()
+
+    def second():
+        staging.reserve(job(tmp_path, 60)).release()
+        reserved.set()
+
+    threading.Thread(target=second, daemon=True).start()
+    assert not reserved.wait(0.3) # 60 + 60 MiB don't fit in 100
+    first.release()
+    assert reserved.wait(2)
+
+
+def test_written_bytes_are_no_longer_reserved(tmp_path, free_space):
+    staging = OutputStaging(min_free=0)
+    first = staging.reserve(job(tmp_path, 60))
+    first.progress_hook({'status': 'downloading', 'downloaded_bytes': 50 * MiB, 'filename': "a.mp4"})
+    free_space.bytes = 50 * MiB # What the download wrote is gone from the disk instead
+    staging.reserve(job(tmp_path, 30)).release() # 10 MiB still outstanding, 40 MiB left
+    first.release()
+
+
+def test_unknown_size_still_keeps_min_free(tmp_path, free_space):
+    with pytest.raises(OSError):
+        OutputStaging(min_free=200 * MiB).reserve(job(tmp_path))
+
+
+def test_staged_file_is_moved_into_the_save_path(tmp_path):
+    staging = OutputStaging(temp_dir=str(tmp_path / "stage"), min_free=0)
+    reservation = staging.reserve(job(tmp_path / "library", 1))
+    assert reservation.work_dir.startswith(str(tmp_path / "stage"))
+    assert staging.work_dir(str(tmp_path / "library")) == reservation.work_dir # Stable, for resuming
+
+    staged = os.path.join(reservation.work_dir, "clip.mp4")
+    with open(staged, 'wb') as f:
+        f.write(b"video")
+    final = reservation.finalize(staged)
+    reservation.release()
+
+    assert final == str(tmp_path / "library" / "clip.mp4")
+    assert open(final, 'rb').read() == b"video"
+    assert os.listdir(reservation.work_dir) == []
+
+
+def test_move_across_disks_only_shows_the_complete_file(tmp_path, monkeypatch):
+    source = tmp_path / "stage" / "clip.mp4"
+    source.parent.mkdir()
+    source.write_bytes(b"video")
+    target = tmp_path / "library" / "clip.mp4"
+    replace = os.replace
+    renamed = []
+
+    def cross_device_replace(src, dst):
+        if src == str(source):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        renamed.append(os.path.basename(src))
+        replace(src, dst)
+
+    monkeypatch.setattr(output_staging.os, 'replace', cross_device_replace)
+    move_atomically(str(source), str(target))
+
+    assert target.read_bytes() == b"video"
+    assert not source.exists()
+    assert renamed == [f".clip.mp4.{os.getpid()}.partial"]
+    assert os.listdir(target.parent) == ["clip.mp4"]
@@ -0,0 +1,107 @@
+import contextlib
+
+import pytest
+import yt_dlp
+
+import downloader_core as core
+import subscription_sync
+from subscription_sync import SubscriptionStore, SubscriptionSync
+
+CHANNEL = "https://example.com/@channel"
+
+
+class FakeYdl(yt_dlp.YoutubeDL):
+    """Answers flat extractions from `listings` ({url: [entries, newest first]}) without any network."""
+
+    def __init__(self, listings):
+        super().__init__({'quiet': True, 'extract_flat': 'in_playlist'})
+        self.listings = listings
+        self.extracted = []
+
+    def extract_info(self, url, download=True, ie_key=None, process=True, **kwargs):
+        self.extracted.append(url)
+        return {'_type': 'playlist', 'id': url, 'webpage_url': url, 'entries': list(self.listings[url])}
+
+
+class FakePool:
+    def __init__(self, ydl):
+        self.ydl = ydl
+
+    def extractor(self, ydl_opts):
+        return contextlib.nullcontext(self.ydl)
+
+
+def videos(prefix, count):
+    """Flat video entries, newest first."""
+    return [{'_type': 'url', 'ie_key': 'Youtube', 'id': f"{prefix}{n}", 'url': f"https://example.com/{prefix}{n}"}
+            for n in reversed(range(count))]
+
+
+def tab(name):
+    return {'_type': 'url', 'ie_key': 'YoutubeTab', 'url': f"{CHANNEL}/{name}"}
+
+
+@pytest.fixture
+def channel(monkeypatch):
+    listings = {
+        CHANNEL: [tab("videos"), tab("shorts")],
+        f"{CHANNEL}/videos": videos("v", 30),
+        f"{CHANNEL}/shorts": videos("s", 50),
+    }
+    ydl = FakeYdl(listings)
+    monkeypatch.setattr(core, '_ydl_pool', FakePool(ydl))
+    return ydl
+
+
+def make_sync(tmp_path, initial):
+    handed_over = []
+    store = SubscriptionStore(str(tmp_path / "subscriptions.sqlite3"))
+    sync = SubscriptionSync(store, lambda source, entries: handed_over.extend(entries), initial=initial)
+    return sync, handed_over
+
+
+def test_each_tab_remembers_its_own_entries(tmp_path, channel):
+    sync, handed_over = make_sync(tmp_path, initial=5)
+
+    assert sync.check(CHANNEL) == 10 # The 5 newest of each tab
+    assert [entry['id'] for entry in handed_over] == ["v25", "v26", "v27", "v28", "v29",
+                                                      "s45", "s46", "s47", "s48", "s49"]
+    assert sync.check(CHANNEL) == 0 # Nothing changed upstream
+
+    channel.listings[f"{CHANNEL}/videos"].insert(0, videos("v", 31)[0])
+    channel.listings[f"{CHANNEL}/shorts"].insert(0, videos("s", 51)[0])
+    del handed_over[:]
+    assert sync.check(CHANNEL) == 2
+    assert sorted(entry['id'] for entry in handed_over) == ["s50", "v30"]
+
+
+def test_without_initial_everything_is_new_once(tmp_path, channel):
+    sync, handed_over = make_sync(tmp_path, initial=None)
+
+    assert sync.check(CHANNEL) == 80
+    assert sync.check(CHANNEL) == 0
+
+
+def test_a_known_listing_stops_at_known_entries(tmp_path, channel):
+    sync, _ = make_sync(tmp_path, initial=5)
+    sync.check(CHANNEL)
+
+    found = subscription_sync.list_new_entries(CHANNEL, sync.store.get(CHANNEL)['listings'])
+    assert found == {CHANNEL: [], f"{CHANNEL}/videos": [], f"{CHANNEL}/shorts": []}
+
+
+def test_entries_without_ie_key(tmp_path, channel):
+    channel.listings[CHANNEL].append({'_type': 'url', 'ie_key': None, 'id': "x", 'url': "https://example.com/x"})
+    sync, handed_over = make_sync(tmp_path, initial=None)
+
+    assert sync.check(CHANNEL) == 81
+    assert "x" in [entry['id'] for entry in handed_over]
+
+
+def test_state_saved_before_tabs_were_kept_apart(tmp_path, channel):
+    store = SubscriptionStore(str(tmp_path / "subscriptions.sqlite3"))
+    with store._db:
+        store._db.execute("INSERT INTO sources (url, recent_ids, last_date) VALUES (?, ?, ?)",
+                          (CHANNEL, '["v29"]', None))
+
+    assert store.get(CHANNEL)['listings'] == {CHANNEL: {'recent_ids': ["v29"], 'last_date': None}}
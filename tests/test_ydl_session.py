@@ -0,0 +1,101 @@
+import io
+import sys
+
+import pytest
+import yt_dlp
+from yt_dlp.networking import Response
+from yt_dlp.networking.exceptions import HTTPError
+
+import ydl_session
+from ydl_session import NETWORK, RATE_LIMITED, SERVER_ERROR, TIMEOUT, RetryPolicy, classify_error, http_status
+
+
+def http_error(status, headers=None):
+    return HTTPError(Response(io.BytesIO(b""), "https://example.com/v", headers or {}, status=status))
+
+
+def wrapped(error):
+    """The error as yt-dlp reports it from a download."""
+    try:
+        raise error
+    except Exception:
+        return yt_dlp.utils.DownloadError(f"ERROR: {error}", exc_info=sys.exc_info())
+
+
+@pytest.mark.parametrize("error, expected", [
+    (http_error(429, {'Retry-After': "7"}), (RATE_LIMITED, 7.0)),
+    (http_error(503), (SERVER_ERROR, None)),
+    (http_error(408), (TIMEOUT, None)),
+    (http_error(404), (None, None)),
+    (http_error(403), (None, None)),
+    (TimeoutError("timed out"), (TIMEOUT, None)),
+    (ConnectionResetError(), (NETWORK, None)),
+    (RuntimeError("ERROR: unable to download video data: HTTP Error 502: Bad Gateway"), (SERVER_ERROR, None)),
+    (RuntimeError("ERROR: [youtube] abc: Private video"), (None, None)),
+])
+def test_classify_error(error, expected):
+    assert classify_error(error) == expected
+
+
+def test_classify_wrapped_errors():
+    assert classify_error(wrapped(http_error(429, {'Retry-After': "3"}))) == (RATE_LIMITED, 3.0)
+    assert classify_error(yt_dlp.utils.ExtractorError("Unable to download webpage", cause=http_error(500))) \
+        == (SERVER_ERROR, None)
+    assert classify_error(wrapped(http_error(410))) == (None, None)
+
+
+def test_http_status():
+    assert http_status(wrapped(http_error(403))) == 403
+    assert http_status(RuntimeError("HTTP Error 410: Gone")) == 410
+    assert http_status(RuntimeError("No space left on device")) is None
+
+
+def test_delay_for():
+    policy = RetryPolicy(attempts=3, base_delay=2.0, max_delay=60.0)
+    assert 1.0 <= policy.delay_for(http_error(503), 1) <= 2.0
+    assert 2.0 <= policy.delay_for(http_error(503), 2) <= 4.0
+    assert policy.delay_for(http_error(503), 3) is None # Out of attempts
+    assert policy.delay_for(http_error(404), 1) is None # Retrying won't help
+
+
+def test_delay_for_honours_retry_after_within_reason():
+    policy = RetryPolicy(attempts=4, base_delay=1.0, max_delay=5.0)
+    assert policy.delay_for(http_error(429, {'Retry-After': "30"}), 1) == 30
+    assert policy.delay_for(http_error(429, {'Retry-After': "3600"}), 1) == 50 # 10 * max_delay
+
+
+def test_backoff_stays_within_max_delay():
+    assert all(5.0 <= ydl_session.backoff_delay(attempt, 1.0, 10.0) <= 10.0 for attempt in range(5, 20))
+
+
+def test_call_retries_transient_errors(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(ydl_session.time, 'sleep', sleeps.append)
+    results = iter([http_error(503), TimeoutError(), "done"])
+
+    def func():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    retries = []
+    assert RetryPolicy(attempts=3).call(func, on_retry=lambda e, attempt, delay: retries.append(attempt)) == "done"
+    assert retries == [1, 2]
+    assert len(sleeps) == 2
+
+
+def test_call_gives_up(monkeypatch):
+    monkeypatch.setattr(ydl_session.time, 'sleep', lambda seconds: None)
+    calls = []
+
+    def func(error):
+        calls.append(error)
+        raise error
+
+    with pytest.raises(HTTPError):
+        RetryPolicy(attempts=3).call(func, http_error(404))
+    assert len(calls) == 1
+    with pytest.raises(HTTPError):
+        RetryPolicy(attempts=3).call(func, http_error(503))
+    assert len(calls) == 4
@@ -0,0 +1,226 @@
+"""
+Shared yt-dlp sessions and retries for transient failures.
+
+Creating a YoutubeDL for every fetch throws away its HTTP connections,
+its cookies and the state of its extractors (YouTube's extractor caches
+the player JavaScript, one of the larger downloads of an extraction).
+YdlPool keeps extraction instances alive between calls instead, one per
+concurrent user since a YoutubeDL isn't thread-safe, and gives every
+instance it hands out, download ones included, the same cookie jar.
+
+RetryPolicy classifies errors and retries the transient ones (HTTP 429
+and 5xx, timeouts, dropped connections) with exponential backoff and
+jitter; anything else, such as a private or removed video, fails at once.
+"""
+import contextlib
+import random
+import re
+import socket
+import threading
+import time
+
+RATE_LIMITED = "rate limited"
+SERVER_ERROR = "server error"
+TIMEOUT = "timeout"
+NETWORK = "network"
+
+# Fallback for errors that only survive as text, e.g. "ERROR: ... HTTP Error 503: Service Unavailable"
+_TRANSIENT_MESSAGES = [
+    (re.compile(r'HTTP Error 429\b|Too Many Requests', re.I), RATE_LIMITED),
+    (re.compile(r'HTTP Error 5\d\d\b'), SERVER_ERROR),
+    (re.compile(r'timed out|HTTP Error 408\b', re.I), TIMEOUT),
+    (re.compile(r'Connection (reset|aborted|refused)|Remote end closed|IncompleteRead|'
+                r'Temporary failure in name resolution', re.I), NETWORK),
+]
+
+
+def classify_error(error):
+    """
+    Returns (kind, retry_after) for a transient error, where kind is one of
+    RATE_LIMITED, SERVER_ERROR, TIMEOUT or NETWORK and retry_after the
+    server's Retry-After in seconds (or None). Returns (None, None) for
+    errors that retrying won't fix.
+    """
+    for cause in _causes(error):
+        if _is_http_error(cause):
+            status = cause.status
+            if status == 429:
+                return RATE_LIMITED, _retry_after(cause)
+            if 500 <= status < 600:
+                return SERVER_ERROR, _retry_after(cause)
+            if status == 408:
+                return TIMEOUT, None
+            return None, None # Other 4xx: forbidden, gone, ...
+        if isinstance(cause, (socket.timeout, TimeoutError)):
+            return TIMEOUT, None
+        if isinstance(cause, ConnectionError) or type(cause).__name__ in ('TransportError', 'IncompleteRead'):
+            return NETWORK, None
+    message = str(error)
+    for pattern, kind in _TRANSIENT_MESSAGES:
+        if pattern.search(message):
+            return kind, None
+    return None, None
+
+
+def http_status(error):
+    """The status code of the HTTP error that `error` is or wraps (e.g. in a DownloadError), or None."""
+    for cause in _causes(error):
+        if _is_http_error(cause):
+            return cause.status
+    match = re.search(r'HTTP Error (\d{3})\b', str(error))
+    return int(match.group(1)) if match else None
+
+
+def _is_http_error(cause):
+    return isinstance(getattr(cause, 'status', None), int) and type(cause).__name__ == 'HTTPError' # yt-dlp's or urllib's
+
+
+def _causes(error):
+    """The error and everything it wraps: yt-dlp's exc_info and cause, and Python's exception chain."""
+    seen = set()
+    pending = [error]
+    while pending:
+        cause = pending.pop(0)
+        if cause is None or id(cause) in seen:
+            continue
+        seen.add(id(cause))
+        yield cause
+        exc_info = getattr(cause, 'exc_info', None)
+        if isinstance(exc_info, tuple) and len(exc_info) > 1:
+            pending.append(exc_info[1])
+        pending.extend([getattr(cause, 'cause', None), cause.__cause__, cause.__context__])
+
+
+def _retry_after(http_error):
+    try:
+        headers = http_error.response.headers if hasattr(http_error, 'response') else http_error.headers
+        value = headers.get('Retry-After')
+        return float(value) if value else None
+    except (AttributeError, TypeError, ValueError):
+        return None # An HTTP date, or no headers at all
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0):
+    """
+    Seconds to wait after failed attempt number `attempt` (1-based): doubles
+    every attempt up to `max_delay`, then a random amount between half and
+    all of it, so clients that failed together don't retry together.
+    """
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def ydl_retry_sleep(n):
+    """yt-dlp `retry_sleep_functions` entry: backoff for its own HTTP, fragment and extractor retries."""
+    return backoff_delay(n + 1, base_delay=1.0, max_delay=30.0)
+
+
+class RetryPolicy:
+    def __init__(self, attempts=4, base_delay=2.0, max_delay=60.0):
+        self.attempts = attempts # Tries in total, including the first one
+        self.base_delay = base_delay # Seconds before the first retry, doubled for every further one
+        self.max_delay = max_delay
+
+    def delay_for(self, error, attempt):
+        """Seconds to wait before retrying after failed attempt number `attempt`, or None to give up."""
+        kind, retry_after = classify_error(error)
+        if kind is None or attempt >= self.attempts:
+            return None
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        if retry_after:
+            delay = max(delay, min(retry_after, 10 * self.max_delay)) # Honour the server, within reason
+        return delay
+
+    def call(self, func, *args, on_retry=None, **kwargs):
+        """
+        Calls func(*args, **kwargs), retrying transient failures.
+        `on_retry(error, attempt, delay)` is called before each wait.
+        """
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self.delay_for(e, attempt)
+                if delay is None:
+                    raise
+                if on_retry:
+                    on_retry(e, attempt, delay)
+                time.sleep(delay)
+                attempt += 1
+
+
+class YdlPool:
+    """
+    Long-lived YoutubeDL instances for extraction, shared between fetches,
+    playlist listings and subscription checks. Each instance is used by one
+    thread at a time; idle ones are kept per set of options.
+    """
+
+    def __init__(self, max_idle=8, max_idle_seconds=300, max_uses=500):
+        self.max_idle = max_idle # Idle instances kept per set of options
+        self.max_idle_seconds = max_idle_seconds # Servers drop idle connections anyway
+        self.max_uses = max_uses # Retired after this many uses, so their caches can't grow forever
+        self._idle = {} # Options key -> [(YoutubeDL, idle since, uses)]
+        self._cookiejar = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def extractor(self, ydl_opts):
+        """Context manager lending a pooled YoutubeDL created with `ydl_opts`."""
+        key = repr(sorted(ydl_opts.items()))
+        ydl, uses = self._checkout(key, ydl_opts)
+        try:
+            yield ydl
+        finally:
+            self._checkin(key, ydl, uses + 1)
+
+    def downloader(self, ydl_opts):
+        """A new YoutubeDL for one download (its options are the job's own) that shares the pool's cookies."""
+        import yt_dlp
+        return self._share_cookies(yt_dlp.YoutubeDL(ydl_opts))
+
+    def close(self):
+        """Closes every idle instance."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for instances in idle.values():
+            for ydl, _, _ in instances:
+                ydl.close()
+
+    def _checkout(self, key, ydl_opts):
+        now = time.monotonic()
+        stale = []
+        found = None
+        with self._lock:
+            instances = self._idle.get(key, [])
+            while instances:
+                ydl, idle_since, uses = instances.pop()
+                if now - idle_since > self.max_idle_seconds:
+                    stale.append(ydl)
+                else:
+                    found = ydl, uses
+                    break
+        for ydl in stale:
+            ydl.close()
+        if found:
+            return found
+        import yt_dlp
+        return self._share_cookies(yt_dlp.YoutubeDL(dict(ydl_opts))), 0
+
+    def _checkin(self, key, ydl, uses):
+        with self._lock:
+            instances = self._idle.setdefault(key, [])
+            if uses < self.max_uses and len(instances) < self.max_idle:
+                instances.append((ydl, time.monotonic(), uses))
+                return
+        ydl.close()
+
+    def _share_cookies(self, ydl):
+        with self._lock:
+            if self._cookiejar is None:
+                self._cookiejar = ydl.cookiejar # The first instance loads the cookies (e.g. a cookiefile)
+            else:
+                # YoutubeDL.cookiejar is created on first use; setting it first makes the instance use ours
+                ydl.cookiejar = self._cookiejar
+        return ydl
@@ -1,33 +1,135 @@
+import time
+STARTED = time.perf_counter() # Start of the start-up timing, taken before the other imports
+
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import yt_dlp
 import os
 import subprocess
 import threading
-import math # Import math for progress bar calculation
 import platform # To identify the OS for opening the folder after download
+import multiprocessing
+
+import downloader_core as core
+from downloader_core import DownloadJob, DownloadQueue
+from job_journal import JobJournal
+from download_archive import DownloadArchive
+from progress_tracker import ProgressTracker
+from performance_profile import PerformanceProfile
+from audio_transcode import AUDIO_CODECS
+from bandwidth import BandwidthScheduler, PRIORITIES, parse_rate, parse_schedule
+from startup_timing import StartupTimer
+from format_model import FormatModel
+from format_ranking import DEFAULT_POLICY, FormatPolicy, parse_size
+from ydl_session import classify_error
+
+PROGRESS_REFRESH_MS = 100 # Download progress is redrawn at 10 Hz
+STREAM_RENDER_CHUNK = 200 # Stream table rows inserted per event-loop turn
+STREAM_FILTER_DELAY_MS = 150 # Quiet time after a filter change before the table is redrawn
+ANY_FILTER = "any"
+
+# Stream table columns: (column, heading, width)
+STREAM_COLUMNS = (
+    ("resolution", "Resolution", 90),
+    ("fps", "FPS", 45),
+    ("codec", "Codec", 110),
+    ("container", "Container", 70),
+    ("bitrate", "Bitrate", 80),
+    ("size", "Size", 80),
+    ("kind", "Type", 90),
+)
 
 
 class YouTubeDownloader:
-    def __init__(self, root):
+    def __init__(self, root, startup_timer=None, echo_startup_timing=False):
         self.root = root
+        self.startup_timer = startup_timer or StartupTimer()
+        self.echo_startup_timing = echo_startup_timing # --startup-timing
         self.root.title("YouTube Downloader")
-        self.selected_streams = None
         self.video_info = None
+        self.format_model = None # FormatModel of self.video_info, built once per video
+        self.stream_rows = [] # FormatRows shown in the stream table; item id = index
+        self.stream_selected_index = None # Row to select once it has been inserted
+        self.stream_auto_picked = None # Format id the auto-pick policy selected, while the user hasn't selected another
+        self.stream_sort = (None, False) # (column, descending); no column keeps the best-first order
+        self.stream_render_generation = 0 # Bumped on every redraw so an unfinished one stops
+        self._streams_refresh_after = None
+        self.codec_filter = tk.StringVar(value=ANY_FILTER)
+        self.height_filter = tk.StringVar(value=ANY_FILTER)
+        self.container_filter = tk.StringVar(value=ANY_FILTER)
+        self.max_size_filter = tk.StringVar(value="") # MB, empty for any size
+        self.format_policy = tk.StringVar(value=DEFAULT_POLICY) # Stream selected by default, same words as the CLI's --format
         self.style = ttk.Style(self.root)
         self.download_path = os.path.join(os.path.expanduser("~"), "Downloads")  # Default to Downloads folder
         self.open_folder_after_download = tk.BooleanVar(value=True) # Initialize the new option
+        self.max_parallel_downloads = tk.IntVar(value=3) # Size of the download worker pool
+        self.audio_codec = tk.StringVar(value="original") # "original" keeps the source codec
+        self.audio_bitrate = tk.StringVar(value="source")
+        self.concurrent_fragments = tk.IntVar(value=4) # Fragments fetched at once for DASH/HLS
+        self.use_aria2c = tk.BooleanVar(value=False) # External multi-connection downloader
+        self.merge_format = tk.StringVar(value="auto") # Container for merged video+audio streams
+        self.bandwidth_limit = tk.StringVar(value="") # Empty for unlimited
+        self.bandwidth_schedule = tk.StringVar(value="") # e.g. "09:00-17:00=1M"
+        self.job_priority = tk.StringVar(value="normal") # Priority of newly queued downloads
+        self.job_rows = {} # DownloadJob.id -> Treeview item id
+        self.playlist_entries = [] # Flat entries of the fetched playlist/channel
+        self.playlist_infos = {} # Entry index -> full stream information
+        self.playlist_fetcher = None
+        self.fetch_generation = 0 # Bumped on every fetch so stale results are ignored
+
+        # Hooks write into per-job state; _poll_progress() redraws at a fixed rate
+        self.progress_tracker = ProgressTracker()
+
+        # Journal of queued/running jobs so they can be resumed after a crash or restart
+        self.job_journal = JobJournal(os.path.join(core.app_data_dir(), "jobs.sqlite3"))
+
+        # Archive of finished downloads, to catch duplicates before they are queued
+        self.download_archive = DownloadArchive(os.path.join(core.app_data_dir(), "archive.sqlite3"))
+
+        # Bandwidth budget shared by the running downloads
+        self.bandwidth = BandwidthScheduler()
+
+        # Per-download timings, throughput and retries, logged to metrics.jsonl (see main() for --metrics-port)
+        self.metrics = core.get_metrics() or core.configure_metrics()
+
+        # Bounded worker pool that runs the queued downloads
+        self.download_queue = DownloadQueue(self._download_job,
+                                            max_workers=self.max_parallel_downloads.get(),
+                                            on_update=self._on_job_update,
+                                            journal=self.job_journal,
+                                            bandwidth=self.bandwidth,
+                                            metrics=self.metrics,
+                                            retry_policy=core.get_retry_policy())
+
+        # Start in dark mode. The ttk styles are set before the widgets exist,
+        # so the widgets are created with them instead of being restyled afterwards.
+        self.dark_mode = True
+        self._apply_theme_styles()
 
         # Initialize widgets creation
         self.create_widgets()
+        self._apply_theme_to_widgets()
+        self.startup_timer.mark("widgets_built")
+        self._poll_progress() # Start the progress refresh loop
+
+        # The rest waits until the main window is up and drawn
+        self.root.after_idle(self._on_window_ready)
 
-        # Set initial theme state to start in dark mode.
-        # We'll set self.dark_mode to False initially, so the first call to toggle_theme() will set it to True and apply the dark mode styles.
-        self.dark_mode = False
-        self.toggle_theme() # Apply dark mode styles
+    def _on_window_ready(self):
+        """Runs on the first idle moment of the main loop, i.e. once the main window is usable."""
+        self.startup_timer.mark("interactive")
+        # yt_dlp (the slowest import by far) loads in the background; a fetch started earlier just waits for it
+        core.preload_yt_dlp(on_ready=lambda seconds: self.root.after(0, self._on_yt_dlp_loaded, seconds))
 
-        # Show welcome page on startup
-        self.show_welcome_page()
+        # Show welcome page on startup, then offer to resume downloads left over from last time
+        welcome_window = self.show_welcome_page()
+        welcome_window.bind("<Destroy>", lambda event: event.widget is welcome_window and self._offer_resume())
+
+    def _on_yt_dlp_loaded(self, seconds):
+        self.startup_timer.mark("yt_dlp_loaded")
+        self.startup_timer.mark("yt_dlp_import", seconds)
+        self.startup_timer.report(os.path.join(core.app_data_dir(), "startup_timing.jsonl"),
+                                  echo=self.echo_startup_timing)
 
     # Show welcome page on startup
     def show_welcome_page(self):
@@ -56,15 +158,18 @@ How to Use:
 4. Choose a stream from the 'Available Streams' list.
 5. (Optional) Click 'Change Path' to select where the file will be saved.
    The default is your current working directory.
-6. Click 'Download Selected Stream'.
+6. Click 'Download Selected Stream'. It is added to the Download Queue,
+   so you can keep queueing more streams (see 'Parallel downloads').
 7. Wait for the download to complete. A message will confirm success or failure.
 
 Tips:
 - Toggle between Dark/Light mode using the ☀️/🌙 button.
-- For audio downloads, FFmpeg is required to convert to MP3.
-  Ensure FFmpeg is installed and in your system's PATH if you encounter issues.
+- Audio is saved in its original codec (e.g. opus or m4a) without re-encoding.
+  Pick a codec or bitrate under 'Audio Output' to convert it (e.g. to MP3);
+  this needs FFmpeg. Ensure FFmpeg is installed and in your system's PATH if you encounter issues.
   You can download it from https://ffmpeg.org/download.html or open command prompt and type 'winget install ffmpeg'.
-- For video downloads, FFmpeg is not required.
+- For video downloads, FFmpeg is only needed for the "video+audio" streams
+  (usually everything above 720p). They are merged without re-encoding.
 - If you encounter any issues, please report them on the GitHub page.
 
 Enjoy downloading!
@@ -91,6 +196,23 @@ Enjoy downloading!
         x = self.root.winfo_x() + (self.root.winfo_width() // 2) - (welcome_window.winfo_width() // 2)
         y = self.root.winfo_y() + (self.root.winfo_height() // 2) - (welcome_window.winfo_height() // 2)
         welcome_window.geometry(f"+{x}+{y}")
+        return welcome_window
+
+    def _offer_resume(self):
+        """Asks whether to resume the jobs that were unfinished when the app last stopped."""
+        rows = self.job_journal.unfinished()
+        if not rows:
+            return
+        titles = "\n".join(f"- {row['title'] or row['url']}" for row in rows[:10])
+        if len(rows) > 10:
+            titles += f"\n... and {len(rows) - 10} more"
+        if messagebox.askyesno("Resume Downloads",
+                               f"{len(rows)} download(s) did not finish last time:\n{titles}\n\n"
+                               "Resume them? Partially downloaded files will be continued."):
+            for row in rows:
+                self.download_queue.submit(DownloadJob.from_journal_row(row))
+        else:
+            self.job_journal.discard([row['id'] for row in rows])
 
     def create_widgets(self):
         # Dark mode toggle button in top-left corner
@@ -104,13 +226,64 @@ Enjoy downloading!
         self.link_entry = ttk.Entry(frame_url, width=60)
         self.link_entry.pack(side="left", padx=5, pady=5, expand=True, fill="x")
         ttk.Button(frame_url, text="Fetch Streams", command=self.fetch_streams).pack(side="left", padx=5)
+        ttk.Button(frame_url, text="Clear Cache", command=self.clear_metadata_cache).pack(side="left", padx=5)
 
         # Option for Video vs Audio using radio buttons
         frame_option = ttk.LabelFrame(self.root, text="Download Options")
         frame_option.pack(padx=10, pady=10, fill="x")
         self.type = tk.StringVar(value="Video")
-        ttk.Radiobutton(frame_option, text="Video", variable=self.type, value="Video").pack(side="left", padx=5)
-        ttk.Radiobutton(frame_option, text="Audio", variable=self.type, value="Audio").pack(side="left", padx=5)
+        # Switching re-filters the cached format model of the current video
+        ttk.Radiobutton(frame_option, text="Video", variable=self.type, value="Video",
+                        command=self._refresh_streams).pack(side="left", padx=5)
+        ttk.Radiobutton(frame_option, text="Audio", variable=self.type, value="Audio",
+                        command=self._refresh_streams).pack(side="left", padx=5)
+        ttk.Label(frame_option, text="Merge into:").pack(side="left", padx=(20, 5))
+        merge_combobox = ttk.Combobox(frame_option, textvariable=self.merge_format, width=5,
+                                      values=("auto", "mp4", "mkv"), state="readonly")
+        merge_combobox.pack(side="left")
+        merge_combobox.bind("<<ComboboxSelected>>", lambda event: self._refresh_streams())
+        ttk.Label(frame_option, text="Auto-pick:").pack(side="left", padx=(20, 5))
+        ttk.Entry(frame_option, textvariable=self.format_policy, width=18).pack(side="left")
+        self.format_policy.trace_add("write", lambda *args: self._schedule_streams_refresh())
+        ttk.Label(frame_option, text="Parallel downloads:").pack(side="left", padx=(20, 5))
+        ttk.Spinbox(frame_option, from_=1, to=8, width=3, textvariable=self.max_parallel_downloads,
+                    command=self._on_parallel_downloads_changed).pack(side="left")
+
+        # Audio output: keep the source codec unless another codec or bitrate is picked
+        frame_audio = ttk.LabelFrame(self.root, text="Audio Output")
+        frame_audio.pack(padx=10, pady=10, fill="x")
+        ttk.Label(frame_audio, text="Codec:").pack(side="left", padx=5)
+        ttk.Combobox(frame_audio, textvariable=self.audio_codec, width=10, state="readonly",
+                     values=("original",) + tuple(AUDIO_CODECS)).pack(side="left")
+        ttk.Label(frame_audio, text="Bitrate (kbps):").pack(side="left", padx=(20, 5))
+        ttk.Combobox(frame_audio, textvariable=self.audio_bitrate, width=6, state="readonly",
+                     values=("source", "96", "128", "160", "192", "256", "320")).pack(side="left")
+        ttk.Label(frame_audio, text="(\"original\" and \"source\" copy the stream without re-encoding)").pack(side="left", padx=10)
+
+        # Performance profile for new downloads
+        frame_perf = ttk.LabelFrame(self.root, text="Performance")
+        frame_perf.pack(padx=10, pady=10, fill="x")
+        ttk.Label(frame_perf, text="Parallel fragments (DASH/HLS):").pack(side="left", padx=5)
+        ttk.Spinbox(frame_perf, from_=1, to=32, width=3, textvariable=self.concurrent_fragments).pack(side="left")
+        aria2c_found = PerformanceProfile(external_downloader="aria2c").uses_external_downloader()
+        ttk.Checkbutton(
+            frame_perf,
+            text="Use aria2c (multiple connections)" if aria2c_found else "Use aria2c (not found on PATH)",
+            variable=self.use_aria2c,
+            state="normal" if aria2c_found else "disabled"
+        ).pack(side="left", padx=10, pady=5)
+
+        # Global bandwidth budget shared by all downloads, with optional time-of-day limits
+        frame_bandwidth = ttk.LabelFrame(self.root, text="Bandwidth")
+        frame_bandwidth.pack(padx=10, pady=10, fill="x")
+        ttk.Label(frame_bandwidth, text="Limit (e.g. 2M):").pack(side="left", padx=5)
+        ttk.Entry(frame_bandwidth, textvariable=self.bandwidth_limit, width=8).pack(side="left")
+        ttk.Label(frame_bandwidth, text="Schedule:").pack(side="left", padx=(15, 5))
+        ttk.Entry(frame_bandwidth, textvariable=self.bandwidth_schedule, width=24).pack(side="left")
+        ttk.Button(frame_bandwidth, text="Apply", command=self.apply_bandwidth_settings).pack(side="left", padx=5)
+        ttk.Label(frame_bandwidth, text="Priority:").pack(side="left", padx=(15, 5))
+        ttk.Combobox(frame_bandwidth, textvariable=self.job_priority, width=7, state="readonly",
+                     values=tuple(PRIORITIES)).pack(side="left")
 
         # Download path selection
         frame_path = ttk.LabelFrame(self.root, text="Download location")
@@ -131,19 +304,66 @@ Enjoy downloading!
         )
         self.open_folder_checkbutton.pack(side="left", padx=10, pady=5)
 
-        # Listbox to display available streams and quality information
+        # Playlist entries (only shown after fetching a playlist or channel URL)
+        self.frame_playlist = ttk.LabelFrame(self.root, text="Playlist Entries")
+        self.playlist_listbox = tk.Listbox(self.frame_playlist, height=8, width=60, exportselection=False)
+        self.playlist_listbox.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        playlist_scrollbar = ttk.Scrollbar(self.frame_playlist, orient="vertical", command=self.playlist_listbox.yview)
+        playlist_scrollbar.pack(side="right", fill="y")
+        self.playlist_listbox.config(yscrollcommand=playlist_scrollbar.set)
+        self.playlist_listbox.bind("<<ListboxSelect>>", self._on_playlist_select)
+
+        # Table of the available streams, with quick filters; click a heading to sort
         frame_streams = ttk.LabelFrame(self.root, text="Available Streams")
         frame_streams.pack(padx=10, pady=10, fill="both", expand=True)
-        self.streams_listbox = tk.Listbox(frame_streams, height=10, width=60)
-        self.streams_listbox.pack(side="left", fill="both", expand=True, padx=5, pady=5)
-        scrollbar = ttk.Scrollbar(frame_streams, orient="vertical", command=self.streams_listbox.yview)
+        self.frame_streams = frame_streams
+
+        filter_bar = ttk.Frame(frame_streams)
+        filter_bar.pack(side="top", fill="x", padx=5, pady=(5, 0))
+        self.stream_filter_boxes = {}
+        for label, variable, width in (("Codec:", self.codec_filter, 7), ("Resolution:", self.height_filter, 7),
+                                       ("Container:", self.container_filter, 6)):
+            ttk.Label(filter_bar, text=label).pack(side="left", padx=(0, 5))
+            box = ttk.Combobox(filter_bar, textvariable=variable, width=width, state="readonly", values=(ANY_FILTER,))
+            box.pack(side="left", padx=(0, 15))
+            self.stream_filter_boxes[str(variable)] = box
+        ttk.Label(filter_bar, text="Max size (MB):").pack(side="left", padx=(0, 5))
+        ttk.Entry(filter_bar, textvariable=self.max_size_filter, width=7).pack(side="left")
+        for variable in (self.codec_filter, self.height_filter, self.container_filter, self.max_size_filter):
+            variable.trace_add("write", lambda *args: self._schedule_streams_refresh())
+
+        self.streams_status = ttk.Label(frame_streams, text="") # Row count, or why there are no rows
+        self.streams_status.pack(side="bottom", anchor="w", padx=5)
+        table_frame = ttk.Frame(frame_streams)
+        table_frame.pack(side="top", fill="both", expand=True)
+        self.streams_tree = ttk.Treeview(table_frame, columns=[column for column, _, _ in STREAM_COLUMNS],
+                                         show="headings", height=10, selectmode="browse")
+        for column, heading, width in STREAM_COLUMNS:
+            self.streams_tree.heading(column, text=heading, command=lambda c=column: self._sort_streams_by(c))
+            self.streams_tree.column(column, width=width, stretch=(column == "codec"))
+        self.streams_tree.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.streams_tree.yview)
         scrollbar.pack(side="right", fill="y")
-        self.streams_listbox.config(yscrollcommand=scrollbar.set)
+        self.streams_tree.config(yscrollcommand=scrollbar.set)
 
         # Download button
         ttk.Button(self.root, text="Download Selected Stream", command=self.download_selected).pack(pady=10)
 
-        # Progress bar
+        # Download queue with per-job status
+        frame_jobs = ttk.LabelFrame(self.root, text="Download Queue")
+        frame_jobs.pack(padx=10, pady=10, fill="both", expand=True)
+        self.jobs_tree = ttk.Treeview(frame_jobs, columns=("title", "format", "status", "progress"),
+                                      show="headings", height=5)
+        for column, heading, width in (("title", "Title", 260), ("format", "Format", 80),
+                                       ("status", "Status", 80), ("progress", "Progress", 140)):
+            self.jobs_tree.heading(column, text=heading)
+            self.jobs_tree.column(column, width=width, stretch=(column == "title"))
+        self.jobs_tree.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        jobs_scrollbar = ttk.Scrollbar(frame_jobs, orient="vertical", command=self.jobs_tree.yview)
+        jobs_scrollbar.pack(side="right", fill="y")
+        self.jobs_tree.config(yscrollcommand=jobs_scrollbar.set)
+
+        # Progress bar (overall progress of the active jobs)
         self.progress = ttk.Progressbar(self.root, mode='indeterminate')
         self.progress.pack(pady=5, padx=10, fill="x")
 
@@ -164,6 +384,11 @@ Enjoy downloading!
     def toggle_theme(self):
         """Toggle between light mode and dark mode."""
         self.dark_mode = not self.dark_mode
+        self._apply_theme_styles()
+        self._apply_theme_to_widgets()
+
+    def _apply_theme_styles(self):
+        """Configures the ttk styles of the current mode; can run before any widget exists."""
         if self.dark_mode:
             # Dark mode settings
             dark_bg = "#2e2e2e"
@@ -190,23 +415,9 @@ Enjoy downloading!
             self.style.map("TCheckbutton",
                            indicatorcolor=[('selected', dark_fg), ('!selected', dark_fg)], # Style indicator
                            background=[('active', dark_bg)])
-
-
-            # For tk.Listbox (not a ttk widget, so configure directly)
-            self.streams_listbox.configure(
-                background=entry_bg,
-                foreground=dark_fg,
-                selectbackground="#004080", # Darker blue for selection
-                selectforeground=dark_fg
-            )
-            # Update path_label color for dark mode
-            if hasattr(self, 'path_label'):
-                self.path_label.configure(background=dark_bg, foreground=dark_fg)
-            # Update progress_label color for dark mode
-            if hasattr(self, 'progress_label'):
-                 self.progress_label.configure(background=dark_bg, foreground=dark_fg)
-
-            self.mode_button.config(text="☀️")
+            self.style.configure("Treeview", background=entry_bg, fieldbackground=entry_bg, foreground=dark_fg)
+            self.style.configure("Treeview.Heading", background="#555555", foreground=dark_fg)
+            self.style.map("Treeview", background=[('selected', "#004080")])
 
         else:
             # Light mode (default) settings
@@ -235,10 +446,40 @@ Enjoy downloading!
             self.style.map("TCheckbutton",
                            indicatorcolor=[('selected', light_fg), ('!selected', light_fg)], # Style indicator
                            background=[('active', light_bg)])
+            self.style.configure("Treeview", background=entry_bg_light, fieldbackground=entry_bg_light, foreground=light_fg)
+            self.style.configure("Treeview.Heading", background=light_bg, foreground=light_fg)
+            self.style.map("Treeview", background=[('selected', "SystemHighlight")])
 
+    def _apply_theme_to_widgets(self):
+        """Colors the widgets that don't follow the ttk styles."""
+        if self.dark_mode:
+            dark_bg = "#2e2e2e"
+            dark_fg = "white"
+            entry_bg = "#3e3e3e"
+
+            # For tk.Listbox (not a ttk widget, so configure directly)
+            self.playlist_listbox.configure(
+                background=entry_bg,
+                foreground=dark_fg,
+                selectbackground="#004080", # Darker blue for selection
+                selectforeground=dark_fg
+            )
+            # Update path_label color for dark mode
+            if hasattr(self, 'path_label'):
+                self.path_label.configure(background=dark_bg, foreground=dark_fg)
+            # Update progress_label color for dark mode
+            if hasattr(self, 'progress_label'):
+                 self.progress_label.configure(background=dark_bg, foreground=dark_fg)
+
+            self.mode_button.config(text="☀️")
+
+        else:
+            light_bg = "SystemButtonFace" # Default system background
+            light_fg = "black"
+            entry_bg_light = "white"
 
             # For tk.Listbox
-            self.streams_listbox.configure(
+            self.playlist_listbox.configure(
                 background=entry_bg_light,
                 foreground=light_fg,
                 selectbackground="SystemHighlight", # Default system selection color
@@ -261,132 +502,356 @@ Enjoy downloading!
             messagebox.showerror("Error", "Please enter a YouTube link.")
             return
 
+        # Forget any previous playlist; results still in flight are ignored
+        self.fetch_generation += 1
+        if self.playlist_fetcher:
+            self.playlist_fetcher.cancel()
+            self.playlist_fetcher = None
+
         self.progress.start()
-        threading.Thread(target=self._fetch_streams_thread, args=(link,), daemon=True).start()
+        threading.Thread(target=self._fetch_streams_thread, args=(link, self.fetch_generation), daemon=True).start()
 
-    def _fetch_streams_thread(self, link):
+    def clear_metadata_cache(self):
+        """Forgets all cached stream information so the next fetch goes to the network."""
+        core.invalidate_cache()
+        self.progress_label.config(text="Stream information cache cleared.")
+
+    def _fetch_streams_thread(self, link, generation):
         try:
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                # 'cookiefile': 'path/to/your/cookies.txt',
-            }
+            # Flat extraction: a playlist only lists its entries, a single video is fully extracted
+            info, entries = core.expand_url(link)
+        except Exception as e:
+            # Bound now: `e` is unset once the except block ends, before the callback runs
+            if classify_error(e)[0]:
+                message = f"Network error, even after retrying:\n{e}"
+            else:
+                message = f"Invalid URL or video unavailable:\n{e}"
+            self.root.after(0, lambda: messagebox.showerror("Error", message))
+            self.root.after(0, self.progress.stop)
+            return
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                self.video_info = ydl.extract_info(link, download=False)
+        if entries is None:
+            self.root.after(0, self._show_single_video, info, generation)
+        else:
+            self.root.after(0, self._show_playlist, info, entries, generation)
 
-            self.root.after(0, self._update_streams_list)
+    def _show_single_video(self, info, generation):
+        if generation != self.fetch_generation:
+            return
+        self.progress.stop()
+        self.frame_playlist.pack_forget()
+        self.playlist_entries = []
+        self.video_info = info
+        self._update_streams_list()
+
+    def _show_playlist(self, info, entries, generation):
+        if generation != self.fetch_generation:
+            return
+        self.playlist_entries = entries
+        self.playlist_infos = {}
+        self.video_info = None
+        self.frame_playlist.config(text=f"Playlist Entries - {info.get('title') or 'Playlist'} ({len(entries)})")
+        self.frame_playlist.pack(padx=10, pady=10, fill="both", expand=True, before=self.frame_streams)
 
-        except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Error", f"Invalid URL or network error:\n{e}"))
-        finally:
-            self.root.after(0, self.progress.stop)
+        self.playlist_listbox.delete(0, tk.END)
+        for index in range(len(entries)):
+            self.playlist_listbox.insert(tk.END, self._playlist_row_text(index))
 
-    def _update_streams_list(self):
-        self.streams_listbox.delete(0, tk.END)
+        self._show_streams_message("Select a playlist entry to see its streams.")
+
+        if not entries:
+            self.progress.stop()
+            return
+
+        # Fetch every entry's stream information in parallel, showing each one as it arrives
+        self.progress_label.config(text=f"Fetching entries: 0/{len(entries)}")
+        self.playlist_fetcher = core.PlaylistFetcher(
+            entries,
+            lambda index, entry_info, error: self.root.after(
+                0, self._on_playlist_entry_fetched, generation, index, entry_info, error)
+        ).start()
+
+    def _on_playlist_entry_fetched(self, generation, index, info, error):
+        if generation != self.fetch_generation:
+            return
+        self.playlist_infos[index] = info if error is None else error
+
+        was_selected = self.playlist_listbox.curselection() == (index,)
+        self.playlist_listbox.delete(index)
+        self.playlist_listbox.insert(index, self._playlist_row_text(index))
+        if was_selected:
+            self.playlist_listbox.selection_set(index) # Re-inserting the row drops its selection
+            self._on_playlist_select()
+
+        done = len(self.playlist_infos)
+        self.progress_label.config(text=f"Fetching entries: {done}/{len(self.playlist_entries)}")
+        if done == len(self.playlist_entries):
+            self.progress.stop()
+            self.playlist_fetcher = None
+
+    def _playlist_row_text(self, index):
+        entry = self.playlist_entries[index]
+        title = entry.get('title') or entry.get('id') or entry.get('url')
+        result = self.playlist_infos.get(index)
+        if result is None:
+            status = "fetching..."
+        elif isinstance(result, Exception):
+            status = "unavailable"
+        else:
+            title = result.get('title') or title
+            duration = result.get('duration')
+            status = f"{int(duration) // 60}:{int(duration) % 60:02d}" if duration else "ready"
+        return f"{index + 1}. {title} [{status}]"
 
+    def _on_playlist_select(self, event=None):
+        selection = self.playlist_listbox.curselection()
+        if not selection:
+            return
+        result = self.playlist_infos.get(selection[0])
+        if result is None:
+            self.video_info = None
+            self._show_streams_message("Fetching stream information...")
+            return
+        self.video_info = None if isinstance(result, Exception) else result
+        self._update_streams_list()
+
+    def _update_streams_list(self):
+        """Shows the formats of the current video in the stream table, filtered and sorted."""
         # Check if video_info was successfully fetched and contains the 'formats' key
-        if not self.video_info or 'formats' not in self.video_info or not self.video_info['formats']:
-            self.streams_listbox.insert(tk.END, "Could not fetch stream information for this URL.")
-            self.selected_streams = None # Reset selected streams
-            return # Stop processing if formats are not available
-
-        # Now it's safe to access self.video_info['formats']
-        all_formats = self.video_info['formats']
-
-        if self.type.get() == "Video":
-            # Filter for video formats (with video and audio codecs, mp4 extension)
-            formats = [f for f in all_formats
-                       if f.get('vcodec') != 'none' and f.get('acodec') != 'none'
-                       and f.get('ext') == 'mp4']
-            formats.sort(key=lambda x: x.get('height') or 0, reverse=True)
-
-            for idx, fmt in enumerate(formats):
-                height = fmt.get('height') or 'N/A'
-                filesize = fmt.get('filesize') or fmt.get('filesize_approx') or 0
-                size_mb = round(filesize / (1024 * 1024), 2) if filesize else "N/A"
-                fps = fmt.get('fps') or ''
-                fps_str = f" {fps}fps" if fps else ""
-                resolution_str = f"{height}p" if height != 'N/A' else "Unknown"
-                self.streams_listbox.insert(tk.END, f"{idx + 1}. {resolution_str}{fps_str} - {size_mb} MB")
-        else: # Audio
-            # Filter for audio-only formats
-            formats = [f for f in all_formats
-                       if f.get('acodec') != 'none' and f.get('vcodec') == 'none']
-            formats.sort(key=lambda x: f.get('abr') or 0, reverse=True) # Sort by average bitrate
-
-            for idx, fmt in enumerate(formats):
-                abr = fmt.get('abr') or 'N/A'
-                filesize = fmt.get('filesize') or fmt.get('filesize_approx') or 0
-                size_mb = round(filesize / (1024 * 1024), 2) if filesize else "N/A"
-                ext = fmt.get('ext', 'unknown')
-                abr_str = f"{abr}kbps" if abr != 'N/A' else "Unknown bitrate"
-                self.streams_listbox.insert(tk.END, f"{idx + 1}. Audio {abr_str} ({ext}) - {size_mb} MB")
-
-        self.selected_streams = formats
-        if not formats:
-            # More specific message if no *suitable* formats were found after filtering
-            self.streams_listbox.insert(tk.END, f"No suitable {self.type.get().lower()} formats found.")
-
-
-
-    def _progress_hook(self, d):
-        """
-        yt-dlp progress hook to update the Tkinter progress bar.
-        This runs in the download thread, so updates to Tkinter widgets
-        must be scheduled using self.root.after().
-        """
-        if d['status'] == 'downloading':
-            # d['total_bytes'] or d['total_bytes_estimate'] might be None initially
-            total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
-            downloaded_bytes = d.get('downloaded_bytes')
-
-            if total_bytes is not None and downloaded_bytes is not None and total_bytes > 0:
-                 # Use math.isfinite to check for potential inf or NaN values
-                 if math.isfinite(total_bytes) and math.isfinite(downloaded_bytes):
-                    percentage = downloaded_bytes / total_bytes * 100
-                    # Schedule update on the main thread
-                    self.root.after(0, self._update_progress_bar, percentage, d.get('speed'))
-                 else:
-                     # Handle non-finite values if necessary, maybe switch to indeterminate
-                     self.root.after(0, self._update_progress_bar, -1, None) # Use -1 to indicate indeterminate or error state
-
-        elif d['status'] == 'finished':
-            # Schedule update on the main thread to set to 100% and stop
-            self.root.after(0, self._update_progress_bar, 100, None)
-            self.root.after(0, lambda: self.progress_label.config(text="Download Complete!")) # Update label on finish
-            if self.open_folder_after_download.get():
-                self.root.after(100, self._open_download_folder) # Add a small delay
+        if not self.video_info or not self.video_info.get('formats'):
+            self._show_streams_message("Could not fetch stream information for this URL.")
+            return
 
-        elif d['status'] == 'error':
-             # Schedule update on the main thread to stop and potentially reset
-             self.root.after(0, self._update_progress_bar, 0, None) # Reset or set to 0 on error
-             self.root.after(0, lambda: self.progress_label.config(text="Download Failed")) # Update label on error
-
-
-    def _update_progress_bar(self, percentage, speed):
-        """Updates the progress bar and label from the main thread."""
-        if percentage >= 0: # Check if percentage is a valid number
-            if self.progress['mode'] == 'indeterminate': # Switch from indeterminate if needed
-                self.progress.stop()
-                self.progress['mode'] = 'determinate'
-            self.progress['value'] = percentage
-            if speed is not None:
-                 # Convert speed from bytes/sec to KB/s or MB/s
-                 if speed > 1024 * 1024:
-                     speed_str = f"{speed / (1024 * 1024):.2f} MiB/s"
-                 elif speed > 1024:
-                     speed_str = f"{speed / 1024:.2f} KiB/s"
-                 else:
-                     speed_str = f"{speed:.2f} B/s"
-                 self.progress_label.config(text=f"{percentage:.1f}% at {speed_str}")
+        same_video = self.format_model is not None and self.format_model.info is self.video_info
+        if not same_video:
+            self.format_model = FormatModel(self.video_info)
+        media_type = self.type.get()
+        self._update_filter_choices(media_type)
+
+        filters = self._stream_filters()
+        rows = self.format_model.filter(media_type, **filters)
+        column, descending = self.stream_sort
+        if column:
+            rows = FormatModel.sort(rows, column, descending)
+
+        if not rows:
+            if any(value for key, value in filters.items() if key != 'merge_format'):
+                self._show_streams_message("No formats match the filters.")
             else:
-                 self.progress_label.config(text=f"{percentage:.1f}%")
-        else: # Handle indeterminate state or error state
-             if self.progress['mode'] == 'determinate': # Switch to indeterminate if needed
-                 self.progress['mode'] = 'indeterminate'
-             self.progress.start() # Go back to indeterminate if needed
-             self.progress_label.config(text="Processing...") # Or an error message
+                # More specific message if no *suitable* formats were found after filtering
+                self._show_streams_message(f"No suitable {media_type.lower()} formats found.")
+            return
+
+        # Keep a row the user selected while re-filtering; otherwise select what the auto-pick policy
+        # picks, which follows edits of the policy
+        selection = self.streams_tree.selection()
+        previous = self.stream_rows[int(selection[0])].format_id if same_video and selection and self.stream_rows else None
+        if previous == self.stream_auto_picked:
+            previous = None
+        pick, status = self._auto_pick(media_type)
+        format_ids = [row.format_id for row in rows]
+        if previous in format_ids:
+            selected_id, status = previous, ""
+            self.stream_auto_picked = None
+        else:
+            selected_id = self.stream_auto_picked = pick
+        self.stream_selected_index = format_ids.index(selected_id) if selected_id in format_ids else None
+
+        self.stream_rows = rows
+        self.stream_render_generation += 1
+        total = len(self.format_model.rows(media_type))
+        count = f"{len(rows)} of {total} formats" if len(rows) < total else f"{total} formats"
+        self.streams_status.config(text=f"{count} - {status}" if status else count)
+        self.streams_tree.delete(*self.streams_tree.get_children())
+        self._render_stream_rows(self.stream_render_generation, 0)
+
+    def _auto_pick(self, media_type):
+        """The format id the auto-pick policy chooses for the current video, and a note for the status line."""
+        try:
+            policy = FormatPolicy.parse(self.format_policy.get())
+        except ValueError as e:
+            return None, f"auto-pick: {e}"
+        if policy.media_type != media_type:
+            return None, "" # A policy for the other media type
+        pick = policy.select(self.video_info)
+        if pick is None:
+            return None, f"nothing matches \"{policy}\""
+        return pick['format_id'], f"auto-picked by \"{policy}\""
+
+    def _render_stream_rows(self, generation, start):
+        """Inserts the next chunk of rows, then lets the event loop run so long lists don't freeze the UI."""
+        if generation != self.stream_render_generation:
+            return # A newer redraw replaced this one
+        merge_format = self._stream_filters()['merge_format']
+        end = min(start + STREAM_RENDER_CHUNK, len(self.stream_rows))
+        for index in range(start, end):
+            row = self.stream_rows[index]
+            size_mb = f"{'~' if row.size_is_estimate else ''}{row.filesize / (1024 * 1024):.2f} MB" if row.filesize else "N/A"
+            self.streams_tree.insert("", "end", iid=str(index), values=(
+                f"{row.height}p" if row.height else ("audio only" if row.kind == "audio" else "Unknown"),
+                f"{row.fps:g}" if row.fps else "",
+                row.codec_label or "unknown",
+                row.container(merge_format) or "",
+                f"{row.bitrate:.0f} kbps" if row.bitrate else "",
+                size_mb,
+                row.kind,
+            ))
+        if self.stream_selected_index is not None and start <= self.stream_selected_index < end:
+            self.streams_tree.selection_set(str(self.stream_selected_index))
+            self.streams_tree.see(str(self.stream_selected_index))
+        if end < len(self.stream_rows):
+            self.root.after(1, self._render_stream_rows, generation, end)
+
+    def _show_streams_message(self, text):
+        """Empties the stream table and says why."""
+        self.stream_rows = []
+        self.stream_render_generation += 1
+        self.streams_tree.delete(*self.streams_tree.get_children())
+        self.streams_status.config(text=text)
+
+    def _update_filter_choices(self, media_type):
+        """Offers the codecs, resolutions and containers the current video has for the media type."""
+        merge_format = self._stream_filters()['merge_format']
+        choices = (
+            (self.codec_filter, self.format_model.codecs(media_type)),
+            (self.height_filter, [f"{height}p" for height in self.format_model.heights(media_type)]),
+            (self.container_filter, self.format_model.containers(media_type, merge_format)),
+        )
+        for variable, values in choices:
+            box = self.stream_filter_boxes[str(variable)]
+            box.config(values=(ANY_FILTER,) + tuple(values), state="readonly" if values else "disabled")
+            if variable.get() not in (ANY_FILTER,) + tuple(values):
+                variable.set(ANY_FILTER) # e.g. a video codec filter after switching to audio
+        # Resetting a filter schedules a refresh, but the caller is about to redraw anyway
+        if self._streams_refresh_after:
+            self.root.after_cancel(self._streams_refresh_after)
+            self._streams_refresh_after = None
+
+    def _stream_filters(self):
+        """The quick-filter settings as FormatModel.filter() keyword arguments."""
+        def choice(variable):
+            return None if variable.get() == ANY_FILTER else variable.get()
+        height = choice(self.height_filter)
+        try:
+            max_mb = float(self.max_size_filter.get().strip() or 0)
+        except ValueError:
+            max_mb = 0 # Ignored until it is a number
+        return {
+            'codec': choice(self.codec_filter),
+            'height': int(height.rstrip("p")) if height else None,
+            'container': choice(self.container_filter),
+            'max_size': max_mb * 1024 * 1024 or None,
+            'merge_format': None if self.merge_format.get() == "auto" else self.merge_format.get(),
+        }
+
+    def _sort_streams_by(self, column):
+        """Sorts the stream table by a column; clicking it again reverses the order."""
+        current, descending = self.stream_sort
+        # Numbers start biggest first, text A to Z
+        self.stream_sort = (column, not descending if column == current else column not in ("codec", "container", "kind"))
+        for name, heading, _ in STREAM_COLUMNS:
+            arrow = (" ▼" if self.stream_sort[1] else " ▲") if name == column else ""
+            self.streams_tree.heading(name, text=heading + arrow)
+        self._refresh_streams()
+
+    def _schedule_streams_refresh(self):
+        """Redraws the stream table shortly after the filters stop changing (e.g. while typing a size)."""
+        if self._streams_refresh_after:
+            self.root.after_cancel(self._streams_refresh_after)
+        self._streams_refresh_after = self.root.after(STREAM_FILTER_DELAY_MS, self._refresh_streams)
+
+    def _refresh_streams(self):
+        self._streams_refresh_after = None
+        if self.video_info:
+            self._update_streams_list()
+
+
+
+    def _on_job_update(self, job):
+        """Called by the download queue (from a worker thread) when a job changes status."""
+        self.progress_tracker.mark_dirty(job) # Redrawn by the next _poll_progress()
+        if job.status == DownloadJob.FAILED:
+            error_msg = job.error or "Unknown error"
+            if "ffmpeg" in error_msg.lower():
+                error_msg += "\n\nNote: FFmpeg is required for audio conversion and for merging video+audio streams. Please install FFmpeg."
+            self.root.after(0, lambda: messagebox.showerror("Error", f"Download failed: {job.title}\n{error_msg}"))
+        elif job.status == DownloadJob.DONE:
+            core.record_in_archive(self.download_archive, job)
+            # Open the folder once, when the last active job has finished
+            if self.open_folder_after_download.get() and not self.download_queue.active_jobs():
+                self.root.after(100, self._open_download_folder) # Add a small delay
+
+
+    def _poll_progress(self):
+        """Redraws every job that changed since the last poll, PROGRESS_REFRESH_MS apart (main thread)."""
+        changed = self.progress_tracker.drain()
+        for job in sorted(changed, key=lambda job: job.id):
+            self._refresh_job(job)
+        if changed:
+            self._update_progress_bar()
+        self.root.after(PROGRESS_REFRESH_MS, self._poll_progress)
+
+
+    def _refresh_job(self, job):
+        """Updates the job's row in the queue view (main thread)."""
+        if job.status == DownloadJob.RUNNING:
+            progress_text = f"{job.percentage:.1f}%"
+            if job.speed:
+                progress_text += f" at {self._format_speed(job.speed)}"
+            if job.eta is not None:
+                progress_text += f", {self._format_eta(job.eta)} left"
+        elif job.status == DownloadJob.FAILED:
+            progress_text = job.error.splitlines()[0] if job.error else ""
+        elif job.status == DownloadJob.QUEUED and job.retry_at is not None:
+            progress_text = f"Retrying (attempt {job.attempts + 1}): {job.error.splitlines()[0] if job.error else ''}"
+        else:
+            progress_text = f"{job.percentage:.1f}%"
+
+        values = (job.title, job.format_id, job.status, progress_text)
+        row = self.job_rows.get(job.id)
+        if row is None:
+            self.job_rows[job.id] = self.jobs_tree.insert("", tk.END, values=values)
+        else:
+            self.jobs_tree.item(row, values=values)
+
+
+    def _update_progress_bar(self):
+        """Shows the combined progress of all queued and running jobs (main thread)."""
+        active = self.download_queue.active_jobs()
+        if not active:
+            self.progress['value'] = 100 if self.download_queue.jobs else 0
+            failed = sum(1 for job in self.download_queue.jobs if job.status == DownloadJob.FAILED)
+            self.progress_label.config(text=f"Downloads complete ({failed} failed)" if failed else "Download Complete!")
+            return
+
+        running = [job for job in active if job.status == DownloadJob.RUNNING]
+        percentage = sum(job.percentage for job in active) / len(active)
+        speed = sum(job.speed or 0 for job in running)
+        self.progress['value'] = percentage
+        label = f"{percentage:.1f}% - {len(running)} running, {len(active) - len(running)} queued"
+        if speed:
+            label += f" at {self._format_speed(speed)}"
+        etas = [job.eta for job in running if job.eta is not None]
+        if etas and len(etas) == len(active):
+            label += f", {self._format_eta(max(etas))} left"
+        self.progress_label.config(text=label)
+
+
+    @staticmethod
+    def _format_speed(speed):
+        # Convert speed from bytes/sec to KB/s or MB/s
+        if speed > 1024 * 1024:
+            return f"{speed / (1024 * 1024):.2f} MiB/s"
+        elif speed > 1024:
+            return f"{speed / 1024:.2f} KiB/s"
+        return f"{speed:.2f} B/s"
+
+
+    @staticmethod
+    def _format_eta(seconds):
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
 
 
     def _open_download_folder(self):
@@ -405,74 +870,134 @@ Enjoy downloading!
 
     def download_selected(self):
         # ... (existing selection validation) ...
-        selection = self.streams_listbox.curselection()
+        selection = self.streams_tree.selection()
         if not selection:
             messagebox.showwarning("Warning", "Please select a stream from the list.")
             return
 
-        if not self.selected_streams:
+        if not self.stream_rows:
             messagebox.showerror("Error", "No streams available.")
             return
 
-        index = selection[0]
-        if index >= len(self.selected_streams):
+        index = int(selection[0])
+        if index >= len(self.stream_rows):
             messagebox.showerror("Error", "Invalid selection.")
             return
 
-        selected_format = self.selected_streams[index]
+        selected_format = self.stream_rows[index].format
+
+        # Already downloaded before? One archive lookup instead of a silent re-download
+        video_key = core.cache_key_for_info(self.video_info)
+        archived = self.download_archive.find(video_key, self.type.get()) if video_key else []
+        if archived and not messagebox.askyesno(
+                "Already Downloaded",
+                f"\"{self.video_info.get('title')}\" was already downloaded "
+                f"(format {archived[0]['format_id']}) to:\n{archived[0]['path']}\n\nDownload it again?"):
+            return
+
+        # Snapshot everything the download needs so later clicks can't change it
+        job = DownloadJob(url=self.video_info['webpage_url'],
+                          selected_format=selected_format,
+                          media_type=self.type.get(),
+                          save_path=self.download_path,
+                          title=self.video_info.get('title'),
+                          info=self.video_info, # Reused so the download doesn't extract again
+                          profile=self._performance_profile())
+
+        job.priority = self.job_priority.get()
+        if core.is_adaptive_pair(job.format_id):
+            job.merge_format = self._merge_format_for(selected_format)
+        if job.media_type == core.AUDIO:
+            job.audio_codec = None if self.audio_codec.get() == "original" else self.audio_codec.get()
+            job.audio_bitrate = None if self.audio_bitrate.get() == "source" else int(self.audio_bitrate.get())
+
+        # A different video with the same title would overwrite the file; add the video id instead
+        if core.avoid_output_collision(job, self.download_archive, self.download_queue.active_jobs()):
+            self.progress_label.config(text=f"Another file is already named \"{job.title}\"; "
+                                            "the video id is added to the file name.")
 
-        # Start indeterminate progress bar while setting up download
         self.progress['mode'] = 'determinate'
-        self.progress['value'] = 0 # Reset progress
-        self.progress_label.config(text="Starting download...") # Update label
-        threading.Thread(target=self._download_thread, args=(selected_format,), daemon=True).start()
+        self.download_queue.submit(job)
 
 
-    def _download_thread(self, selected_format):
+    def apply_bandwidth_settings(self):
+        """Applies the bandwidth limit and schedule, also to downloads that are already running."""
         try:
-            save_path = self.download_path
-            filename_template = '%(title)s.%(ext)s'
-
-            ydl_opts = {
-                'format': str(selected_format['format_id']),
-                'outtmpl': os.path.join(save_path, filename_template),
-                'progress_hooks': [self._progress_hook], # Add the progress hook here
-                'quiet': True, # Keep quiet for yt-dlp's default output
-                'no_warnings': True,
-                # 'cookiefile': 'path/to/your/cookies.txt',
-            }
-
-            if self.type.get() == "Audio":
-                # Add audio postprocessors if needed
-                 ydl_opts['postprocessors'] = [{
-                     'key': 'FFmpegExtractAudio',
-                     'preferredcodec': 'mp3',
-                     'preferredquality': '192',
-                 }]
-                 ydl_opts['postprocessor_args'] = ['-ar', '44100']
-
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([self.video_info['webpage_url']])
-
-            # Success message is now handled by the 'finished' status in the hook
-            # self.root.after(0, lambda: messagebox.showinfo("Success", ...))
+            limit = parse_rate(self.bandwidth_limit.get())
+            schedule = parse_schedule(self.bandwidth_schedule.get())
+        except ValueError as e:
+            messagebox.showerror("Bandwidth", str(e))
+            return
+        self.bandwidth.configure(limit=limit, schedule=schedule)
+        current = self.bandwidth.current_limit()
+        self.progress_label.config(
+            text=f"Bandwidth limit now: {self._format_speed(current) if current else 'unlimited'}")
 
-        except Exception as e:
-            error_msg = str(e)
-            if "ffmpeg" in error_msg.lower():
-                error_msg += "\n\nNote: FFmpeg is required for audio conversion. Please install FFmpeg."
-            self.root.after(0, lambda: messagebox.showerror("Error", f"Download failed:\n{error_msg}"))
-            # Error status is also handled by the 'error' status in the hook
-        finally:
-            # progress.stop() is now handled by the hook's 'finished' or 'error' status
-            pass # No need to stop here anymore
 
+    def _merge_format_for(self, fmt):
+        """The container an adaptive video+audio pair will be merged into."""
+        return fmt.get('ext') if self.merge_format.get() == "auto" else self.merge_format.get()
+
+
+    def _performance_profile(self):
+        try:
+            fragments = self.concurrent_fragments.get()
+        except tk.TclError:
+            fragments = 4 # Partially typed value
+        return PerformanceProfile(concurrent_fragments=fragments,
+                                  external_downloader="aria2c" if self.use_aria2c.get() else None)
+
+
+    def _on_parallel_downloads_changed(self):
+        try:
+            self.download_queue.set_max_workers(self.max_parallel_downloads.get())
+        except (tk.TclError, ValueError):
+            pass # Ignore partially typed values
+
+
+    def _download_job(self, job):
+        """
+        Runs a single job in a download-queue worker thread. Raises on failure.
+        Returns a Future if the job's audio conversion continues in the background.
+        """
+        return core.run_download(job, self.progress_tracker.hook(job))
+
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="YouTube Downloader")
+    parser.add_argument("--startup-timing", action="store_true", help="print how long start-up took")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics while running")
+    parser.add_argument("--temp-dir", default=None,
+                        help="download and post-process in this folder (e.g. on an SSD), then move finished files "
+                             "into the download folder")
+    parser.add_argument("--min-free", default=None, metavar="SIZE",
+                        help="disk space to leave free, e.g. 2GB (default: 512MB)")
+    return parser
 
 
 def main():
+    multiprocessing.freeze_support() # Audio conversion pool in the PyInstaller build
+    startup_timer = StartupTimer(STARTED)
+    startup_timer.mark("imports")
+    parser = build_parser()
+    args, unknown = parser.parse_known_args()
+    unknown = [arg for arg in unknown if not arg.startswith("-psn_")] # Added by macOS to app bundles
+    if unknown:
+        parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+    if args.metrics_port is not None:
+        try:
+            core.configure_metrics(port=args.metrics_port)
+        except OSError as e:
+            parser.error(f"can't serve metrics on port {args.metrics_port}: {e}")
+    try:
+        core.configure_staging(args.temp_dir, parse_size(args.min_free) if args.min_free else None)
+    except (OSError, ValueError) as e:
+        parser.error(f"--temp-dir/--min-free: {e}")
     root = tk.Tk()
-    app = YouTubeDownloader(root)
+    startup_timer.mark("tk_ready")
+    app = YouTubeDownloader(root, startup_timer, echo_startup_timing=args.startup_timing)
     root.mainloop()
 
 